@@ -1,20 +1,20 @@
 class VerificationQueue:
     """
-    Holds scan results until admin approval.
+    Tracks which agents' scan results an admin approved, per task. The
+    file lists themselves stay in the ResultCollector.
     """
 
     def __init__(self):
         self._pending = {}
 
-    def add_result(self, agent_ip, task_id, files):
+    def add_result(self, agent_ip, task_id):
         """
-        Store scan results for verification.
+        Register an agent's new result set for verification.
         """
         if task_id not in self._pending:
             self._pending[task_id] = {}
 
         self._pending[task_id][agent_ip] = {
-            "files": files,
             "approved": False
         }
 
@@ -41,16 +41,23 @@ class VerificationQueue:
 
     def get_approved(self, task_id):
         """
-        Get approved file lists for final deletion.
+        Get the agents approved for final deletion.
         """
-        approved = {}
-
-        if task_id in self._pending:
-            for agent_ip, info in self._pending[task_id].items():
-                if info["approved"]:
-                    approved[agent_ip] = info["files"]
+        return {
+            agent_ip
+            for agent_ip, info in self._pending.get(task_id, {}).items()
+            if info["approved"]
+        }
 
-        return approved
+    def clear_agent(self, task_id, agent_ip):
+        """
+        Remove one agent's entry once its results are released.
+        """
+        agents = self._pending.get(task_id)
+        if agents is not None:
+            agents.pop(agent_ip, None)
+            if not agents:
+                del self._pending[task_id]
 
     def clear_task(self, task_id):
         """
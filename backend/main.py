@@ -1,7 +1,25 @@
+import argparse
+import os
+import sys
+
+# The wire framing lives in shared/, so the project root must be importable
+# even when this script is launched from inside backend/.
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
 try:
-    from backend.network.tcp_server import start_master
+    from backend.network.tcp_server import start_master, MASTER_MODES
 except ModuleNotFoundError:
-    from network.tcp_server import start_master
+    from network.tcp_server import start_master, MASTER_MODES
 
 if __name__ == "__main__":
-    start_master()
+    parser = argparse.ArgumentParser(description="Run the master TCP server")
+    parser.add_argument(
+        "--mode",
+        choices=MASTER_MODES,
+        default=None,
+        help="Server mode (default: MASTER_SERVER_MODE env or 'threaded')"
+    )
+    args = parser.parse_args()
+    start_master(mode=args.mode)
@@ -0,0 +1,87 @@
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from backend.network.connection_handler import register_session, process_message
+    from backend.network.outbound import AsyncOutboundWriter
+    from backend.network.protocol import decode_message
+    from backend.orchestrator.agent_registry import remove_agent
+except ModuleNotFoundError:
+    from network.connection_handler import register_session, process_message
+    from network.outbound import AsyncOutboundWriter
+    from network.protocol import decode_message
+    from orchestrator.agent_registry import remove_agent
+from shared.framing import HEADER_SIZE, FrameError, parse_header
+
+
+# Registry, collector and persistence calls are blocking, so they run on a
+# small shared pool instead of one thread per agent.
+WORKER_THREADS = int(os.getenv("MASTER_WORKER_THREADS", "4"))
+
+
+async def _read_message(reader):
+    try:
+        length, flags = parse_header(await reader.readexactly(HEADER_SIZE))
+        data = await reader.readexactly(length)
+        return decode_message((flags, data))
+    except asyncio.IncompleteReadError:
+        return None
+    except (OSError, FrameError, json.JSONDecodeError) as e:
+        print("[MASTER] Protocol receive error:", e)
+        return None
+
+
+async def _handle_agent(reader, writer, executor):
+    loop = asyncio.get_running_loop()
+    addr = writer.get_extra_info("peername")
+    agent_ip = addr[0]
+    outbound = AsyncOutboundWriter(loop, writer, agent_ip)
+
+    try:
+        registration = await _read_message(reader)
+        if not registration or registration.get("type") != "register":
+            raise Exception("Invalid registration message")
+
+        await loop.run_in_executor(executor, register_session, agent_ip, None, addr, outbound, registration)
+
+        while True:
+            message = await _read_message(reader)
+            if message is None:
+                print(f"[MASTER] No message received, closing connection for {agent_ip}")
+                break
+
+            # Awaiting each message keeps per-agent ordering identical to
+            # the threaded handler.
+            await loop.run_in_executor(executor, process_message, agent_ip, outbound, message)
+
+    except Exception as e:
+        print(f"[MASTER] Error [{agent_ip}]: {e}")
+
+    finally:
+        await loop.run_in_executor(executor, remove_agent, agent_ip)
+        outbound.close()
+        print(f"[MASTER] Agent disconnected: {agent_ip}")
+
+
+async def serve(host, port):
+    executor = ThreadPoolExecutor(
+        max_workers=WORKER_THREADS,
+        thread_name_prefix="master-worker"
+    )
+    server = await asyncio.start_server(
+        lambda r, w: _handle_agent(r, w, executor),
+        host,
+        port,
+        reuse_address=True
+    )
+
+    print(f"[MASTER] Listening on {host}:{port} (asyncio, {WORKER_THREADS} workers)")
+
+    async with server:
+        await server.serve_forever()
+
+
+def start_master_async(host, port):
+    asyncio.run(serve(host, port))
@@ -1,116 +1,322 @@
+import threading
+
 try:
-    from backend.network.protocol import receive_message, send_message
+    from backend.network.protocol import receive_message, receive_messages, COMPRESSION_METHODS, WIRE_CODECS
+    from backend.network.outbound import OutboundWriter
     from backend.orchestrator.agent_registry import (
         register_agent,
         remove_agent,
         update_status,
         touch
     )
+    from backend.orchestrator.event_bus import event_bus
     from backend.orchestrator.task_dispatcher import dispatch_scan_task
     from backend.orchestrator.result_collector import result_collector
     from shared import persistence
+    from shared.codec import negotiate_codec
+    from shared.columnar import COLUMNAR, batch_from_message
+    from shared.compression import negotiate
+    from shared.framing import FrameReader
 except ModuleNotFoundError:
-    from network.protocol import receive_message, send_message
+    from network.protocol import receive_message, receive_messages, COMPRESSION_METHODS, WIRE_CODECS
+    from network.outbound import OutboundWriter
     from orchestrator.agent_registry import (
         register_agent,
         remove_agent,
         update_status,
         touch
     )
+    from orchestrator.event_bus import event_bus
     from orchestrator.task_dispatcher import dispatch_scan_task
     from orchestrator.result_collector import result_collector
+    from shared.codec import negotiate_codec
+    from shared.columnar import COLUMNAR, batch_from_message
+    from shared.compression import negotiate
+    from shared.framing import FrameReader
     persistence = None
 
 
-def _dispatch_queued_delete_commands(agent_ip, conn):
+# Heartbeats, deletion reports and the UI control channel can drain the
+# same agent's queue concurrently; one drain at a time per agent keeps a
+# command from being sent twice.
+_dispatch_locks = {}
+_dispatch_locks_guard = threading.Lock()
+# Queued commands claimed per drain; a full batch means there may be more.
+DELETE_COMMAND_BATCH = 20
+
+
+def dispatch_queued_delete_commands(agent_ip, writer):
+    """
+    Send the agent's due delete commands through `writer`; returns the ids
+    sent. Sent commands stay leased until the agent's deletion_report acks
+    them, and are sent again if it never does.
+    """
     if not persistence:
+        return []
+
+    with _dispatch_locks_guard:
+        lock = _dispatch_locks.setdefault(agent_ip, threading.Lock())
+    sent = []
+    with lock:
+        # Most heartbeats come from agents with nothing due; the in-memory
+        # index answers those without touching the database.
+        generation = persistence.pending_delete_commands_generation(agent_ip)
+        if generation is None:
+            return sent
+        # The schema was migrated when the master started.
+        commands, due_at = persistence.claim_delete_commands(agent_ip, DELETE_COMMAND_BATCH)
+        for cmd in commands:
+            cmd_id = cmd["id"]
+            payload = dict(cmd["payload"], type="delete_approved", command_id=cmd_id)
+            if writer.enqueue(payload):
+                sent.append(cmd_id)
+                print(f"[MASTER] Sent queued delete command {cmd_id} -> {agent_ip} (attempt {cmd['attempt']})")
+            else:
+                retry_at = persistence.release_delete_command(cmd_id, "outbound queue full or closed")
+                if retry_at is not None:
+                    due_at = retry_at if due_at is None else min(due_at, retry_at)
+                print(f"[MASTER] Failed queued delete command {cmd_id} -> {agent_ip}")
+        if len(commands) == DELETE_COMMAND_BATCH:
+            due_at = 0.0
+        persistence.defer_delete_commands(agent_ip, generation, due_at)
+    return sent
+
+
+def dispatch_queued_tasks(agent_ip, writer):
+    """
+    Send the scan tasks queued for the agent while it was not connected
+    through `writer`; returns the task ids sent.
+    """
+    if not persistence or not persistence.has_queued_tasks(agent_ip):
+        return []
+
+    with _dispatch_locks_guard:
+        lock = _dispatch_locks.setdefault(agent_ip, threading.Lock())
+    sent = []
+    with lock:
+        for task in persistence.list_queued_tasks(agent_ip):
+            if writer.enqueue(task):
+                sent.append(task["task_id"])
+                print(f"[MASTER] Sent queued task {task['task_id']} -> {agent_ip}")
+            else:
+                print(f"[MASTER] Failed queued task {task['task_id']} -> {agent_ip}")
+                break
+        persistence.mark_tasks_sent(agent_ip, sent)
+    if sent:
+        update_status(agent_ip, "SCANNING")
+    return sent
+
+
+def _publish_files(agent_ip, task_id, added=0, changed=0, removed=0):
+    """Tell UI subscribers how an agent's pending files changed."""
+    if added or changed or removed:
+        event_bus.publish("files", {
+            "task_id": task_id,
+            "agent_ip": agent_ip,
+            "added": added,
+            "changed": changed,
+            "removed": removed,
+        })
+
+
+def _publish_progress(agent_ip, task_id):
+    for progress in result_collector.get_scan_progress(task_id):
+        if progress["agent_ip"] == agent_ip:
+            event_bus.publish("progress", progress)
+
+
+def _publish_audit(future):
+    if future.exception() is None and future.result():
+        event_bus.publish("audit", future.result())
+
+
+def _report_ingest(agent_ip, task_id, future, log=True):
+    if future.exception() is not None:
         return
+    r = future.result()
+    if log:
+        print(f"[MASTER] Ingested {r['staged']} file(s) from {agent_ip} task {task_id}: "
+              f"{r['inserted']} new, {r['updated']} changed, {r['deleted']} removed, "
+              f"{r['unchanged']} unchanged in {r['total_seconds'] * 1000:.1f} ms")
+    _publish_files(agent_ip, task_id, r["inserted"], r["updated"], r["deleted"])
+
+
+def _report_removed(agent_ip, task_id, future, reason=None):
+    if future.exception() is not None or not future.result():
+        return
+    if reason:
+        print(f"[MASTER] Removed {future.result()} {reason} file(s) for {agent_ip} task {task_id}")
+    _publish_files(agent_ip, task_id, removed=future.result())
+
+
+def register_session(agent_ip, conn, addr, writer, registration=None):
+    """
+    Register a freshly connected agent and hand it its initial task.
+    Shared by the threaded and asyncio master modes; `writer` owns every
+    outbound frame for the session.
+    """
+    register_agent(agent_ip, conn, addr, writer)
+    print(f"[MASTER] Agent registered: {agent_ip}")
+
+    # Agents that offer none of compression, codecs or result formats never
+    # see a register_ack, so older agents keep working unchanged. The ack
+    # itself is still plain JSON; the choices apply to later frames.
+    registration = registration or {}
+    if any(key in registration for key in ("compression", "codecs", "result_formats")):
+        method = negotiate(registration.get("compression"), COMPRESSION_METHODS)
+        codec = negotiate_codec(registration.get("codecs"), WIRE_CODECS)
+        result_format = COLUMNAR if COLUMNAR in (registration.get("result_formats") or []) else None
+        writer.enqueue({
+            "type": "register_ack",
+            "compression": method,
+            "codec": codec.name,
+            "result_format": result_format,
+        })
+        writer.compression = method
+        writer.codec = codec
+        print(f"[MASTER] Wire format for {agent_ip}: {codec.name}, compression {method or 'none'}, "
+              f"results {result_format or 'rows'}")
+
+    # Dispatch initial task after registration
+    dispatch_scan_task(writer, agent_ip)
+    dispatch_queued_tasks(agent_ip, writer)
+
+
+def process_message(agent_ip, writer, message):
+    """
+    Apply one decoded agent message (scan results, streamed result chunks,
+    heartbeat, deletion_report) to the registry, collector and persistence.
+    """
+    touch(agent_ip)
+    msg_type = message.get("type")
+
+    if msg_type in ("scan_result", "scan_results"):
+        task_id = message.get("task_id") or "unknown-task"
+        files = batch_from_message(message)
+        if files is None:
+            files = message.get("files")
+        if files is None:
+            files = message.get("results", [])
+
+        result_collector.add_scan_result(
+            agent_ip=agent_ip,
+            task_id=task_id,
+            files=files
+        )
+        if persistence:
+            persistence.replace_pending_files(task_id, agent_ip, files, wait=False).add_done_callback(
+                lambda f: _report_ingest(agent_ip, task_id, f)
+            )
+            persistence.record_task_reply(task_id, agent_ip, len(files), wait=False)
+
+        update_status(agent_ip, "AWAITING_APPROVAL")
+        _publish_progress(agent_ip, task_id)
+
+        print(f"[MASTER] Scan result received from {agent_ip}")
+        print(f"[MASTER] Task: {task_id}, Files: {len(files)}")
+
+    elif msg_type == "scan_results_chunk":
+        task_id = message.get("task_id") or "unknown-task"
+        seq = int(message.get("seq", 0))
+        files = batch_from_message(message)
+        if files is None:
+            files = message.get("files") or []
+
+        if persistence:
+            # Queued writes commit in order, so the stream start always
+            # lands before its chunks.
+            if seq == 0:
+                persistence.begin_pending_stream(task_id, agent_ip, wait=False)
+            persistence.merge_pending_files(task_id, agent_ip, files, wait=False).add_done_callback(
+                lambda f: _report_ingest(agent_ip, task_id, f, log=False)
+            )
+
+        result_collector.add_scan_chunk(
+            agent_ip=agent_ip,
+            task_id=task_id,
+            seq=seq,
+            files=files
+        )
+        _publish_progress(agent_ip, task_id)
+
+    elif msg_type == "scan_results_end":
+        task_id = message.get("task_id") or "unknown-task"
+        if persistence:
+            # Rows from the previous run that no chunk mentioned are gone
+            # (all of them for an empty rescan).
+            persistence.finish_pending_stream(task_id, agent_ip, wait=False).add_done_callback(
+                lambda f: _report_removed(agent_ip, task_id, f, reason="vanished")
+            )
+
+        received = result_collector.finish_scan(agent_ip=agent_ip, task_id=task_id)
+        if persistence:
+            persistence.record_task_reply(task_id, agent_ip, received, wait=False)
+        update_status(agent_ip, "AWAITING_APPROVAL" if received else "IDLE")
+        _publish_progress(agent_ip, task_id)
+
+        expected = message.get("total_files")
+        print(f"[MASTER] Scan stream complete from {agent_ip}")
+        print(f"[MASTER] Task: {task_id}, Files: {received}"
+              + (f" (agent reported {expected})" if expected not in (None, received) else ""))
+
+    elif msg_type == "heartbeat":
+        # Keep-alive; hands over anything queued for the agent
+        dispatch_queued_tasks(agent_ip, writer)
+        dispatch_queued_delete_commands(agent_ip, writer)
+
+    elif msg_type == "deletion_report":
+        task_id = message.get("task_id") or "unknown-task"
+        reports = message.get("reports", [])
+        if persistence:
+            persistence.add_deletion_reports(agent_ip, task_id, reports, wait=False).add_done_callback(
+                _publish_audit
+            )
+            persistence.remove_pending_after_deletion_report(agent_ip, task_id, reports, wait=False).add_done_callback(
+                lambda f: _report_removed(agent_ip, task_id, f)
+            )
+            persistence.ack_delete_commands(agent_ip, task_id, message.get("command_id"), reports, wait=False)
+            # Commits after the removal above; once nothing of the task is
+            # pending for this agent its result set is no longer needed.
+            if persistence.close_scan_results(task_id, agent_ip):
+                result_collector.release(task_id, agent_ip)
+        update_status(agent_ip, "IDLE")
+        ok = sum(1 for r in reports if r.get("status") == "deleted")
+        print(f"[MASTER] Deletion report from {agent_ip} - task {task_id}: {ok}/{len(reports)} deleted")
+        dispatch_queued_delete_commands(agent_ip, writer)
+
+    else:
+        print(f"[MASTER] Unknown message type from {agent_ip}: {msg_type}")
 
-    persistence.init_db()
-    commands = persistence.fetch_pending_delete_commands(agent_ip)
-    for cmd in commands:
-        cmd_id = cmd.get("id")
-        payload = cmd.get("payload", {})
-        if payload.get("type") != "delete_approved":
-            payload["type"] = "delete_approved"
-        try:
-            send_message(conn, payload)
-            persistence.mark_delete_command_sent(cmd_id)
-            print(f"[MASTER] Sent queued delete command {cmd_id} -> {agent_ip}")
-        except Exception as e:
-            persistence.mark_delete_command_failed(cmd_id, str(e))
-            print(f"[MASTER] Failed queued delete command {cmd_id} -> {agent_ip}: {e}")
-            break
 
 def handle_agent(conn, addr):
     agent_ip, _ = addr
+    reader = FrameReader(conn)
+    writer = OutboundWriter(conn, agent_ip)
 
     try:
         # Receive and validate registration
-        registration = receive_message(conn)
+        registration = receive_message(reader)
         if not registration or registration.get("type") != "register":
             raise Exception("Invalid registration message")
 
-        register_agent(agent_ip, conn, addr)
-        print(f"[MASTER] Agent registered: {agent_ip}")
-
-        # Dispatch initial task after registration
-        dispatch_scan_task(conn, agent_ip)
+        register_session(agent_ip, conn, addr, writer, registration)
 
         # Listen for incoming messages
         while True:
-            message = receive_message(conn)
-            if message is None:
+            messages = receive_messages(reader)
+            if messages is None:
                 print(f"[MASTER] No message received, closing connection for {agent_ip}")
                 break
 
-            touch(agent_ip)
-            msg_type = message.get("type")
-
-            if msg_type in ("scan_result", "scan_results"):
-                task_id = message.get("task_id") or "unknown-task"
-                files = message.get("files")
-                if files is None:
-                    files = message.get("results", [])
-
-                result_collector.add_scan_result(
-                    agent_ip=agent_ip,
-                    task_id=task_id,
-                    files=files
-                )
-                if persistence:
-                    persistence.init_db()
-                    persistence.replace_pending_files(task_id, agent_ip, files)
-
-                update_status(agent_ip, "AWAITING_APPROVAL")
-
-                print(f"[MASTER] Scan result received from {agent_ip}")
-                print(f"[MASTER] Task: {task_id}, Files: {len(files)}")
-
-            elif msg_type == "heartbeat":
-                # Keep-alive; no action required
-                _dispatch_queued_delete_commands(agent_ip, conn)
-
-            elif msg_type == "deletion_report":
-                task_id = message.get("task_id") or "unknown-task"
-                reports = message.get("reports", [])
-                if persistence:
-                    persistence.init_db()
-                    persistence.add_deletion_reports(agent_ip, task_id, reports)
-                    persistence.remove_pending_after_deletion_report(agent_ip, task_id, reports)
-                update_status(agent_ip, "IDLE")
-                ok = sum(1 for r in reports if r.get("status") == "deleted")
-                print(f"[MASTER] Deletion report from {agent_ip} - task {task_id}: {ok}/{len(reports)} deleted")
-                _dispatch_queued_delete_commands(agent_ip, conn)
-
-            else:
-                print(f"[MASTER] Unknown message type from {agent_ip}: {msg_type}")
+            for message in messages:
+                process_message(agent_ip, writer, message)
 
     except Exception as e:
         print(f"[MASTER] Error [{agent_ip}]: {e}")
 
     finally:
         remove_agent(agent_ip)
+        writer.close()
         try:
             conn.close()
         except Exception:
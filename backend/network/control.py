@@ -0,0 +1,166 @@
+"""
+Loopback control channel from the UI process to the master.
+
+When the UI runs without the embedded master, approved deletions for
+agents it has no session for are written to delete_command_queue. The
+master used to drain that queue only when the agent's next heartbeat
+arrived, up to HEARTBEAT_INTERVAL later. Now the UI sends a
+"dispatch_queued" request over this channel right after the durable
+write. The master drains the agent's queue into its live session at once
+and replies with the command ids it sent. The queue stays the source of
+truth: if the master is unreachable or the agent is not connected, the
+commands go out on the next heartbeat as before. Scan tasks the UI
+queued for agents it has no session for (task_queue) are drained by the
+same request.
+
+The channel uses the agent framing on a socket bound to 127.0.0.1, so it
+works wherever the master runs (Unix domain sockets are not available
+on every Windows Python). MASTER_CONTROL_PORT=0 disables it.
+"""
+import os
+import select
+import socket
+import threading
+
+try:
+    from backend.network.connection_handler import dispatch_queued_delete_commands, dispatch_queued_tasks
+    from backend.network.protocol import encode_message, receive_message
+    from backend.orchestrator.agent_registry import get_active_agents
+    from shared import persistence
+except ModuleNotFoundError:
+    from network.connection_handler import dispatch_queued_delete_commands, dispatch_queued_tasks
+    from network.protocol import encode_message, receive_message
+    from orchestrator.agent_registry import get_active_agents
+    persistence = None
+from shared.framing import FrameReader
+
+
+CONTROL_HOST = "127.0.0.1"
+CONTROL_PORT = int(os.getenv("MASTER_CONTROL_PORT", "5001"))
+# Seconds the UI waits for the master to connect and answer.
+CONTROL_TIMEOUT = float(os.getenv("MASTER_CONTROL_TIMEOUT", "1.0"))
+
+
+def _handle_request(message):
+    msg_type = message.get("type")
+    if msg_type == "dispatch_queued":
+        agent_ip = message.get("agent_ip")
+        agent_info = get_active_agents().get(agent_ip)
+        writer = agent_info.get("writer") if agent_info else None
+        # The UI committed the command or task before asking, so the
+        # indexes can take it even if the agent is not connected here yet.
+        if persistence:
+            persistence.note_pending_delete_commands(agent_ip)
+            persistence.note_queued_tasks(agent_ip)
+        tasks = dispatch_queued_tasks(agent_ip, writer) if writer else []
+        sent = dispatch_queued_delete_commands(agent_ip, writer) if writer else []
+        return {
+            "type": "dispatch_result", "agent_ip": agent_ip, "connected": bool(writer), "sent": sent, "tasks": tasks,
+        }
+    return {"type": "error", "error": f"Unknown control request: {msg_type}"}
+
+
+def _serve_client(conn):
+    reader = FrameReader(conn)
+    try:
+        while True:
+            message = receive_message(reader)
+            if message is None:
+                break
+            conn.sendall(encode_message(_handle_request(message)))
+    except OSError as e:
+        print("[MASTER] Control channel error:", e)
+    finally:
+        conn.close()
+
+
+def _serve(server_socket):
+    while True:
+        conn, _ = server_socket.accept()
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        threading.Thread(target=_serve_client, args=(conn,), name="master-control", daemon=True).start()
+
+
+def start_control_server(port=None):
+    """Listen for UI control requests on a daemon thread. Returns False if disabled or taken."""
+    port = CONTROL_PORT if port is None else port
+    if not port:
+        return False
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    try:
+        server_socket.bind((CONTROL_HOST, port))
+    except OSError as e:
+        server_socket.close()
+        print(f"[MASTER] Control channel not started on {CONTROL_HOST}:{port}: {e}")
+        return False
+    server_socket.listen()
+    threading.Thread(target=_serve, args=(server_socket,), name="master-control-accept", daemon=True).start()
+    print(f"[MASTER] Control channel listening on {CONTROL_HOST}:{port}")
+    return True
+
+
+class ControlClient:
+    """
+    UI side of the channel. One connection is kept open and shared by
+    request threads; it is reopened after any error.
+    """
+
+    def __init__(self, port=None, timeout=CONTROL_TIMEOUT):
+        self.port = CONTROL_PORT if port is None else port
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._conn = None
+        self._reader = None
+
+    def _connect(self):
+        conn = socket.create_connection((CONTROL_HOST, self.port), timeout=self.timeout)
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._conn = conn
+        self._reader = FrameReader(conn)
+
+    def _close(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except OSError:
+                pass
+        self._conn = self._reader = None
+
+    def request(self, message):
+        """Send one request and return the reply, or None if the master did not answer."""
+        if not self.port:
+            return None
+        with self._lock:
+            # A connection idle since the last request may have been closed
+            # by a master restart. Nothing is due on an idle connection, so
+            # one that is readable is dead and is replaced before sending.
+            if self._conn is not None and select.select([self._conn], [], [], 0)[0]:
+                self._close()
+            try:
+                if self._conn is None:
+                    self._connect()
+                self._conn.sendall(encode_message(message))
+            except OSError:
+                self._close()
+                return None
+            # Once sent, the request is never repeated: a timeout does not
+            # mean the master did not act on it.
+            reply = receive_message(self._reader)
+            if reply is None:
+                self._close()
+            return reply
+
+    def dispatch_queued(self, agent_ip):
+        """
+        Ask the master to push `agent_ip`'s queued tasks and delete
+        commands now. Returns the ids of the delete commands it sent, or
+        None if it could not be reached.
+        """
+        reply = self.request({"type": "dispatch_queued", "agent_ip": agent_ip})
+        if not reply or reply.get("type") != "dispatch_result":
+            return None
+        return reply.get("sent", [])
+
+
+control_client = ControlClient()
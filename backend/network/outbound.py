@@ -0,0 +1,263 @@
+import asyncio
+import os
+import queue
+import socket
+import threading
+import time
+from collections import deque
+
+try:
+    from backend.network.protocol import encode_message
+except ModuleNotFoundError:
+    from network.protocol import encode_message
+from shared.codec import DEFAULT_CODEC
+from shared.framing import FrameError, FrameWriter
+
+
+OUTBOUND_QUEUE_SIZE = int(os.getenv("OUTBOUND_QUEUE_SIZE", "256"))
+OUTBOUND_BATCH_SIZE = int(os.getenv("OUTBOUND_BATCH_SIZE", "32"))
+
+_CLOSE = object()
+
+
+class _OutboundBase:
+    """
+    Common bookkeeping for per-agent writers.
+
+    Every frame to an agent goes through its writer, so HTTP handlers and
+    agent handler threads never share a socket. `enqueue` never blocks: when
+    the queue is full the message is dropped and counted, and the caller
+    decides how to fall back. A caller that needs to know when an accepted
+    message reached the socket passes `on_sent`, which the writer calls
+    with None once the frame is written or with an error string if it
+    never will be.
+    """
+
+    def __init__(self, agent_ip, max_queue=OUTBOUND_QUEUE_SIZE, batch_size=OUTBOUND_BATCH_SIZE):
+        self.agent_ip = agent_ip
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.closed = False
+        # Negotiated at register time; applies to frames enqueued afterwards.
+        self.compression = None
+        self.codec = DEFAULT_CODEC
+        self._stats_lock = threading.Lock()
+        self._enqueued = 0
+        self._dropped = 0
+        self._max_depth = 0
+        self._frames_sent = 0
+        self._batches_sent = 0
+        self._bytes_sent = 0
+        self._send_errors = 0
+        self._send_seconds = 0.0
+        self._last_error = None
+
+    def enqueue(self, message: dict, on_sent=None) -> bool:
+        """Queue a message for this agent; returns False if it was not accepted."""
+        if self.closed:
+            with self._stats_lock:
+                self._dropped += 1
+            return False
+        try:
+            frame = encode_message(message, self.compression, self.codec)
+        except (TypeError, ValueError, FrameError) as e:
+            print(f"[MASTER] Cannot encode {message.get('type')} for {self.agent_ip}: {e}")
+            with self._stats_lock:
+                self._dropped += 1
+            return False
+
+        if not self._put((frame, on_sent)):
+            with self._stats_lock:
+                self._dropped += 1
+            print(f"[MASTER] Outbound queue full for {self.agent_ip}; dropped {message.get('type')}")
+            return False
+
+        with self._stats_lock:
+            self._enqueued += 1
+            self._max_depth = max(self._max_depth, self.depth())
+        return True
+
+    def _record_batch(self, frames, nbytes, elapsed):
+        with self._stats_lock:
+            self._frames_sent += frames
+            self._batches_sent += 1
+            self._bytes_sent += nbytes
+            self._send_seconds += elapsed
+
+    @staticmethod
+    def _notify(batch, error=None):
+        # Runs on the writer thread or event loop; callbacks must not block.
+        for _, on_sent in batch:
+            if on_sent is not None:
+                try:
+                    on_sent(error)
+                except Exception as e:
+                    print(f"[MASTER] Outbound delivery callback failed: {e}")
+
+    def _record_error(self, error):
+        with self._stats_lock:
+            self._send_errors += 1
+            self._last_error = str(error)[:200]
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "queue_depth": self.depth(),
+                "queue_limit": self.max_queue,
+                "max_queue_depth": self._max_depth,
+                "enqueued": self._enqueued,
+                "dropped": self._dropped,
+                "frames_sent": self._frames_sent,
+                "batches_sent": self._batches_sent,
+                "bytes_sent": self._bytes_sent,
+                "send_seconds": round(self._send_seconds, 6),
+                "send_errors": self._send_errors,
+                "last_error": self._last_error,
+                "closed": self.closed,
+                "compression": self.compression,
+                "codec": self.codec.name,
+            }
+
+
+class OutboundWriter(_OutboundBase):
+    """Writer thread draining a bounded queue into a blocking socket."""
+
+    def __init__(self, conn, agent_ip, **kwargs):
+        super().__init__(agent_ip, **kwargs)
+        self._conn = conn
+        self._frames = FrameWriter(conn)
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def _put(self, item) -> bool:
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            return False
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _CLOSE:
+                return
+            batch = [item]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _CLOSE:
+                    stop = True
+                    break
+                batch.append(item)
+
+            if self.closed:
+                self._notify(batch, "connection closed")
+            else:
+                frames = [frame for frame, _ in batch]
+                started = time.perf_counter()
+                try:
+                    self._frames.send_frames(frames)
+                    self._record_batch(len(frames), sum(len(p) for p in frames), time.perf_counter() - started)
+                    self._notify(batch)
+                except OSError as e:
+                    self._record_error(e)
+                    print(f"[MASTER] Outbound send error to {self.agent_ip}: {e}")
+                    self._fail()
+                    self._notify(batch, str(e))
+            if stop:
+                return
+
+    def _fail(self):
+        # Wake the reader side so the session is torn down promptly.
+        self.closed = True
+        try:
+            self._conn.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def close(self):
+        # Shutting the socket down first fails a send blocked on a dead
+        # peer, so the thread wakes up even if it is stuck in one.
+        self._fail()
+        # Frames still queued will never be sent. Dropping them makes room
+        # for the sentinel, which must not be lost to a full queue.
+        while True:
+            try:
+                self._queue.put_nowait(_CLOSE)
+                return
+            except queue.Full:
+                pass
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                continue
+            if item is not _CLOSE:
+                self._notify([item], "connection closed")
+
+
+class AsyncOutboundWriter(_OutboundBase):
+    """
+    Event-loop writer for the asyncio master. `enqueue` may be called from
+    any thread; frames are batched into one `write` and `drain` applies the
+    socket's backpressure to this queue only.
+    """
+
+    def __init__(self, loop, stream_writer, agent_ip, **kwargs):
+        super().__init__(agent_ip, **kwargs)
+        self._loop = loop
+        self._stream = stream_writer
+        self._pending = deque()
+        self._depth_lock = threading.Lock()
+        self._wakeup = asyncio.Event()
+        self._task = loop.create_task(self._run())
+
+    def depth(self) -> int:
+        return len(self._pending)
+
+    def _put(self, item) -> bool:
+        with self._depth_lock:
+            if len(self._pending) >= self.max_queue:
+                return False
+            self._pending.append(item)
+        self._loop.call_soon_threadsafe(self._wakeup.set)
+        return True
+
+    async def _run(self):
+        while not self.closed:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._pending and not self.closed:
+                with self._depth_lock:
+                    count = min(len(self._pending), self.batch_size)
+                    batch = [self._pending.popleft() for _ in range(count)]
+                started = time.perf_counter()
+                try:
+                    data = b"".join(frame for frame, _ in batch)
+                    self._stream.write(data)
+                    await self._stream.drain()
+                    self._record_batch(len(batch), len(data), time.perf_counter() - started)
+                    self._notify(batch)
+                except OSError as e:
+                    self._record_error(e)
+                    print(f"[MASTER] Outbound send error to {self.agent_ip}: {e}")
+                    self.closed = True
+                    self._stream.close()
+                    self._notify(batch, str(e))
+        with self._depth_lock:
+            batch = list(self._pending)
+            self._pending.clear()
+        self._notify(batch, "connection closed")
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self._loop.call_soon_threadsafe(self._wakeup.set)
+        self._loop.call_soon_threadsafe(self._stream.close)
@@ -1,32 +1,78 @@
 import json
+import os
 import socket
+import time
+
+from shared.compression import (
+    DEFAULT_THRESHOLD,
+    STATS as COMPRESSION_STATS,
+    compress_payload,
+    decompress_payload,
+    parse_methods,
+)
+from shared.codec import DEFAULT_CODEC, codec_for_flags, parse_codecs
+from shared.framing import FLAG_LZMA, FLAG_ZLIB, FrameError, FrameReader, encode_frame
+
+
+# Methods the master is willing to use, in preference order; empty disables.
+COMPRESSION_METHODS = parse_methods(os.getenv("FRAME_COMPRESSION", "zlib,lzma"))
+COMPRESSION_THRESHOLD = int(os.getenv("COMPRESSION_THRESHOLD", str(DEFAULT_THRESHOLD)))
+# Payload codecs in preference order; JSON is always accepted as fallback.
+WIRE_CODECS = parse_codecs(os.getenv("WIRE_CODECS", "binary,json"))
+
+
+def encode_message(message: dict, compression=None, codec=DEFAULT_CODEC) -> bytes:
+    """
+    Serialize a message into a complete frame with the connection's codec,
+    compressing the payload when a method was negotiated.
+    """
+    payload = codec.encode(message)
+    flags, data = compress_payload(payload, compression, message.get("type"), COMPRESSION_THRESHOLD)
+    return encode_frame(data, flags | codec.flags)
+
 
 def send_message(conn, message: dict):
     try:
-        data = json.dumps(message).encode()
-        length = len(data).to_bytes(4, "big")
-        conn.sendall(length + data)
-    except socket.error as e:
+        conn.sendall(encode_message(message))
+    except (socket.error, FrameError) as e:
         print("[MASTER] Protocol send error:", e)
 
 
-def receive_message(conn):
-    try:
-        length_data = conn.recv(4)
-        if not length_data:
-            return None
+def decode_message(frame) -> dict:
+    flags, data = frame
+    started = time.thread_time()
+    payload = decompress_payload(flags, data)
+    elapsed = time.thread_time() - started
+    message = codec_for_flags(flags).decode(payload)
+    COMPRESSION_STATS.record("received", message.get("type"), len(payload), len(data), elapsed, bool(flags & (FLAG_ZLIB | FLAG_LZMA)))
+    return message
 
-        length = int.from_bytes(length_data, "big")
-        data = b""
 
-        while len(data) < length:
-            chunk = conn.recv(length - len(data))
-            if not chunk:
+def receive_messages(reader: FrameReader):
+    """
+    Block until at least one frame arrives and return every decoded message
+    from that read. Returns None when the connection is closed or broken.
+    """
+    try:
+        frames = reader.read_frames()
+        while not frames:
+            if reader.eof:
                 return None
-            data += chunk
+            frames = reader.read_frames()
+        return [decode_message(frame) for frame in frames]
+
+    except (socket.error, FrameError, json.JSONDecodeError) as e:
+        print("[MASTER] Protocol receive error:", e)
+        return None
 
-        return json.loads(data.decode())
 
-    except (socket.error, json.JSONDecodeError) as e:
+def receive_message(reader: FrameReader):
+    try:
+        frame = reader.read_frame()
+        if frame is None:
+            return None
+        return decode_message(frame)
+
+    except (socket.error, FrameError, json.JSONDecodeError) as e:
         print("[MASTER] Protocol receive error:", e)
         return None
@@ -1,15 +1,42 @@
+import os
 import socket
 import threading
 try:
     from backend.network.connection_handler import handle_agent
+    from backend.network.control import start_control_server
 except ModuleNotFoundError:
     from network.connection_handler import handle_agent
+    from network.control import start_control_server
+from shared import persistence
 
 HOST = "0.0.0.0"
 PORT = 5000
 
+# "threaded" keeps one handler thread per agent; "asyncio" multiplexes all
+# agent connections on a single event loop.
+MASTER_MODES = ("threaded", "asyncio")
+
+
+def start_master(mode=None):
+    mode = (mode or os.getenv("MASTER_SERVER_MODE", "threaded")).lower()
+    if mode not in MASTER_MODES:
+        raise ValueError(f"Unknown master mode: {mode}")
+
+    # Schema migrations run once here, before any agent can connect.
+    persistence.init_db()
+
+    # Lets a separate UI process push approved deletions to agents
+    # connected here without waiting for their next heartbeat.
+    start_control_server()
+
+    if mode == "asyncio":
+        try:
+            from backend.network.async_server import start_master_async
+        except ModuleNotFoundError:
+            from network.async_server import start_master_async
+        start_master_async(HOST, PORT)
+        return
 
-def start_master():
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     server_socket.bind((HOST, PORT))
@@ -1,3 +1,6 @@
+import atexit
+import os
+import threading
 import time
 from threading import Lock
 
@@ -6,45 +9,177 @@ try:
 except ModuleNotFoundError:
     persistence = None
 
+try:
+    from backend.orchestrator.event_bus import event_bus
+except ModuleNotFoundError:
+    from orchestrator.event_bus import event_bus
+
+# last_seen and status live here; persisted_agents is a write-behind copy
+# refreshed every AGENT_STATE_FLUSH_INTERVAL seconds (sooner when an agent
+# connects or disconnects) and on shutdown.
+AGENT_STATE_FLUSH_INTERVAL = float(os.getenv("AGENT_STATE_FLUSH_INTERVAL", "2.0"))
+
 _agents = {}
 _lock = Lock()
+# Bumped when an agent connects, disconnects or changes status; not for
+# last_seen alone, which moves with every heartbeat.
+_version = 0
+# agent_ip -> (status, last_seen) not yet written to persistence
+_dirty = {}
+_wakeup = threading.Event()
+_flusher = None
+_flush_stats = {
+    "updates": 0,
+    "coalesced": 0,
+    "flushes": 0,
+    "rows_written": 0,
+    "failed_flushes": 0,
+}
+
+
+def _mark_dirty(agent_ip, status, last_seen, urgent=False):
+    """Record the latest state for write-behind; caller holds `_lock`."""
+    global _flusher
+    _flush_stats["updates"] += 1
+    if agent_ip in _dirty:
+        _flush_stats["coalesced"] += 1
+    _dirty[agent_ip] = (status, last_seen)
+    if _flusher is None and persistence:
+        _flusher = threading.Thread(target=_flush_loop, name="agent-state-flusher", daemon=True)
+        _flusher.start()
+    if urgent:
+        _wakeup.set()
+
+
+def _flush_loop():
+    while True:
+        _wakeup.wait(AGENT_STATE_FLUSH_INTERVAL)
+        _wakeup.clear()
+        flush_agent_states()
+
+
+def flush_agent_states(timeout=None):
+    """
+    Write every dirty agent state in one batched transaction. Returns the
+    persistence Future (None if nothing was dirty); pass `timeout` to wait.
+    """
+    if not persistence:
+        return None
+    with _lock:
+        batch = list(_dirty.items())
+        _dirty.clear()
+    if not batch:
+        return None
+
+    future = persistence.save_agent_states(
+        [(ip, status, last_seen) for ip, (status, last_seen) in batch],
+        wait=False
+    )
+
+    def _done(f):
+        with _lock:
+            if f.exception() is not None:
+                _flush_stats["failed_flushes"] += 1
+                # Retry on the next flush unless a newer state arrived.
+                for ip, state in batch:
+                    _dirty.setdefault(ip, state)
+            else:
+                _flush_stats["flushes"] += 1
+                _flush_stats["rows_written"] += len(batch)
+
+    future.add_done_callback(_done)
+    if timeout is not None:
+        future.result(timeout)
+    return future
+
+
+def _bump_version():
+    """Caller holds `_lock`."""
+    global _version
+    _version += 1
+
+
+def get_registry_version():
+    """
+    Change counter for the in-memory agents and their statuses (resets on
+    restart). A `touch` does not move it.
+    """
+    with _lock:
+        return _version
 
 
-def register_agent(agent_ip, conn, addr):
+def get_agent_state_stats():
+    """
+    Write-behind counters: state updates seen, how many were coalesced
+    into an already dirty entry, and flushes/rows actually written.
+    """
+    with _lock:
+        stats = dict(_flush_stats)
+        stats["pending"] = len(_dirty)
+    stats["flush_interval"] = AGENT_STATE_FLUSH_INTERVAL
+    return stats
+
+
+def _flush_at_exit():
+    try:
+        flush_agent_states(timeout=5)
+    except Exception as e:
+        print(f"[MASTER] Final agent state flush failed: {e}")
+
+
+atexit.register(_flush_at_exit)
+
+
+def _publish_status(agent_ip, status, last_seen):
+    """Push a status change to UI subscribers; call without `_lock` held."""
+    event_bus.publish("agent", {"ip": agent_ip, "status": status, "last_seen": last_seen})
+
+
+def register_agent(agent_ip, conn, addr, writer=None):
+    now = time.time()
     with _lock:
         _agents[agent_ip] = {
             "conn": conn,
+            "writer": writer,
             "addr": addr,
             "status": "IDLE",
-            "last_seen": time.time()
+            "last_seen": now
         }
-    if persistence:
-        persistence.init_db()
-        persistence.upsert_agent(agent_ip, "IDLE")
+        _bump_version()
+        _mark_dirty(agent_ip, "IDLE", now, urgent=True)
+    _publish_status(agent_ip, "IDLE", now)
 
 
 def update_status(agent_ip, status):
+    now = time.time()
     with _lock:
-        if agent_ip in _agents:
-            _agents[agent_ip]["status"] = status
-            _agents[agent_ip]["last_seen"] = time.time()
-    if persistence:
-        persistence.upsert_agent(agent_ip, status)
+        info = _agents.get(agent_ip)
+        changed = info is None or info["status"] != status
+        if info is not None:
+            info["status"] = status
+            info["last_seen"] = now
+        if changed:
+            _bump_version()
+        _mark_dirty(agent_ip, status, now)
+    if changed:
+        _publish_status(agent_ip, status, now)
 
 
 def touch(agent_ip):
     with _lock:
-        if agent_ip in _agents:
-            _agents[agent_ip]["last_seen"] = time.time()
-    if persistence:
-        persistence.touch_agent(agent_ip)
+        info = _agents.get(agent_ip)
+        if info is not None:
+            info["last_seen"] = time.time()
+            _mark_dirty(agent_ip, info["status"], info["last_seen"])
 
 
 def remove_agent(agent_ip):
+    now = time.time()
     with _lock:
         _agents.pop(agent_ip, None)
-    if persistence:
-        persistence.upsert_agent(agent_ip, "OFFLINE")
+        _bump_version()
+        _mark_dirty(agent_ip, "OFFLINE", now, urgent=True)
+    _publish_status(agent_ip, "OFFLINE", now)
 
 
 def get_active_agents():
@@ -56,11 +191,24 @@ def get_active_agents():
         }
 
 
+def get_outbound_stats():
+    """
+    Per-agent outbound queue statistics for connected sessions.
+    """
+    with _lock:
+        writers = {ip: info.get("writer") for ip, info in _agents.items()}
+    return {ip: w.stats() for ip, w in writers.items() if w is not None}
+
+
 def mark_offline_inactive(timeout=30):
     now = time.time()
+    went_offline = []
     with _lock:
         for ip, info in _agents.items():
-            if now - info["last_seen"] > timeout:
+            if now - info["last_seen"] > timeout and info["status"] != "OFFLINE":
                 info["status"] = "OFFLINE"
-                if persistence:
-                    persistence.upsert_agent(ip, "OFFLINE")
+                _bump_version()
+                _mark_dirty(ip, "OFFLINE", now, urgent=True)
+                went_offline.append(ip)
+    for ip in went_offline:
+        _publish_status(ip, "OFFLINE", now)
@@ -0,0 +1,127 @@
+"""
+In-process publish/subscribe for pushing changes to the UI.
+
+Publishers (agent registry, scan ingestion, approval paths) call
+`event_bus.publish(type, data)`. Each event gets an increasing id and is
+serialized once. The /events stream gives every browser its own
+subscription. A reconnecting client passes the last id it saw and gets
+the events it missed replayed from a bounded history. When the history no
+longer reaches back that far, or a slow client's queue overflows, it gets
+a single "resync" event instead and should fetch a fresh snapshot.
+"""
+import json
+import os
+import queue
+import threading
+from collections import deque, namedtuple
+
+
+EVENT_HISTORY = int(os.getenv("EVENT_HISTORY", "1000"))
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "1000"))
+
+Event = namedtuple("Event", "id type data")
+
+
+class Subscription:
+    """One subscriber's bounded queue of events."""
+
+    def __init__(self, bus, maxsize):
+        self._bus = bus
+        self._queue = queue.Queue(maxsize)
+        self._overflowed = False
+
+    def _offer(self, event):
+        # Called with the bus lock held.
+        if self._overflowed:
+            return
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self._overflowed = True
+            self._bus._stats["resyncs"] += 1
+
+    def _resync(self):
+        self._overflowed = True
+
+    def get(self, timeout=None):
+        """
+        Next event, or None after `timeout` seconds without one. After an
+        overflow the queued events are discarded and a resync event is
+        returned in their place.
+        """
+        if self._overflowed:
+            with self._bus._lock:
+                self._overflowed = False
+                while True:
+                    try:
+                        self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                return Event(self._bus._next_id - 1, "resync", "{}")
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self._bus.unsubscribe(self)
+
+
+class EventBus:
+    def __init__(self, history=EVENT_HISTORY, queue_size=EVENT_QUEUE_SIZE):
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self._history = deque(maxlen=history)
+        self._subscribers = set()
+        self._queue_size = queue_size
+        self._stats = {"published": 0, "resyncs": 0}
+
+    def publish(self, event_type, data):
+        """Send an event to every subscriber. Returns the event id."""
+        payload = json.dumps(data, separators=(",", ":"), default=str)
+        with self._lock:
+            event = Event(self._next_id, event_type, payload)
+            self._next_id += 1
+            self._history.append(event)
+            self._stats["published"] += 1
+            for subscription in self._subscribers:
+                subscription._offer(event)
+        return event.id
+
+    def subscribe(self, last_event_id=None):
+        """
+        New subscription. With `last_event_id`, events published after it
+        are replayed first, or a resync is queued if they are no longer
+        all in the history (or the id is from before a restart).
+        """
+        subscription = Subscription(self, self._queue_size)
+        with self._lock:
+            self._subscribers.add(subscription)
+            if last_event_id is not None and last_event_id != self._next_id - 1:
+                oldest = self._history[0].id if self._history else self._next_id
+                if not oldest - 1 <= last_event_id < self._next_id:
+                    self._stats["resyncs"] += 1
+                    subscription._resync()
+                else:
+                    for event in self._history:
+                        if event.id > last_event_id:
+                            subscription._offer(event)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def last_id(self):
+        with self._lock:
+            return self._next_id - 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["subscribers"] = len(self._subscribers)
+            stats["last_id"] = self._next_id - 1
+        return stats
+
+
+event_bus = EventBus()
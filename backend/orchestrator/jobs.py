@@ -0,0 +1,131 @@
+"""
+Background jobs for long-running UI operations (bulk approve/reject,
+scan dispatch).
+
+A job runs on its own thread and reports progress through `Job.advance`,
+or `Job.resolve` for jobs that track an outcome per item (per agent for
+a dispatch). Every update is published as a "job" event so pages can
+follow along, and the latest state, with the per-item outcomes, can be
+polled at /jobs/<id>. Finished jobs are kept for a while so their
+outcome can still be read.
+"""
+import itertools
+import os
+import threading
+import time
+
+try:
+    from backend.orchestrator.event_bus import event_bus
+except ModuleNotFoundError:
+    from orchestrator.event_bus import event_bus
+
+
+JOB_HISTORY = int(os.getenv("JOB_HISTORY", "50"))
+
+
+class Job:
+    def __init__(self, job_id, kind, params, total):
+        self.id = job_id
+        self.kind = kind
+        self.params = params
+        self.total = total
+        self.processed = 0
+        self.counts = {}
+        self.outcomes = {}
+        self.state = "running"
+        self.error = None
+        self.started_at = time.time()
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def advance(self, processed=0, **counts):
+        """Add `processed` files and per-outcome counts, and publish progress."""
+        with self._lock:
+            self.processed += processed
+            for key, value in counts.items():
+                self.counts[key] = self.counts.get(key, 0) + value
+        self._publish()
+
+    def resolve(self, key, outcome, error=None):
+        """Record the outcome of one item, counting it as processed, and publish progress."""
+        with self._lock:
+            self.processed += 1
+            self.counts[outcome] = self.counts.get(outcome, 0) + 1
+            self.outcomes[key] = {"outcome": outcome, "error": error}
+        self._publish()
+
+    def _finish(self, state, error=None):
+        with self._lock:
+            self.state = state
+            self.error = error
+            self.finished_at = time.time()
+        self._publish()
+
+    def _publish(self):
+        event_bus.publish("job", self.snapshot(outcomes=False))
+
+    def snapshot(self, outcomes=True) -> dict:
+        with self._lock:
+            snapshot = {
+                "id": self.id,
+                "kind": self.kind,
+                "params": self.params,
+                "state": self.state,
+                "total": self.total,
+                "processed": self.processed,
+                "counts": dict(self.counts),
+                "error": self.error,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+            }
+            if outcomes:
+                snapshot["outcomes"] = dict(self.outcomes)
+            return snapshot
+
+
+class JobRegistry:
+    def __init__(self, history=JOB_HISTORY):
+        self._jobs = {}
+        self._ids = itertools.count(1)
+        self._history = history
+        self._lock = threading.Lock()
+
+    def start(self, kind, run, params=None, total=None):
+        """
+        Run `run(job)` on a new thread and return the Job right away.
+        An exception from `run` marks the job failed.
+        """
+        with self._lock:
+            job = Job(next(self._ids), kind, params or {}, total)
+            self._jobs[job.id] = job
+            self._prune()
+
+        def _target():
+            try:
+                run(job)
+            except Exception as e:
+                print(f"[MASTER] Job {job.id} ({kind}) failed: {e}")
+                job._finish("failed", str(e))
+            else:
+                job._finish("done")
+
+        job._publish()
+        threading.Thread(target=_target, name=f"job-{job.id}", daemon=True).start()
+        return job
+
+    def _prune(self):
+        finished = [j for j in self._jobs.values() if j.state != "running"]
+        for job in finished[:max(0, len(finished) - self._history)]:
+            del self._jobs[job.id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job.snapshot(outcomes=False) for job in jobs]
+
+
+job_registry = JobRegistry()
@@ -1,4 +1,7 @@
-from collections import defaultdict
+import os
+import threading
+import time
+from collections import OrderedDict
 
 try:
     # Works when imported as part of the backend package (e.g., from frontend/app.py).
@@ -7,16 +10,100 @@ except ModuleNotFoundError:
     # Fallback for legacy execution contexts inside backend/ package root.
     from api.verification import VerificationQueue
 
+try:
+    from shared import persistence
+except ModuleNotFoundError:
+    persistence = None
+
+
+# Files kept in memory across all result sets. Beyond this the least
+# recently used sets are spilled to the database and read back from there.
+RESULT_MEMORY_FILES = int(os.getenv("RESULT_MEMORY_FILES", "200000"))
+
+
+def _rows(chunks):
+    """Flatten stored chunks (row lists or columnar batches) into row dicts."""
+    return [row for chunk in chunks for row in chunk]
+
 
 class ResultCollector:
     """
     Collects scan results from agents and prepares them
     for human verification.
+
+    Each agent's results are kept as the chunks they arrived in, either
+    row lists or columnar batches, and only flattened when read. Result
+    sets live in an LRU bounded by `max_files`. Evicted sets, and chunks
+    that arrive for them later, are written to the database and served
+    from there. A set is released once a deletion report leaves none of
+    its files pending (see `release`).
     """
 
-    def __init__(self):
-        self._results = defaultdict(dict)
+    def __init__(self, max_files=RESULT_MEMORY_FILES):
+        self.max_files = max_files
+        # (task_id, agent_ip) -> chunks held in memory, least recently used first
+        self._results = OrderedDict()
+        self._files_in_memory = 0
+        # (task_id, agent_ip) -> chunks written to the database so far
+        self._spilled = {}
+        # (task_id, agent_ip) -> last spill write, so reads see it committed
+        self._spill_writes = {}
         self._verification_queue = VerificationQueue()
+        # (task_id, agent_ip) -> progress of a streamed result set
+        self._progress = {}
+        self._stats = {"spilled_sets": 0, "spilled_files": 0, "released_sets": 0}
+        self._lock = threading.Lock()
+        self._writes_lock = threading.Lock()
+
+    def _start_set(self, key):
+        """Forget any earlier result set for `key`. Call with the lock held."""
+        chunks = self._results.pop(key, None)
+        if chunks is not None:
+            self._files_in_memory -= sum(len(chunk) for chunk in chunks)
+        self._spilled.pop(key, None)
+        if persistence:
+            # Also clears a set stored before a restart.
+            self._track_write(key, persistence.drop_scan_results(*key, wait=False))
+        self._results[key] = []
+        self._verification_queue.add_result(agent_ip=key[1], task_id=key[0])
+
+    def _add_chunk(self, key, chunk):
+        """Append a chunk to `key`'s set and evict over budget. Call with the lock held."""
+        if key in self._spilled:
+            self._track_write(key, persistence.spill_scan_results(*key, self._spilled[key], [chunk], wait=False))
+            self._spilled[key] += 1
+            self._stats["spilled_files"] += len(chunk)
+            return
+        self._results[key].append(chunk)
+        self._results.move_to_end(key)
+        self._files_in_memory += len(chunk)
+        self._evict()
+
+    def _track_write(self, key, future):
+        # Writes commit in order, so only the latest per set needs waiting
+        # for. The done callback runs on the writer thread, which must not
+        # wait for `_lock` (its holder may be blocked submitting a write).
+        with self._writes_lock:
+            self._spill_writes[key] = future
+
+        def _done(f):
+            with self._writes_lock:
+                if self._spill_writes.get(key) is f:
+                    del self._spill_writes[key]
+
+        future.add_done_callback(_done)
+
+    def _evict(self):
+        if not persistence:
+            return
+        while self._files_in_memory > self.max_files and self._results:
+            key, chunks = self._results.popitem(last=False)
+            files = sum(len(chunk) for chunk in chunks)
+            self._files_in_memory -= files
+            self._track_write(key, persistence.spill_scan_results(*key, 0, chunks, wait=False))
+            self._spilled[key] = len(chunks)
+            self._stats["spilled_sets"] += 1
+            self._stats["spilled_files"] += files
 
     def add_scan_result(self, agent_ip, task_id, files):
         """
@@ -31,21 +118,101 @@ class ResultCollector:
             }
         ]
         """
+        key = (task_id, agent_ip)
+        with self._lock:
+            self._start_set(key)
+            self._add_chunk(key, files)
+            self._progress[key] = {
+                "chunks": 1,
+                "files": len(files),
+                "next_seq": 1,
+                "complete": True,
+                "started_at": time.time(),
+            }
+
+    def add_scan_chunk(self, agent_ip, task_id, seq, files):
+        """
+        Append one streamed chunk. Sequence 0 (or an unknown stream) starts
+        a fresh result set for the agent; gaps are logged but still kept.
+        """
+        key = (task_id, agent_ip)
+        with self._lock:
+            progress = self._progress.get(key)
+            if seq == 0 or progress is None or progress["complete"]:
+                self._start_set(key)
+                progress = {
+                    "chunks": 0,
+                    "files": 0,
+                    "next_seq": 0,
+                    "complete": False,
+                    "started_at": time.time(),
+                }
+                self._progress[key] = progress
 
-        self._results[task_id][agent_ip] = files
+            if seq != progress["next_seq"]:
+                print(f"[MASTER] Chunk gap from {agent_ip} task {task_id}: "
+                      f"expected {progress['next_seq']}, got {seq}")
+
+            self._add_chunk(key, files)
+            progress["chunks"] += 1
+            progress["files"] += len(files)
+            progress["next_seq"] = seq + 1
+
+    def finish_scan(self, agent_ip, task_id):
+        """
+        Mark a streamed result set as complete; returns files received.
+        """
+        key = (task_id, agent_ip)
+        with self._lock:
+            progress = self._progress.get(key)
+            if progress is None:
+                progress = {
+                    "chunks": 0,
+                    "files": 0,
+                    "next_seq": 0,
+                    "started_at": time.time(),
+                }
+                self._progress[key] = progress
+            progress["complete"] = True
+            return progress["files"]
 
-        # Forward to verification layer
-        self._verification_queue.add_result(
-            agent_ip=agent_ip,
-            task_id=task_id,
-            files=files
-        )
+    def get_scan_progress(self, task_id=None):
+        """
+        Return per-agent streaming progress, optionally for one task.
+        """
+        with self._lock:
+            return [
+                {
+                    "task_id": tid,
+                    "agent_ip": ip,
+                    "chunks": p["chunks"],
+                    "files": p["files"],
+                    "complete": p["complete"],
+                    "started_at": p["started_at"],
+                }
+                for (tid, ip), p in self._progress.items()
+                if task_id is None or tid == task_id
+            ]
 
     def get_task_results(self, task_id):
         """
-        Return all agent results for a task.
+        Return all agent results for a task, from memory or, for sets
+        that were spilled (or held before a restart), from the database.
         """
-        return self._results.get(task_id, {})
+        with self._lock:
+            in_memory = {}
+            for key in [k for k in self._results if k[0] == task_id]:
+                self._results.move_to_end(key)
+                in_memory[key[1]] = list(self._results[key])
+            with self._writes_lock:
+                writes = [f for k, f in self._spill_writes.items() if k[0] == task_id]
+        results = {agent_ip: _rows(chunks) for agent_ip, chunks in in_memory.items()}
+        if persistence:
+            for write in writes:
+                write.exception()
+            stored = persistence.load_scan_results(task_id, exclude=in_memory)
+            results.update({agent_ip: _rows(chunks) for agent_ip, chunks in stored.items()})
+        return results
 
     def get_pending_verification(self):
         """
@@ -57,14 +224,54 @@ class ResultCollector:
         """
         Return approved file lists for deletion.
         """
-        return self._verification_queue.get_approved(task_id)
+        approved = self._verification_queue.get_approved(task_id)
+        return {
+            agent_ip: files
+            for agent_ip, files in self.get_task_results(task_id).items()
+            if agent_ip in approved
+        }
+
+    def release(self, task_id, agent_ip):
+        """
+        Drop an agent's result set for a task from memory once it is
+        closed. Its stored copy is removed by persistence.close_scan_results;
+        call this from a request thread, not a write completion callback.
+        """
+        key = (task_id, agent_ip)
+        with self._lock:
+            chunks = self._results.pop(key, None)
+            if chunks is not None:
+                self._files_in_memory -= sum(len(chunk) for chunk in chunks)
+            released = chunks is not None or self._spilled.pop(key, None) is not None
+            self._progress.pop(key, None)
+            self._verification_queue.clear_agent(task_id, agent_ip)
+            if released:
+                self._stats["released_sets"] += 1
 
     def clear_task(self, task_id):
         """
         Remove task after deletion is completed.
         """
-        self._results.pop(task_id, None)
-        self._verification_queue.clear_task(task_id)
+        with self._lock:
+            for key in [k for k in self._results if k[0] == task_id]:
+                self._files_in_memory -= sum(len(chunk) for chunk in self._results.pop(key))
+            for key in [k for k in self._spilled if k[0] == task_id]:
+                del self._spilled[key]
+                if persistence:
+                    self._track_write(key, persistence.drop_scan_results(*key, wait=False))
+            self._verification_queue.clear_task(task_id)
+            for key in [k for k in self._progress if k[0] == task_id]:
+                del self._progress[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(
+                self._stats,
+                sets_in_memory=len(self._results),
+                files_in_memory=self._files_in_memory,
+                memory_limit_files=self.max_files,
+                sets_spilled=len(self._spilled),
+            )
 
 
 result_collector = ResultCollector()
@@ -1,12 +1,23 @@
+import os
+import threading
+import time
+
 try:
-    from backend.network.protocol import send_message
     from backend.orchestrator.agent_registry import update_status
 except ModuleNotFoundError:
-    from network.protocol import send_message
     from orchestrator.agent_registry import update_status
 
+try:
+    from shared import persistence
+except ModuleNotFoundError:
+    persistence = None
+
 
-def dispatch_scan_task(conn, agent_ip):
+# Seconds a fanned-out task may wait in an agent's outbound queue before
+# the dispatch reports it as timed out.
+DISPATCH_TIMEOUT = float(os.getenv("DISPATCH_TIMEOUT", "5"))
+
+def dispatch_scan_task(writer, agent_ip):
     task = {
         "type": "scan_task",
         "task_id": "test_scan_001",
@@ -14,7 +25,86 @@ def dispatch_scan_task(conn, agent_ip):
         "date_filter": None
     }
 
-    send_message(conn, task)
+    if not writer.enqueue(task):
+        print(f"[MASTER] Scan task not queued for {agent_ip}")
+        return
+
     update_status(agent_ip, "SCANNING")
+    if persistence:
+        persistence.record_task_dispatch(
+            task["task_id"], "scan", {"target_languages": task["target_languages"]}, {agent_ip: "sent"}, wait=False
+        )
 
     print(f"[MASTER] Scan task dispatched → {agent_ip}")
+
+
+def fan_out_task(job, task, targets, params=None, queue_offline=False, timeout=None):
+    """
+    Hand `task` to every agent in `targets` ({agent_ip: writer or None})
+    at once, then wait until each writer reports the frame written, at
+    most `timeout` seconds (default DISPATCH_TIMEOUT) from when it was
+    queued. Each agent's outcome is recorded on `job`:
+
+    - "sent": the frame was written to the agent's socket
+    - "queued": the agent is not connected and `queue_offline` stored
+      the task for when it next registers or sends a heartbeat
+    - "failed": not connected, refused by the writer or a send error
+    - "timeout": still unsent at the deadline; it may go out later
+
+    Agents that were sent or queued the task are recorded on it.
+    """
+    timeout = DISPATCH_TIMEOUT if timeout is None else timeout
+    task_id = task["task_id"]
+    done = threading.Condition()
+    written = {}
+    waiting = set()
+    dispatched = {}
+
+    def _on_sent(agent_ip):
+        def _record(error):
+            with done:
+                written[agent_ip] = error
+                done.notify()
+        return _record
+
+    for agent_ip, writer in targets.items():
+        if writer is not None:
+            if writer.enqueue(task, on_sent=_on_sent(agent_ip)):
+                waiting.add(agent_ip)
+            else:
+                job.resolve(agent_ip, "failed", "outbound queue full or closed")
+        elif queue_offline:
+            try:
+                persistence.enqueue_task(agent_ip, task_id, task)
+            except Exception as e:
+                job.resolve(agent_ip, "failed", str(e))
+            else:
+                dispatched[agent_ip] = "queued"
+                job.resolve(agent_ip, "queued")
+        else:
+            job.resolve(agent_ip, "failed", "not connected")
+
+    deadline = time.monotonic() + timeout
+    while waiting:
+        with done:
+            ready = {agent_ip: written[agent_ip] for agent_ip in waiting if agent_ip in written}
+            if not ready:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                done.wait(remaining)
+                continue
+        for agent_ip, error in ready.items():
+            waiting.discard(agent_ip)
+            if error is None:
+                update_status(agent_ip, "SCANNING")
+                dispatched[agent_ip] = "sent"
+                job.resolve(agent_ip, "sent")
+            else:
+                job.resolve(agent_ip, "failed", error)
+    for agent_ip in sorted(waiting):
+        job.resolve(agent_ip, "timeout", f"not written within {timeout:g}s")
+
+    if persistence and dispatched:
+        persistence.record_task_dispatch(task_id, "scan", params or {}, dispatched)
+    print(f"[MASTER] Task {task_id} dispatched: {job.snapshot(outcomes=False)['counts']}")
@@ -0,0 +1,82 @@
+"""
+Latency of /audit-logs queries over a large audit log.
+
+    python benchmarks/audit_benchmark.py [--rows 1000000] [--rounds 20]
+
+Fills a throwaway database (APP_DB_PATH is pointed at a temporary
+directory) with UI decisions and agent deletion reports spread over a
+year, then times `persistence.list_audit_log` for the
+newest page, a page deep into the history, a one-day time range, and a
+filtered page.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+_TMP = tempfile.mkdtemp(prefix="audit-bench-")
+os.environ["APP_DB_PATH"] = os.path.join(_TMP, "bench.db")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from shared import persistence  # noqa: E402
+
+
+YEAR = 365 * 86400
+
+
+def fill(rows, batch=10000):
+    started = time.perf_counter()
+    now = time.time()
+    for offset in range(0, rows, batch):
+        entries = []
+        for i in range(offset, min(offset + batch, rows)):
+            action = ("rejected", "delete_dispatched", "delete_confirmed", "delete_failed")[i % 4]
+            entries.append({
+                "id": i,
+                "created_at": now - YEAR + YEAR * i / rows,
+                "record_id": f"task-{i % 50}|10.0.0.{i % 20}|{i:040x}",
+                "task_id": f"task-{i % 50}",
+                "agent_ip": f"10.0.0.{i % 20}",
+                "file_hash": f"{i:040x}",
+                "filename": f"module_{i}.py",
+                "path": f"C:\\Users\\student\\Downloads\\module_{i}.py",
+                "action": action,
+                "action_by": "agent" if action in ("delete_confirmed", "delete_failed") else "admin-ui",
+            })
+        persistence.import_audit_entries("bench", entries)
+    print(f"fill {rows} rows: {time.perf_counter() - started:.1f} s")
+    return now
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    persistence.init_db()
+    now = fill(args.rows)
+
+    deep = None
+    for _ in range(50):
+        _, deep = persistence.list_audit_log(cursor=deep, limit=1000)
+    day = now - YEAR / 2
+    cases = [
+        ("newest 200", lambda: persistence.list_audit_log()[0]),
+        ("200 after 50000", lambda: persistence.list_audit_log(cursor=deep)[0]),
+        ("one day, 200", lambda: persistence.list_audit_log(since=day, until=day + 86400)[0]),
+        ("agent filter, 200", lambda: persistence.list_audit_log(agent_ip="10.0.0.7")[0]),
+        ("rejected, 200", lambda: persistence.list_audit_log(action="rejected")[0]),
+    ]
+    print(f"{'query':<20} {'rows':>7} {'ms/query':>10}")
+    for label, func in cases:
+        started = time.perf_counter()
+        for _ in range(args.rounds):
+            rows = func()
+        elapsed = (time.perf_counter() - started) / args.rounds
+        print(f"{label:<20} {len(rows):>7} {elapsed * 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Throughput of filter-based bulk reject over a large pending_files table.
+
+    python benchmarks/bulk_benchmark.py [--files 200000] [--batch 1000]
+
+Fills a throwaway database (APP_DB_PATH is pointed at a temporary
+directory) with scan results from several agents, then rejects every file
+of one language the way a bulk job does: keyset pages of `--batch` files,
+each audited and removed by one `persistence.resolve_pending` transaction.
+Reports files per second and the slowest batch, which bounds how long
+other writers wait behind the job.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+_TMP = tempfile.mkdtemp(prefix="bulk-bench-")
+os.environ["APP_DB_PATH"] = os.path.join(_TMP, "bench.db")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from shared import persistence  # noqa: E402
+
+
+LANGUAGES = ["python", "matlab"]
+
+
+def make_files(count, agent):
+    return [{
+        "filepath": f"C:\\Users\\student{agent}\\Downloads\\project_{i % 40}\\module_{i}.py",
+        "filename": f"module_{i}.py",
+        "size": 1024,
+        "modified_time": "2026-02-11T16:07:33",
+        "confidence": 0.9,
+        "language": LANGUAGES[i % len(LANGUAGES)],
+        "reason": "High confidence code",
+        "file_hash": f"{agent:04x}{i:060x}",
+    } for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=200000)
+    parser.add_argument("--agents", type=int, default=4)
+    parser.add_argument("--batch", type=int, default=1000)
+    args = parser.parse_args()
+
+    persistence.init_db()
+    per_agent = args.files // args.agents
+    for agent in range(1, args.agents + 1):
+        persistence.replace_pending_files(f"task-{agent}", f"10.0.0.{agent}",
+                                          make_files(per_agent, agent))
+    filters = {"language": "matlab"}
+    total = persistence.count_pending_files(**filters)
+    print(f"pending {per_agent * args.agents} rows, {total} matching {filters}")
+
+    cursor = None
+    done = 0
+    slowest = 0.0
+    started = time.perf_counter()
+    while True:
+        batch_started = time.perf_counter()
+        records, cursor = persistence.list_pending_page(cursor=cursor, limit=args.batch, **filters)
+        if records:
+            done += persistence.resolve_pending(
+                [([r["id"] for r in records], "rejected", "bulk benchmark", False, True)])
+        slowest = max(slowest, time.perf_counter() - batch_started)
+        if cursor is None:
+            break
+    elapsed = time.perf_counter() - started
+    print(f"rejected {done} files in {elapsed:.2f} s ({done / elapsed:,.0f} files/s), "
+          f"slowest batch {slowest * 1000:.1f} ms")
+    print(f"left pending {persistence.count_pending_files()}")
+
+
+if __name__ == "__main__":
+    main()
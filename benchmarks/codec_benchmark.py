@@ -0,0 +1,165 @@
+"""
+Compare the JSON and binary wire codecs on realistic protocol messages.
+
+    python benchmarks/codec_benchmark.py [--files 500] [--rounds 200]
+
+Reports encoded size (raw and zlib-compressed) and per-message encode and
+decode time for each hot message type, including scan result chunks in
+row and columnar form. For the result chunks it also times building the
+payload from result objects and the persistence insert parameters from
+the decoded message.
+"""
+import argparse
+import hashlib
+import os
+import random
+import sys
+import time
+import zlib
+from dataclasses import asdict, dataclass
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from shared import persistence  # noqa: E402
+from shared.codec import CODECS  # noqa: E402
+from shared.columnar import ColumnarBatch, encode_results  # noqa: E402
+
+
+LANGUAGES = ["python", "matlab", "java", "javascript", "html", "css", "perl"]
+REASONS = [
+    "High confidence {lang} code: function definition, import statement, class definition",
+    "Medium confidence {lang} code (score: {score}), needs LLM verification",
+    "Low confidence, no significant code patterns (score: {score})",
+]
+
+
+@dataclass
+class Result:
+    """Same fields as the agent's FileAnalysisResult."""
+    filepath: str
+    filename: str
+    size: int
+    modified_time: str
+    decision: str
+    confidence: float
+    language: str
+    method: str
+    reason: str
+    file_hash: str
+
+
+def make_files(count, seed=7):
+    rnd = random.Random(seed)
+    files = []
+    for i in range(count):
+        lang = rnd.choice(LANGUAGES)
+        folder = f"C:\\Users\\student{rnd.randint(1, 40)}\\Downloads\\Detwork_Test_Run\\project_{rnd.randint(1, 25)}\\src"
+        name = f"module_{i}.{lang[:2]}"
+        files.append({
+            "filepath": f"{folder}\\{name}",
+            "filename": name,
+            "size": rnd.randint(100, 400000),
+            "modified_time": f"2026-02-{rnd.randint(1, 28):02d}T{rnd.randint(0, 23):02d}:{rnd.randint(0, 59):02d}:00",
+            "decision": rnd.choice(["delete", "keep", "ambiguous"]),
+            "confidence": round(rnd.random(), 3),
+            "language": lang,
+            "method": "pattern-based",
+            "reason": rnd.choice(REASONS).format(lang=lang, score=rnd.randint(1, 30)),
+            "file_hash": hashlib.sha256(f"{i}".encode()).hexdigest(),
+        })
+    return files
+
+
+def make_messages(file_count):
+    files = make_files(file_count)
+    columns = encode_results(Result(**f) for f in files)
+    return {
+        "heartbeat": {
+            "type": "heartbeat",
+            "client_id": "LAB-PC-17",
+            "timestamp": "2026-02-11T16:07:33.120391",
+        },
+        "scan_results_chunk": {
+            "type": "scan_results_chunk",
+            "task_id": "scan-1a2b3c4d",
+            "client_id": "LAB-PC-17",
+            "timestamp": "2026-02-11T16:07:33.120391",
+            "seq": 0,
+            "files": files,
+        },
+        "scan_results_chunk/columns": {
+            "type": "scan_results_chunk",
+            "task_id": "scan-1a2b3c4d",
+            "client_id": "LAB-PC-17",
+            "timestamp": "2026-02-11T16:07:33.120391",
+            "seq": 0,
+            "columns": columns,
+        },
+        "deletion_report": {
+            "type": "deletion_report",
+            "task_id": "scan-1a2b3c4d",
+            "client_id": "LAB-PC-17",
+            "timestamp": "2026-02-11T16:07:33.120391",
+            "reports": [{
+                "file_hash": f["file_hash"],
+                "path": f["filepath"],
+                "status": "deleted",
+                "details": "deleted by hash",
+            } for f in files],
+        },
+        "delete_approved": {
+            "type": "delete_approved",
+            "task_id": "scan-1a2b3c4d",
+            "timestamp": "2026-02-11T16:07:33.120391",
+            "approved_entries": [{
+                "file_hash": f["file_hash"],
+                "path": f["filepath"],
+                "record_id": f"scan-1a2b3c4d|10.0.0.17|{f['file_hash']}",
+            } for f in files],
+            "approved_hashes": [f["file_hash"] for f in files],
+        },
+    }
+
+
+def bench(func, arg, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        func(arg)
+    return (time.perf_counter() - started) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=500, help="files per list-bearing message")
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'message':<28} {'codec':<7} {'bytes':>9} {'zlib':>9} {'encode us':>10} {'decode us':>10}")
+    for msg_type, message in make_messages(args.files).items():
+        rounds = args.rounds if msg_type != "heartbeat" else args.rounds * 50
+        for name, codec in CODECS.items():
+            payload = codec.encode(message)
+            assert codec.decode(payload) == message
+            encode_s = bench(codec.encode, message, rounds)
+            decode_s = bench(codec.decode, payload, rounds)
+            print(f"{msg_type:<28} {name:<7} {len(payload):>9} {len(zlib.compress(payload)):>9} "
+                  f"{encode_s * 1e6:>10.1f} {decode_s * 1e6:>10.1f}")
+
+    results = [Result(**f) for f in make_files(args.files)]
+    rows_message = {"files": [asdict(r) for r in results]}
+    columns_message = {"columns": encode_results(results)}
+    stages = [
+        ("agent: rows (asdict)", lambda r: [asdict(x) for x in r], results),
+        ("agent: columns", encode_results, results),
+        ("master: row params", lambda m: list(persistence._pending_params("t", "ip", m["files"])), rows_message),
+        ("master: column params",
+         lambda m: list(persistence._columnar_params("t", "ip", ColumnarBatch(m["columns"]))), columns_message),
+    ]
+    print()
+    print(f"{'result batch stage':<28} {'us':>10}")
+    for label, func, arg in stages:
+        print(f"{label:<28} {bench(func, arg, args.rounds) * 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
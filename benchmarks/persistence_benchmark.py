@@ -0,0 +1,170 @@
+"""
+Throughput of the shared/persistence.py calls the master makes most often.
+
+    python benchmarks/persistence_benchmark.py [--ops 2000] [--seconds 3]
+
+Runs against a throwaway database (APP_DB_PATH is pointed at a temporary
+directory before the module is imported). The mixed phase runs one writer
+thread doing heartbeats against several reader threads listing agents, the
+way agent handlers and dashboard polling overlap on the master. The
+concurrent phase has many handler threads writing at once, and the
+background phase queues writes without waiting (wait=False) and then
+flushes. The background phase only runs where the write pipeline exists.
+The rescan phase times replace_pending_files for a first ingest, an
+identical rescan, and a rescan where 1% of files changed, 1% vanished
+and 1% are new.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+_TMP = tempfile.mkdtemp(prefix="persistence-bench-")
+os.environ["APP_DB_PATH"] = os.path.join(_TMP, "bench.db")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from shared import persistence  # noqa: E402
+
+
+AGENTS = [f"10.0.0.{i}" for i in range(1, 51)]
+
+
+def make_files(count, offset=0):
+    return [{
+        "filepath": f"C:\\Users\\student\\Downloads\\Detwork_Test_Run\\src\\module_{offset + i}.py",
+        "filename": f"module_{offset + i}.py",
+        "size": 1024 + i,
+        "modified_time": "2026-02-11T16:07:33",
+        "decision": "delete",
+        "confidence": 0.9,
+        "language": "python",
+        "method": "pattern-based",
+        "reason": "High confidence python code: function definition, import statement",
+        "file_hash": f"{offset + i:064x}",
+    } for i in range(count)]
+
+
+def timed(label, count, func):
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<32} {count:>7} ops {elapsed:>8.3f} s {count / elapsed:>10.0f} ops/s")
+
+
+def concurrent_writes(ops, threads):
+    per_thread = ops // threads
+
+    def worker(offset):
+        for i in range(per_thread):
+            persistence.touch_agent(AGENTS[(offset + i) % len(AGENTS)])
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+
+
+def background_writes(ops):
+    for i in range(ops):
+        persistence.touch_agent(AGENTS[i % len(AGENTS)], wait=False)
+    persistence.flush_writes()
+
+
+def rescans(count):
+    first = make_files(count)
+    edited = [dict(f) for f in first[count // 100:]]
+    for f in edited[:count // 100]:
+        f["reason"] = "Medium confidence python code (score: 9), needs LLM verification"
+    edited += make_files(count // 100, offset=count)
+
+    for label, files in (("first ingest", first), ("identical rescan", first), ("rescan, 3% differ", edited)):
+        started = time.perf_counter()
+        result = persistence.replace_pending_files("rescan-task", AGENTS[1], files)
+        elapsed = time.perf_counter() - started
+        print(f"{'replace_pending_files ' + label:<40} {len(files):>7} files {elapsed:>8.3f} s"
+              + (f"  {result}" if result else ""))
+
+
+def mixed(seconds, readers):
+    stop = threading.Event()
+    counts = {"reads": 0, "writes": 0}
+    lock = threading.Lock()
+
+    def writer():
+        n = 0
+        while not stop.is_set():
+            persistence.touch_agent(AGENTS[n % len(AGENTS)])
+            n += 1
+        with lock:
+            counts["writes"] += n
+
+    def reader():
+        n = 0
+        while not stop.is_set():
+            persistence.list_agents()
+            n += 1
+        with lock:
+            counts["reads"] += n
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(readers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    print(f"{f'mixed: 1 writer + {readers} readers':<32} "
+          f"{counts['writes'] / seconds:>10.0f} writes/s {counts['reads'] / seconds:>10.0f} reads/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--ops", type=int, default=2000)
+    parser.add_argument("--chunks", type=int, default=20)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--rescan-files", type=int, default=50000)
+    args = parser.parse_args()
+
+    print(f"database: {persistence.DB_PATH}")
+    persistence.init_db()
+
+    timed("upsert_agent", args.ops,
+          lambda: [persistence.upsert_agent(AGENTS[i % len(AGENTS)], "IDLE") for i in range(args.ops)])
+    timed("touch_agent", args.ops,
+          lambda: [persistence.touch_agent(AGENTS[i % len(AGENTS)]) for i in range(args.ops)])
+    timed("list_agents", args.ops,
+          lambda: [persistence.list_agents() for _ in range(args.ops)])
+    timed("init_db", args.ops // 10,
+          lambda: [persistence.init_db() for _ in range(args.ops // 10)])
+
+    chunks = [make_files(args.chunk_size, i * args.chunk_size) for i in range(args.chunks)]
+    timed(f"append_pending_files x{args.chunk_size}", args.chunks,
+          lambda: [persistence.append_pending_files("bench-task", AGENTS[0], c) for c in chunks])
+    if hasattr(persistence, "claim_delete_commands"):
+        timed("claim_delete_commands", args.ops,
+              lambda: [persistence.claim_delete_commands(AGENTS[i % len(AGENTS)]) for i in range(args.ops)])
+    else:
+        timed("fetch_pending_delete_commands", args.ops,
+              lambda: [persistence.fetch_pending_delete_commands(AGENTS[i % len(AGENTS)]) for i in range(args.ops)])
+    timed("list_pending_files", 20,
+          lambda: [persistence.list_pending_files() for _ in range(20)])
+
+    timed(f"touch_agent, {args.writers} threads", args.ops,
+          lambda: concurrent_writes(args.ops, args.writers))
+    if hasattr(persistence, "flush_writes"):
+        timed("touch_agent wait=False + flush", args.ops, lambda: background_writes(args.ops))
+
+    rescans(args.rescan_files)
+    mixed(args.seconds, args.readers)
+    if hasattr(persistence, "write_stats"):
+        print(persistence.write_stats())
+
+
+if __name__ == "__main__":
+    main()
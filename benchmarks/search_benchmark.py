@@ -0,0 +1,102 @@
+"""
+Latency of /files-preview searches and pages over a large pending_files table.
+
+    python benchmarks/search_benchmark.py [--files 200000] [--rounds 5]
+
+Fills a throwaway database (APP_DB_PATH is pointed at a temporary
+directory) with scan results from several agents and tasks, then times
+`persistence.list_pending_files(search=...)` for selective, broad and
+non-matching terms. The ingest time includes keeping the search index in
+sync. The page phase compares loading every pending row (what
+/files-preview and /get-scan-results used to do) with one keyset page, a
+page deep into the table, a filtered page and a count. It only runs where
+`list_pending_page` exists.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+_TMP = tempfile.mkdtemp(prefix="search-bench-")
+os.environ["APP_DB_PATH"] = os.path.join(_TMP, "bench.db")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from shared import persistence  # noqa: E402
+
+
+LANGUAGES = ["python", "matlab", "java", "javascript", "perl"]
+TERMS = [
+    "module_12345.py",  # one file per agent
+    "project_7",        # one directory on every agent
+    "10.0.0.3",         # one agent
+    "matlab",           # a fifth of the table
+    "Detwork_Test_Run",  # every row
+    "no-such-file",     # nothing
+]
+
+
+def make_files(count, agent):
+    return [{
+        "filepath": f"C:\\Users\\student{agent}\\Downloads\\Detwork_Test_Run\\project_{i % 40}\\module_{i}.py",
+        "filename": f"module_{i}.py",
+        "size": 1024,
+        "modified_time": "2026-02-11T16:07:33",
+        "confidence": 0.9,
+        "language": LANGUAGES[i % len(LANGUAGES)],
+        "reason": "High confidence code",
+        "file_hash": f"{agent:04x}{i:060x}",
+    } for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=200000)
+    parser.add_argument("--agents", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    persistence.init_db()
+    per_agent = args.files // args.agents
+    started = time.perf_counter()
+    for agent in range(1, args.agents + 1):
+        persistence.replace_pending_files(f"task-{agent}", f"10.0.0.{agent}",
+                                          make_files(per_agent, agent))
+    print(f"ingest {per_agent * args.agents} rows: {time.perf_counter() - started:.2f} s")
+
+    print(f"{'search':<20} {'rows':>7} {'ms/query':>10}")
+    for term in TERMS:
+        started = time.perf_counter()
+        for _ in range(args.rounds):
+            rows = persistence.list_pending_files(search=term)
+        elapsed = (time.perf_counter() - started) / args.rounds
+        print(f"{term:<20} {len(rows):>7} {elapsed * 1000:>10.1f}")
+
+    if hasattr(persistence, "list_pending_page"):
+        pages(args.rounds)
+
+
+def pages(rounds):
+    deep = None
+    for _ in range(50):
+        _, deep = persistence.list_pending_page(cursor=deep, limit=1000)
+    cases = [
+        ("all rows", lambda: persistence.list_pending_files()),
+        ("first page", lambda: persistence.list_pending_page()[0]),
+        ("page after 50000", lambda: persistence.list_pending_page(cursor=deep)[0]),
+        ("task page", lambda: persistence.list_pending_page(task_id="task-2")[0]),
+        ("task+language page", lambda: persistence.list_pending_page(task_id="task-2", language="perl")[0]),
+        ("confidence page", lambda: persistence.list_pending_page(min_confidence=0.5)[0]),
+        ("count", lambda: [persistence.count_pending_files()]),
+    ]
+    print(f"{'page':<20} {'rows':>7} {'ms/query':>10}")
+    for label, func in cases:
+        started = time.perf_counter()
+        for _ in range(rounds):
+            rows = func()
+        elapsed = (time.perf_counter() - started) / rounds
+        print(f"{label:<20} {len(rows):>7} {elapsed * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
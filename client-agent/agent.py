@@ -20,7 +20,11 @@ class ClientAgent:
         self.communicator = MasterCommunicator(
             self.config['MASTER_IP'],
             self.config['MASTER_PORT'],
-            self.config['CLIENT_ID']
+            self.config['CLIENT_ID'],
+            compression=self.config['COMPRESSION'],
+            compression_threshold=self.config['COMPRESSION_THRESHOLD'],
+            codecs=self.config['CODECS'],
+            columnar_results=self.config['COLUMNAR_RESULTS']
         )
         self.running = False
         self.current_task = None
@@ -78,7 +82,9 @@ class ClientAgent:
         """Handle message from master"""
         msg_type = message.get('type')
         
-        if msg_type == 'scan_task':
+        if msg_type == 'register_ack':
+            self.communicator.apply_register_ack(message)
+        elif msg_type == 'scan_task':
             self._execute_scan_task(message)
         elif msg_type == 'delete_approved':
             self._execute_deletion(message)
@@ -100,8 +106,14 @@ class ClientAgent:
         files = self.scanner.scan(date_filter=date_filter)
         logger.info(f"Scanned directories: {self.config['SCAN_DIRECTORIES']}, found {len(files)} files")
         
-        # Analyze files
-        results = []
+        # Analyze files, streaming results to the master as they are produced
+        task_id = str(task.get('task_id') or 'unknown-task')
+        stream = self.communicator.open_result_stream(
+            task_id,
+            max_files=self.config['RESULT_CHUNK_FILES'],
+            max_bytes=self.config['RESULT_CHUNK_BYTES'],
+            max_interval=self.config['RESULT_CHUNK_INTERVAL']
+        )
         for filepath in files:
             logger.info(f"Analyzing file: {filepath}")
             result = self.detector.analyze_file(filepath)
@@ -117,7 +129,7 @@ class ClientAgent:
                 # Check if file is on a network share (UNC path)
                 if filepath.startswith('\\\\'):
                     logger.info(f"Network share file detected: {filepath} - sending directly to master")
-                    results.append(result)
+                    stream.add(result)
                 else:
                     # Check if on same drive/mount as quarantine directory
                     try:
@@ -126,7 +138,7 @@ class ClientAgent:
                         
                         if file_drive and quarantine_drive and file_drive.lower() != quarantine_drive.lower():
                             logger.info(f"File on different drive ({file_drive}) than quarantine ({quarantine_drive}) - sending directly to master")
-                            results.append(result)
+                            stream.add(result)
                         else:
                             # Same drive (or unmatched drives due to empty config value) – attempt
                             # to quarantine; if that fails we still send the entry so the master
@@ -136,22 +148,21 @@ class ClientAgent:
                             success, quarantine_path = self.quarantine.quarantine_file(filepath)
                             if success:
                                 result.filepath = quarantine_path
-                                results.append(result)
+                                stream.add(result)
                                 logger.info(f"Quarantined: {filepath} -> {quarantine_path}")
                             else:
                                 logger.error(f"Failed to quarantine: {filepath}, forwarding to master")
                                 # the file still needs analysis by the master, so include it
-                                results.append(result)
+                                stream.add(result)
                     except Exception as e:
                         logger.error(f"Error checking drives: {e}, sending directly to master")
-                        results.append(result)
+                        stream.add(result)
         
-        # Send results to master
-        logger.info(f"Sending {len(results)} results to master")
-        if results:
-            task_id = str(task.get('task_id') or 'unknown-task')
-            self.communicator.send_scan_results(task_id, results)
-        else:
+        # Flush the last chunk and tell the master the scan is complete
+        total = stream.close()
+        logger.info(f"Sent {total} results to master")
+        logger.info(f"Compression stats: {self.communicator.compression_stats().get('sent', {})}")
+        if not total:
             logger.info("No files found matching criteria")
     
     def _execute_deletion(self, message: dict):
@@ -207,7 +218,7 @@ class ClientAgent:
         logger.info(f"Deleted {deleted_count}/{len(reports)} files for task {task_id}")
 
         try:
-            self.communicator.send_deletion_report(task_id, reports)
+            self.communicator.send_deletion_report(task_id, reports, message.get('command_id'))
         except Exception as e:
             logger.error(f"Failed to send deletion report: {e}")
     
@@ -12,6 +12,19 @@ CONFIG = {
     'LOG_DIR': os.getenv('LOG_DIR', os.path.join(os.path.expanduser('~'), 'logs')),
     'HEARTBEAT_INTERVAL': 30,  
     'RECONNECT_DELAY': 10,  
+    # Scan results are streamed in chunks bounded by file count, approximate
+    # payload size, and time since the previous chunk.
+    'RESULT_CHUNK_FILES': int(os.getenv('RESULT_CHUNK_FILES', 500)),
+    'RESULT_CHUNK_BYTES': int(os.getenv('RESULT_CHUNK_BYTES', 512 * 1024)),
+    'RESULT_CHUNK_INTERVAL': float(os.getenv('RESULT_CHUNK_INTERVAL', 2.0)),
+    # Compression methods offered to the master at registration (empty = off)
+    'COMPRESSION': os.getenv('COMPRESSION', 'zlib,lzma'),
+    'COMPRESSION_THRESHOLD': int(os.getenv('COMPRESSION_THRESHOLD', 4096)),
+    # Payload codecs offered to the master, in preference order (JSON is
+    # always the fallback)
+    'CODECS': os.getenv('CODECS', 'binary,json'),
+    # Send scan result batches as columns instead of one dict per file
+    'COLUMNAR_RESULTS': os.getenv('COLUMNAR_RESULTS', 'true').lower() in ('1', 'true', 'yes'),
 }
 
 # Setup logging
@@ -0,0 +1,29 @@
+"""
+Wire framing, codecs and compression for the agent. The implementation is
+shared with the master (shared/framing.py, shared/codec.py,
+shared/compression.py) so both ends agree on header layout, size limits,
+payload encoding and compression flags.
+"""
+import os
+import sys
+
+_PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+if _PROJECT_ROOT not in sys.path:
+    # Appended, not prepended, so agent-local modules keep priority.
+    sys.path.append(_PROJECT_ROOT)
+
+from shared.framing import FLAG_LZMA, FLAG_ZLIB, FrameError, FrameReader, FrameWriter  # noqa: E402,F401
+from shared.codec import (  # noqa: E402,F401
+    CODECS,
+    DEFAULT_CODEC,
+    codec_for_flags,
+    parse_codecs,
+)
+from shared.columnar import COLUMNAR, encode_results  # noqa: E402,F401
+from shared.compression import (  # noqa: E402,F401
+    DEFAULT_THRESHOLD,
+    STATS as COMPRESSION_STATS,
+    compress_payload,
+    decompress_payload,
+    parse_methods,
+)
@@ -1,35 +1,72 @@
 import socket
-import json
+import time
 from datetime import datetime
 from typing import Optional,List
 from dataclasses import asdict
 
 from config import logger
 from detector import FileAnalysisResult
+from network.protocol import (
+    CODECS,
+    COLUMNAR,
+    DEFAULT_CODEC,
+    DEFAULT_THRESHOLD,
+    COMPRESSION_STATS,
+    FLAG_LZMA,
+    FLAG_ZLIB,
+    FrameReader,
+    FrameWriter,
+    codec_for_flags,
+    compress_payload,
+    decompress_payload,
+    encode_results,
+    parse_codecs,
+    parse_methods,
+)
 
 
 class MasterCommunicator:
     """Handles communication with master node"""
     
-    def __init__(self, master_ip: str, master_port: int, client_id: str):
+    def __init__(self, master_ip: str, master_port: int, client_id: str,
+                 compression: str = '', compression_threshold: int = DEFAULT_THRESHOLD,
+                 codecs: str = '', columnar_results: bool = False):
         self.master_ip = master_ip
         self.master_port = master_port
         self.client_id = client_id
         self.socket = None
         self.connected = False
+        self._reader = None
+        self._writer = None
+        self.offered_compression = parse_methods(compression)
+        self.compression_threshold = compression_threshold
+        self.offered_codecs = parse_codecs(codecs)
+        self.offered_result_formats = [COLUMNAR] if columnar_results else []
+        # Set only once the master acknowledges them in register_ack
+        self.compression = None
+        self.codec = DEFAULT_CODEC
+        self.columnar_results = False
     
     def connect(self) -> bool:
         """Connect to master node"""
         try:
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.socket.connect((self.master_ip, self.master_port))
+            self._reader = FrameReader(self.socket)
+            self._writer = FrameWriter(self.socket)
+            self.compression = None
+            self.codec = DEFAULT_CODEC
+            self.columnar_results = False
             self.connected = True
             
             # Send registration message
             self._send_message({
                 'type': 'register',
                 'client_id': self.client_id,
-                'timestamp': datetime.now().isoformat()
+                'timestamp': datetime.now().isoformat(),
+                'compression': self.offered_compression,
+                'codecs': self.offered_codecs,
+                'result_formats': self.offered_result_formats
             })
             
             logger.info(f"Connected to master at {self.master_ip}:{self.master_port}")
@@ -48,41 +85,47 @@ class MasterCommunicator:
             except Exception:
                 pass
             self.socket = None
+            self._reader = None
+            self._writer = None
             self.connected = False
     
     def _send_message(self, message: dict):
-        """Send JSON message to master"""
+        """Send a message to master using the negotiated codec"""
         try:
-            data = json.dumps(message).encode('utf-8')
-            # Send length prefix
-            self.socket.sendall(len(data).to_bytes(4, 'big'))
-            # Send data
-            self.socket.sendall(data)
+            codec = self.codec
+            data = codec.encode(message)
+            flags, data = compress_payload(
+                data, self.compression, message.get('type'), self.compression_threshold
+            )
+            # Header and payload go out in one locked sendall so the heartbeat
+            # thread cannot interleave with the main loop.
+            self._writer.send(data, flags | codec.flags)
         except Exception as e:
             logger.error(f"Failed to send message: {e}")
             self.connected = False
             raise
     
     def receive_message(self, timeout: float = 5.0) -> Optional[dict]:
-        """Receive JSON message from master"""
+        """Receive a message from master"""
         try:
             self.socket.settimeout(timeout)
-            # Receive length prefix
-            length_data = self.socket.recv(4)
-            if not length_data:
+            # Partial frames stay buffered in the reader across timeouts.
+            frame = self._reader.read_frame()
+            if frame is None:
+                logger.warning("Master closed the connection")
+                self.connected = False
                 return None
             
-            length = int.from_bytes(length_data, 'big')
-            
-            # Receive data
-            data = b''
-            while len(data) < length:
-                chunk = self.socket.recv(min(length - len(data), 4096))
-                if not chunk:
-                    return None
-                data += chunk
-            
-            return json.loads(data.decode('utf-8'))
+            flags, data = frame
+            started = time.thread_time()
+            payload = decompress_payload(flags, data)
+            elapsed = time.thread_time() - started
+            message = codec_for_flags(flags).decode(payload)
+            COMPRESSION_STATS.record(
+                'received', message.get('type'), len(payload), len(data), elapsed,
+                bool(flags & (FLAG_ZLIB | FLAG_LZMA))
+            )
+            return message
         
         except socket.timeout:
             return None
@@ -91,20 +134,73 @@ class MasterCommunicator:
             self.connected = False
             return None
     
+    def apply_register_ack(self, message: dict):
+        """Enable the compression method, codec and result format the master selected"""
+        method = message.get('compression')
+        self.compression = method if method in self.offered_compression else None
+        codec = message.get('codec')
+        self.codec = CODECS[codec] if codec in self.offered_codecs else DEFAULT_CODEC
+        self.columnar_results = message.get('result_format') in self.offered_result_formats
+        logger.info(
+            f"Master acknowledged registration; codec: {self.codec.name}, "
+            f"compression: {self.compression or 'none'}, "
+            f"results: {COLUMNAR if self.columnar_results else 'rows'}"
+        )
+
+    def compression_stats(self) -> dict:
+        """Per message type compression ratio and CPU time"""
+        return COMPRESSION_STATS.snapshot()
+
+    def _results_field(self, results: List[FileAnalysisResult]):
+        """Key and value carrying a result list: columns if negotiated, else rows"""
+        if self.columnar_results:
+            return 'columns', encode_results(results)
+        return 'files', [asdict(r) for r in results]
+
     def send_scan_results(self, task_id: str, results: List[FileAnalysisResult]):
         """Send scan results to master"""
-        serialized = [asdict(r) for r in results]
+        key, value = self._results_field(results)
         message = {
             'type': 'scan_results',
             'task_id': task_id,
             'client_id': self.client_id,
             'timestamp': datetime.now().isoformat(),
-            'files': serialized,
-            # Backward-compatibility for older consumers
-            'results': serialized
+            key: value,
         }
         self._send_message(message)
         logger.info(f"Sent {len(results)} scan results to master for task {task_id}")
+
+    def open_result_stream(self, task_id: str, max_files: int, max_bytes: int,
+                           max_interval: float) -> 'ScanResultStream':
+        """Start streaming scan results for a task in chunks"""
+        return ScanResultStream(self, task_id, max_files, max_bytes, max_interval)
+
+    def send_scan_results_chunk(self, task_id: str, seq: int, results: List[FileAnalysisResult]):
+        """Send one chunk of a streamed scan result set"""
+        key, value = self._results_field(results)
+        message = {
+            'type': 'scan_results_chunk',
+            'task_id': task_id,
+            'client_id': self.client_id,
+            'timestamp': datetime.now().isoformat(),
+            'seq': seq,
+            key: value,
+        }
+        self._send_message(message)
+        logger.info(f"Sent chunk {seq} ({len(results)} results) for task {task_id}")
+
+    def send_scan_results_end(self, task_id: str, chunks: int, total_files: int):
+        """Mark the end of a streamed scan result set"""
+        message = {
+            'type': 'scan_results_end',
+            'task_id': task_id,
+            'client_id': self.client_id,
+            'timestamp': datetime.now().isoformat(),
+            'chunks': chunks,
+            'total_files': total_files,
+        }
+        self._send_message(message)
+        logger.info(f"Finished streaming {total_files} results in {chunks} chunk(s) for task {task_id}")
     
     def send_heartbeat(self):
         """Send heartbeat to master"""
@@ -115,8 +211,8 @@ class MasterCommunicator:
         }
         self._send_message(message)
 
-    def send_deletion_report(self, task_id: str, reports: list):
-        """Send deletion outcome report to master."""
+    def send_deletion_report(self, task_id: str, reports: list, command_id=None):
+        """Send deletion outcome report to master, acknowledging `command_id` if given."""
         message = {
             'type': 'deletion_report',
             'task_id': task_id,
@@ -124,5 +220,55 @@ class MasterCommunicator:
             'timestamp': datetime.now().isoformat(),
             'reports': reports,
         }
+        if command_id is not None:
+            message['command_id'] = command_id
         self._send_message(message)
         logger.info(f"Sent deletion report with {len(reports)} entries for task {task_id}")
+
+
+class ScanResultStream:
+    """Buffers scan results and flushes them to the master in chunks"""
+
+    # Rough per-result JSON overhead for field names and punctuation.
+    _RESULT_OVERHEAD = 160
+
+    def __init__(self, communicator: MasterCommunicator, task_id: str,
+                 max_files: int, max_bytes: int, max_interval: float):
+        self.communicator = communicator
+        self.task_id = task_id
+        self.max_files = max(1, max_files)
+        self.max_bytes = max_bytes
+        self.max_interval = max_interval
+        self.seq = 0
+        self.total = 0
+        self._buffer = []
+        self._buffer_bytes = 0
+        self._last_flush = time.monotonic()
+
+    def add(self, result: FileAnalysisResult):
+        """Buffer one result, flushing if a size or time threshold is hit"""
+        self._buffer.append(result)
+        self._buffer_bytes += self._RESULT_OVERHEAD + sum(
+            len(str(v)) for v in vars(result).values()
+        )
+        if (len(self._buffer) >= self.max_files
+                or self._buffer_bytes >= self.max_bytes
+                or time.monotonic() - self._last_flush >= self.max_interval):
+            self.flush()
+
+    def flush(self):
+        """Send buffered results as the next chunk"""
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+        self.communicator.send_scan_results_chunk(self.task_id, self.seq, self._buffer)
+        self.seq += 1
+        self.total += len(self._buffer)
+        self._buffer = []
+        self._buffer_bytes = 0
+
+    def close(self) -> int:
+        """Flush remaining results and send the end marker"""
+        self.flush()
+        self.communicator.send_scan_results_end(self.task_id, self.seq, self.total)
+        return self.total
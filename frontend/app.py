@@ -1,6 +1,7 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, request, jsonify, render_template
 from datetime import datetime, timezone
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
+import hashlib
 import logging
 import os
 import sys
@@ -14,12 +15,24 @@ if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
 from backend.api.instructions import create_scan_instruction, SUPPORTED_LANGUAGES
-from backend.orchestrator.agent_registry import get_active_agents, update_status, mark_offline_inactive
-from backend.network.protocol import send_message
+from backend.orchestrator.agent_registry import (
+    get_active_agents,
+    get_agent_state_stats,
+    get_outbound_stats,
+    get_registry_version,
+    update_status,
+    mark_offline_inactive,
+)
 from backend.network.tcp_server import start_master
+from backend.network.connection_handler import dispatch_queued_delete_commands
+from backend.network.control import control_client
 from models import db, DeletionAuditLog
 from shared import persistence
 from backend.orchestrator.result_collector import result_collector
+from backend.orchestrator.event_bus import event_bus
+from backend.orchestrator.jobs import job_registry
+from backend.orchestrator.task_dispatcher import fan_out_task
+from backend.network.protocol import COMPRESSION_STATS
 import uuid
 from datetime import datetime
 
@@ -36,6 +49,20 @@ persistence.init_db()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 _MASTER_THREAD_STARTED = False
+# Seconds between keep-alive comments on idle /events streams.
+SSE_KEEPALIVE = float(os.getenv("SSE_KEEPALIVE", "15"))
+# Serialized bodies of the conditional GET endpoints, most recent last.
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+_response_cache = OrderedDict()
+_response_cache_lock = threading.Lock()
+# Seconds /client-status may show an agent's last_seen behind; heartbeats
+# alone do not invalidate its cached body.
+LAST_SEEN_MAX_AGE = float(os.getenv("LAST_SEEN_MAX_AGE", "10"))
+# Pending files handled per transaction by bulk approve/reject jobs.
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "1000"))
+_BULK_FILTER_KEYS = ("task_id", "agent_ip", "language", "min_confidence", "max_confidence", "path_prefix", "search")
+# Delete command queue states, as listed by /delete-commands.
+_DELETE_COMMAND_STATES = ("pending", "sent", "acked", "dead")
 
 
 def _start_master_thread_if_enabled():
@@ -91,8 +118,58 @@ def _infer_languages_from_instruction(instruction: str):
     return list(inferred)
 
 
-def _flatten_pending_files(search: str = ""):
-    return persistence.list_pending_files(search=search)
+def _cached_json(version, build):
+    """
+    JSON response for this request (path and query string), rebuilt only
+    when `version` changes. `build()` returns (payload, expires_at), where
+    expires_at (epoch seconds) bounds how long the body stays valid if it
+    also depends on the clock, or is None. The ETag hashes the body, and
+    a matching If-None-Match gets 304 without a body.
+    """
+    key = request.full_path
+    with _response_cache_lock:
+        entry = _response_cache.get(key)
+    if entry is None or entry[0] != version or (entry[3] is not None and time.time() >= entry[3]):
+        payload, expires_at = build()
+        body = app.json.dumps(payload)
+        entry = (version, body, hashlib.sha1(body.encode("utf-8")).hexdigest(), expires_at)
+    with _response_cache_lock:
+        _response_cache[key] = entry
+        _response_cache.move_to_end(key)
+        while len(_response_cache) > RESPONSE_CACHE_SIZE:
+            _response_cache.popitem(last=False)
+
+    _, body, etag, _ = entry
+    if etag in request.if_none_match:
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+def _pending_filters_from_args(args):
+    """Server-side pending file filters from query string arguments."""
+    return {
+        "task_id": args.get("task_id", "").strip() or None,
+        "agent_ip": args.get("agent_ip", "").strip() or None,
+        "language": args.get("language", "").strip().lower() or None,
+        "min_confidence": args.get("min_confidence", type=float),
+        "max_confidence": args.get("max_confidence", type=float),
+        "search": args.get("search", "").strip(),
+        "approved": {"0": False, "1": True}.get(args.get("approved")),
+    }
+
+
+def _pending_page(args, **filters):
+    """A keyset page of pending files for `args` (cursor, limit and filters)."""
+    filters = {**_pending_filters_from_args(args), **filters}
+    return persistence.list_pending_page(
+        cursor=args.get("cursor") or None,
+        limit=args.get("limit", type=int),
+        **filters
+    )
 
 
 def _group_records_by_agent(records):
@@ -107,8 +184,34 @@ def _group_records_by_agent(records):
     return grouped
 
 
-def _remove_records_from_queue(records):
-    persistence.delete_pending_by_ids([r["id"] for r in records])
+def _start_dispatch(task, targets, params, queue_offline=False):
+    """
+    Fan `task` out to `targets` ({agent_ip: writer or None}) on a background
+    job and answer right away; per-agent outcomes are read from /jobs/<id>.
+    With `queue_offline`, agents without a session here have the task
+    queued, and the master is asked to hand it to those connected to it.
+    """
+    def run(job):
+        fan_out_task(job, task, targets, params, queue_offline=queue_offline)
+        queued = [agent_ip for agent_ip, outcome in job.snapshot()["outcomes"].items()
+                  if outcome["outcome"] == "queued"]
+        for agent_ip in queued:
+            control_client.dispatch_queued(agent_ip)
+
+    job = job_registry.start(
+        "dispatch",
+        run,
+        params=dict(params, task_id=task["task_id"]),
+        total=len(targets),
+    )
+    logger.info("Dispatch job %s started for task %s to %d agent(s)", job.id, task["task_id"], len(targets))
+    return jsonify(dict(
+        params,
+        message=f"Dispatching to {len(targets)} agent(s)",
+        task_id=task["task_id"],
+        job_id=job.id,
+        total=len(targets),
+    )), 202
 
 
 @app.route('/scan', methods=['POST'])
@@ -138,38 +241,19 @@ def scan():
                 'created_at': datetime.utcnow().isoformat()
             }
 
-        # Attempt to send to in-memory active agents; if agent not connected, enqueue task
+        # Target agents not marked OFFLINE in persistence. Those connected
+        # here get the task now; the rest have it queued for their heartbeat.
         active_memory = get_active_agents()
-        sent = 0
-        queued = 0
-        failed = []
-
-        # Use persisted agents list to know which agents to target
-        persisted = persistence.list_agents()
-        for item in persisted:
-            agent_ip = item.get('agent_ip')
-            raw_status = item.get('status', 'OFFLINE')
-            # only target agents not marked OFFLINE in persistence
-            if raw_status == 'OFFLINE':
-                continue
-
-            info = active_memory.get(agent_ip)
-            if info and info.get('conn'):
-                try:
-                    send_message(info['conn'], task)
-                    update_status(agent_ip, 'SCANNING')
-                    sent += 1
-                except Exception:
-                    failed.append(agent_ip)
-            else:
-                # agent not connected right now; enqueue task to be delivered on heartbeat
-                persistence.enqueue_task(agent_ip, task['task_id'], task)
-                queued += 1
-
-        if sent == 0 and queued == 0:
+        targets = {
+            item.get('agent_ip'): (active_memory.get(item.get('agent_ip')) or {}).get('writer')
+            for item in persistence.list_agents()
+            if item.get('status', 'OFFLINE') != 'OFFLINE'
+        }
+        if not targets:
             return jsonify({'error': 'No active agents available'}), 400
 
-        return jsonify({'task_id': task['task_id'], 'sent_to': sent, 'queued': queued, 'failed_agents': failed, 'results': []})
+        params = {k: v for k, v in task.items() if k in ('target_languages', 'custom')}
+        return _start_dispatch(task, targets, params, queue_offline=True)
     except Exception as e:
         logger.exception('Error handling scan request')
         return jsonify({'error': 'Internal server error'}), 500
@@ -181,25 +265,200 @@ def scan_results():
     if not task_id:
         return jsonify({'error': 'task_id required'}), 400
     results = result_collector.get_task_results(task_id)
-    return jsonify({'task_id': task_id, 'results': results})
-
-
-def _persist_audit_logs(records, action: str, notes: str = ""):
-    for rec in records:
-        db.session.add(DeletionAuditLog(
-            record_id=rec.get("id", ""),
-            task_id=rec.get("task_id"),
-            agent_ip=rec.get("agent_ip"),
-            file_hash=rec.get("file_hash"),
-            filename=rec.get("filename", "unknown"),
-            path=rec.get("path", ""),
-            language=rec.get("language"),
-            confidence=rec.get("confidence"),
-            action=action,
-            notes=notes,
-            created_at=datetime.now()
-        ))
-    db.session.commit()
+    progress = result_collector.get_scan_progress(task_id)
+    return jsonify({'task_id': task_id, 'results': results, 'progress': progress})
+
+
+@app.route('/scan-progress', methods=['GET'])
+def scan_progress():
+    """Streaming progress per task/agent; `active` lists scans still running."""
+    task_id = request.args.get('task_id')
+    progress = result_collector.get_scan_progress(task_id)
+    return jsonify({
+        'progress': progress,
+        'active': [p for p in progress if not p['complete']],
+    })
+
+
+def _resolve_records(records, decisions, publish_rows=True):
+    """
+    Apply `decisions` (see persistence.resolve_pending) to pending
+    `records` in one transaction and tell UI subscribers. With
+    `publish_rows` the events carry the audit rows and removed ids. Bulk
+    jobs send counts only and let pages reload. Returns files audited.
+    """
+    result = persistence.resolve_pending(decisions, return_rows=publish_rows)
+    by_id = {r["id"]: r for r in records}
+    removed = defaultdict(list)
+    for record_ids, _, _, _, remove in decisions:
+        if remove:
+            for rid in record_ids:
+                rec = by_id[rid]
+                removed[(rec.get("agent_ip"), rec.get("task_id"))].append(rid)
+    for (agent_ip, task_id), ids in removed.items():
+        change = {"task_id": task_id, "agent_ip": agent_ip, "added": 0, "changed": 0, "removed": len(ids)}
+        if publish_rows:
+            change["ids"] = ids
+        event_bus.publish("files", change)
+    if not publish_rows:
+        return result
+    # Dispatch failures are kept for troubleshooting but hidden from the
+    # audit view, so not pushed either.
+    visible = [row for row in result if row["action"] != "delete_dispatch_failed"]
+    if visible:
+        event_bus.publish("audit", visible)
+    return len(result)
+
+
+def _queue_delete_command(agent_ip, task_id, payload, writer=None):
+    """
+    Store a delete command in the durable queue, then push it to the
+    agent right away: through `writer` when the agent's session lives in
+    this process, otherwise by asking the master over the control channel.
+    Returns True if it was sent now; otherwise it goes out on the agent's
+    next heartbeat. Either way it stays leased until the agent's deletion
+    report acks it, and is sent again if the report never comes.
+    """
+    cmd_id = persistence.enqueue_delete_command(agent_ip, task_id, payload)
+    try:
+        if writer is not None:
+            sent = dispatch_queued_delete_commands(agent_ip, writer)
+        else:
+            sent = control_client.dispatch_queued(agent_ip)
+    except Exception as e:
+        logger.error("Failed to push delete command %s to %s: %s", cmd_id, agent_ip, e)
+        return False
+    if sent and cmd_id in sent:
+        logger.info("Dispatched delete command %s for %s task=%s", cmd_id, agent_ip, task_id)
+        return True
+    return False
+
+
+def _approve_records(selected, publish_rows=True):
+    """
+    Queue a delete command per agent and task for pending `selected` rows
+    and push each to its agent right away where possible. Records the
+    outcome per file and returns the counts. The files stay pending, marked
+    approved, until the agent's deletion report removes them; files another
+    request approved first are skipped.
+    """
+    approved = set(persistence.approve_pending([r["id"] for r in selected]))
+    selected = [r for r in selected if r["id"] in approved]
+    entries_by_agent = _group_records_by_agent(selected)
+    active_agents = get_active_agents()
+
+    sent_to = 0
+    queued = 0
+    delivered_record_ids = set()
+    queued_record_ids = set()
+    undelivered_agents = []
+
+    for (agent_ip, task_id), approved_entries in entries_by_agent.items():
+        payload = {
+            "type": "delete_approved",
+            "task_id": task_id,
+            "approved_entries": approved_entries,
+            "approved_hashes": [x.get("file_hash", "") for x in approved_entries if x.get("file_hash")],
+            "timestamp": _now_iso(),
+        }
+        agent_info = active_agents.get(agent_ip)
+        writer = agent_info.get("writer") if agent_info else None
+        record_ids = {item["record_id"] for item in approved_entries if item.get("record_id")}
+
+        try:
+            sent = _queue_delete_command(agent_ip, task_id, payload, writer)
+        except Exception as e:
+            logger.error("Failed to queue delete command for %s: %s", agent_ip, e)
+            undelivered_agents.append(agent_ip)
+            continue
+        if sent:
+            update_status(agent_ip, "DELETION_DISPATCHED")
+            sent_to += 1
+            delivered_record_ids |= record_ids
+        else:
+            queued += 1
+            queued_record_ids |= record_ids
+            logger.info("Queued delete command for %s task=%s", agent_ip, task_id)
+
+    delivered = [r["id"] for r in selected if r.get("id") in delivered_record_ids]
+    queued_ids = [r["id"] for r in selected if r.get("id") in queued_record_ids]
+    undelivered = [r["id"] for r in selected
+                   if r.get("id") not in delivered_record_ids and r.get("id") not in queued_record_ids]
+    if undelivered:
+        persistence.release_pending(undelivered)
+
+    _resolve_records(selected, [
+        (delivered, "delete_dispatched", f"Approved in UI and dispatched to {sent_to} agent(s); pending until reported",
+         False, False),
+        (queued_ids, "delete_queued", "Delete command queued; will dispatch on next agent heartbeat", False, False),
+        (undelivered, "delete_dispatch_failed", "Agent not connected or dispatch failed; kept pending", True, False),
+    ], publish_rows=publish_rows)
+    changed = defaultdict(int)
+    for r in selected:
+        if r["id"] in delivered_record_ids or r["id"] in queued_record_ids:
+            changed[(r.get("agent_ip"), r.get("task_id"))] += 1
+    for (agent_ip, task_id), count in changed.items():
+        event_bus.publish("files", {"task_id": task_id, "agent_ip": agent_ip, "added": 0, "changed": count, "removed": 0})
+
+    return {
+        "dispatched": len(delivered),
+        "queued": len(queued_ids),
+        "failed": len(undelivered),
+        "sent_to_agents": sent_to,
+        "queued_agents": queued,
+        "undelivered_agents": sorted(set(undelivered_agents)),
+    }
+
+
+def _parse_time_arg(value):
+    """Epoch seconds from a query argument given as a number or ISO 8601 time."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid time: {value}")
+    return parsed.timestamp()
+
+
+def _import_legacy_audit_log(batch=10000):
+    """
+    Move rows from the UI's old deletion_audit_log table into the shared
+    audit log. Safe to interrupt: imported rows are skipped on the next run.
+    """
+    moved = 0
+    with app.app_context():
+        while True:
+            rows = DeletionAuditLog.query.order_by(DeletionAuditLog.id).limit(batch).all()
+            if not rows:
+                break
+            persistence.import_audit_entries("ui", [{
+                "id": row.id,
+                "created_at": row.created_at.timestamp() if row.created_at else 0.0,
+                "record_id": row.record_id,
+                "task_id": row.task_id,
+                "agent_ip": row.agent_ip,
+                "file_hash": row.file_hash,
+                "filename": row.filename,
+                "path": row.path,
+                "language": row.language,
+                "confidence": row.confidence,
+                "action": row.action,
+                "action_by": row.action_by,
+                "notes": row.notes,
+            } for row in rows])
+            DeletionAuditLog.query.filter(DeletionAuditLog.id <= rows[-1].id).delete()
+            db.session.commit()
+            moved += len(rows)
+    if moved:
+        logger.info("Moved %d audit row(s) into the shared audit log", moved)
+
+
+_import_legacy_audit_log()
 
 
 @app.route("/")
@@ -217,7 +476,8 @@ def submit_instruction():
     """Accepts a scan instruction from the dashboard UI.
 
     Previously this endpoint was referred to as "deletion instruction" but
-    it now only dispatches a *scan* task to agents. The client-side code
+    it now only dispatches a *scan* task to agents, on a background job
+    whose id is returned right away (202). The client-side code
     redirects the user to the verification page where any pending files can
     be approved or rejected for actual deletion.
     """
@@ -244,31 +504,8 @@ def submit_instruction():
             logger.warning("No active agents available")  # Debugging
             return jsonify({"error": "No active agents available"}), 400
 
-        dispatched = 0
-        failed = []
-        for agent_ip, info in active_agents.items():
-            conn = info.get("conn")
-            if conn is None:
-                failed.append(agent_ip)
-                logger.warning(f"No connection for agent {agent_ip}")  # Debugging
-                continue
-
-            try:
-                send_message(conn, task)
-                update_status(agent_ip, "SCANNING")
-                dispatched += 1
-                logger.info(f"Dispatched to {agent_ip}")  # Debugging
-            except Exception as e:
-                failed.append(agent_ip)
-                logger.error("Failed dispatch to %s: %s", agent_ip, e)
-
-        logger.info("Task %s dispatched to %d agents", task["task_id"], dispatched)
-        return jsonify({
-            "message": f"Instruction dispatched to {dispatched} agent(s)",
-            "task_id": task["task_id"],
-            "target_languages": target_languages,
-            "failed_agents": failed
-        })
+        targets = {agent_ip: info.get("writer") for agent_ip, info in active_agents.items()}
+        return _start_dispatch(task, targets, {"target_languages": target_languages})
     except Exception as e:
         logger.error("Error submitting instruction: %s", e)
         return jsonify({"error": "Internal server error"}), 500
@@ -279,227 +516,296 @@ def get_scan_results():
     task_id = request.args.get("task_id")
     if not task_id:
         return jsonify({"error": "task_id required"}), 400
-    results = [r for r in persistence.list_pending_files() if r.get("task_id") == task_id]
-    return jsonify({"results": results})
+    def build():
+        results, next_cursor = _pending_page(request.args, task_id=task_id)
+        return {"results": results, "next_cursor": next_cursor}, None
+
+    try:
+        return _cached_json(persistence.data_versions("pending_files"), build)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+
 @app.route("/client-status", methods=["GET"])
 def clients_status():
     try:
-        status_list = []
-        now = time.time()
+        def build():
+            status_list, expires_at = _build_client_status()
+            refresh_at = time.time() + LAST_SEEN_MAX_AGE
+            return status_list, refresh_at if expires_at is None else min(expires_at, refresh_at)
+
+        # Both versions move when agents join, leave or change status, not
+        # with every heartbeat; last_seen is refreshed by expiry instead.
+        version = (get_registry_version(),) + persistence.data_versions("agents")
+        return _cached_json(version, build)
+    except Exception as e:
+        logger.error("Error getting client status: %s", e)
+        return jsonify({"error": "Internal server error"}), 500
+
+
+def _build_client_status():
+    """
+    Agents seen within the last 60s, and when the first of them drops out
+    of that window (the response changes then even without a write).
+    """
+    status_list = []
+    expires_at = None
+    now = time.time()
 
         # Load persisted agents into a map for ordering and base data
-        persisted = {p.get('agent_ip'): p for p in persistence.list_agents()}
+    persisted = {p.get('agent_ip'): p for p in persistence.list_agents()}
+
+    # Merge in-memory active agents to ensure currently connected sockets appear
+    active_memory = get_active_agents()
+    for ip, info in active_memory.items():
+        # Update persisted entry or create a synthetic one
+        persisted[ip] = {
+            'agent_ip': ip,
+            'status': info.get('status', 'IDLE'),
+            'last_seen': info.get('last_seen')
+        }
+
+    # Now build the list, but only include those seen within the last 60s
+    idx = 1
+    for agent_ip in sorted(persisted.keys()):
+        item = persisted[agent_ip]
+        raw_status = item.get('status', 'OFFLINE')
+        last_seen_ts = item.get('last_seen') or 0
+        if last_seen_ts and (now - float(last_seen_ts)) < 60:
+            last_seen = datetime.fromtimestamp(float(last_seen_ts), tz=timezone.utc).isoformat()
+            status_list.append({
+                'id': idx,
+                'name': f'Agent {idx}',
+                'ip': agent_ip,
+                'ip_address': agent_ip,
+                'status': 'online' if raw_status != 'OFFLINE' else 'offline',
+                'raw_status': raw_status,
+                'last_seen': last_seen
+            })
+            idx += 1
+            drops_out = float(last_seen_ts) + 60
+            expires_at = drops_out if expires_at is None else min(expires_at, drops_out)
+
+    return status_list, expires_at
 
-        # Merge in-memory active agents to ensure currently connected sockets appear
-        active_memory = get_active_agents()
-        for ip, info in active_memory.items():
-            # Update persisted entry or create a synthetic one
-            persisted[ip] = {
-                'agent_ip': ip,
-                'status': info.get('status', 'IDLE'),
-                'last_seen': info.get('last_seen')
-            }
 
-        # Now build the list, but only include those seen within the last 60s
-        idx = 1
-        for agent_ip in sorted(persisted.keys()):
-            item = persisted[agent_ip]
-            raw_status = item.get('status', 'OFFLINE')
-            last_seen_ts = item.get('last_seen') or 0
-            if last_seen_ts and (now - float(last_seen_ts)) < 60:
-                last_seen = datetime.fromtimestamp(float(last_seen_ts), tz=timezone.utc).isoformat()
-                status_list.append({
-                    'id': idx,
-                    'name': f'Agent {idx}',
-                    'ip': agent_ip,
-                    'ip_address': agent_ip,
-                    'status': 'online' if raw_status != 'OFFLINE' else 'offline',
-                    'raw_status': raw_status,
-                    'last_seen': last_seen
-                })
-                idx += 1
-
-        return jsonify(status_list)
+@app.route("/network-stats", methods=["GET"])
+def network_stats():
+    try:
+        return jsonify({
+            "agents": get_outbound_stats(),
+            "compression": COMPRESSION_STATS.snapshot(),
+            "persistence": persistence.write_stats(),
+            "agent_state": get_agent_state_stats(),
+            "events": event_bus.stats(),
+            "delete_commands": persistence.delete_command_stats(),
+            "results": result_collector.stats(),
+        })
     except Exception as e:
-        logger.error("Error getting client status: %s", e)
+        logger.error("Error getting network stats: %s", e)
+        return jsonify({"error": "Internal server error"}), 500
+
+
+@app.route("/delete-commands", methods=["GET"])
+def delete_commands():
+    try:
+        status = request.args.get("status", "dead")
+        if status not in _DELETE_COMMAND_STATES:
+            raise ValueError(f"status must be one of: {', '.join(_DELETE_COMMAND_STATES)}")
+        return jsonify({
+            "stats": persistence.delete_command_stats(),
+            "commands": persistence.list_delete_commands(status, request.args.get("limit", 100, type=int)),
+        })
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error("Error listing delete commands: %s", e)
         return jsonify({"error": "Internal server error"}), 500
 
 
 @app.route("/files-preview", methods=["GET"])
 def files_preview():
+    def build():
+        files, next_cursor = _pending_page(request.args)
+        return {"files": files, "next_cursor": next_cursor}, None
+
     try:
-        search = request.args.get("search", "").strip()
-        return jsonify(_flatten_pending_files(search=search))
+        return _cached_json(persistence.data_versions("pending_files"), build)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         logger.error("Error getting files preview: %s", e)
         return jsonify({"error": "Internal server error"}), 500
 
 
-@app.route("/audit-logs", methods=["GET"])
-def audit_logs():
+@app.route("/files-count", methods=["GET"])
+def files_count():
+    def build():
+        return {"pending": persistence.count_pending_files(**_pending_filters_from_args(request.args))}, None
+
     try:
-        limit = int(request.args.get("limit", 200))
-        limit = max(1, min(limit, 1000))
-        rows = (
-            DeletionAuditLog.query
-            .order_by(DeletionAuditLog.created_at.desc())
-            .limit(limit)
-            .all()
-        )
-        audit_rows = [{
-            "id": row.id,
-            "record_id": row.record_id,
-            "task_id": row.task_id,
-            "agent_ip": row.agent_ip,
-            "file_hash": row.file_hash,
-            "filename": row.filename,
-            "path": row.path,
-            "language": row.language,
-            "confidence": row.confidence,
-            "action": row.action,
-            "action_by": row.action_by,
-            "notes": row.notes,
-            "created_at": row.created_at.isoformat() if row.created_at else None
-        } for row in rows]
-
-        report_rows = []
-        for rep in persistence.list_deletion_reports(limit=limit):
-            report_rows.append({
-                "id": f"rep-{rep.get('id')}",
-                "record_id": "",
-                "task_id": rep.get("task_id"),
-                "agent_ip": rep.get("agent_ip"),
-                "file_hash": rep.get("file_hash"),
-                "filename": rep.get("path", "").split("\\")[-1].split("/")[-1] if rep.get("path") else "unknown",
-                "path": rep.get("path", ""),
-                "language": None,
-                "confidence": None,
-                "action": "delete_confirmed" if rep.get("status") == "deleted" else "delete_failed",
-                "action_by": "agent",
-                "notes": rep.get("details", ""),
-                "created_at": rep.get("created_at"),
-            })
+        return _cached_json(persistence.data_versions("pending_files"), build)
+    except Exception as e:
+        logger.error("Error counting pending files: %s", e)
+        return jsonify({"error": "Internal server error"}), 500
+
+
+@app.route("/dashboard-summary", methods=["GET"])
+def dashboard_summary():
+    def build():
+        agents, expires_at = _build_client_status()
+        summary = persistence.file_count_summary()
+        summary["agent_totals"] = {
+            "total": len(agents),
+            "online": sum(1 for a in agents if a["status"] == "online"),
+        }
+        return summary, expires_at
+
+    try:
+        version = (get_registry_version(),) + persistence.data_versions("agents", "pending_files", "audit_log", "tasks")
+        return _cached_json(version, build)
+    except Exception as e:
+        logger.error("Error building dashboard summary: %s", e)
+        return jsonify({"error": "Internal server error"}), 500
+
 
-        combined = audit_rows + report_rows
-        combined.sort(key=lambda x: x.get("created_at") or "", reverse=True)
-        # Hide dispatch-failed noise rows from UI; keep them in DB for troubleshooting.
-        combined = [row for row in combined if row.get("action") != "delete_dispatch_failed"]
-
-        # If same file has confirmed deletion, hide older failed-not-found noise rows.
-        confirmed_keys = set()
-        for row in combined:
-            if row.get("action") == "delete_confirmed":
-                confirmed_keys.add((row.get("task_id"), row.get("agent_ip"), row.get("file_hash"), row.get("path")))
-
-        filtered = []
-        for row in combined:
-            if row.get("action") == "delete_failed":
-                key = (row.get("task_id"), row.get("agent_ip"), row.get("file_hash"), row.get("path"))
-                if key in confirmed_keys:
+@app.route("/events", methods=["GET"])
+def events():
+    """
+    Server-Sent Events stream of agent, files, progress and audit changes.
+    Browsers reconnect with Last-Event-ID and get missed events replayed,
+    or a "resync" event when they should reload their snapshot.
+    """
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = -1
+    subscription = event_bus.subscribe(last_event_id)
+
+    def stream():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                event = subscription.get(timeout=SSE_KEEPALIVE)
+                if event is None:
+                    yield ": keepalive\n\n"
                     continue
-            filtered.append(row)
+                yield f"id: {event.id}\nevent: {event.type}\ndata: {event.data}\n\n"
+        finally:
+            subscription.close()
+
+    return Response(stream(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.route("/audit-logs", methods=["GET"])
+def audit_logs():
+    try:
+        args = request.args
+
+        def build():
+            entries, next_cursor = persistence.list_audit_log(
+                cursor=args.get("cursor") or None,
+                limit=args.get("limit", 200, type=int),
+                since=_parse_time_arg(args.get("since")),
+                until=_parse_time_arg(args.get("until")),
+                action=args.get("action") or None,
+                task_id=args.get("task_id") or None,
+                agent_ip=args.get("agent_ip") or None,
+            )
+            return {"entries": entries, "next_cursor": next_cursor}, None
 
-        return jsonify(filtered[:limit])
+        return _cached_json(persistence.data_versions("audit_log"), build)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         logger.error("Error getting audit logs: %s", e)
         return jsonify({"error": "Internal server error"}), 500
 
 
+def _bulk_filters(raw):
+    """
+    Pending file filters for a bulk operation. At least one criterion is
+    required so an empty filter cannot select every pending file.
+    """
+    if not isinstance(raw, dict):
+        raise ValueError("filter must be an object")
+    filters = {key: raw[key] for key in _BULK_FILTER_KEYS if raw.get(key) not in (None, "")}
+    for key in ("min_confidence", "max_confidence"):
+        if key in filters:
+            filters[key] = float(filters[key])
+    if not filters:
+        raise ValueError(f"filter needs at least one of: {', '.join(_BULK_FILTER_KEYS)}")
+    return filters
+
+
+def _run_bulk(job, action, filters):
+    """
+    Approve or reject every pending file matching `filters` that is not
+    approved yet, one batch per transaction.
+    """
+    cursor = None
+    while True:
+        records, cursor = persistence.list_pending_page(
+            cursor=cursor, limit=BULK_BATCH_SIZE, approved=False, **filters
+        )
+        if not records:
+            break
+        if action == "approve":
+            outcome = _approve_records(records, publish_rows=False)
+            job.advance(len(records), dispatched=outcome["dispatched"], queued=outcome["queued"],
+                        failed=outcome["failed"])
+        else:
+            rejected = _resolve_records(records, [
+                ([r["id"] for r in records], "rejected", "Rejected in UI (bulk)", False, True),
+            ], publish_rows=False)
+            job.advance(len(records), rejected=rejected)
+        if cursor is None:
+            break
+
+
+def _start_bulk(action, raw_filter):
+    filters = _bulk_filters(raw_filter)
+    total = persistence.count_pending_files(approved=False, **filters)
+    job = job_registry.start(
+        action,
+        lambda job: _run_bulk(job, action, filters),
+        params={"filter": filters},
+        total=total,
+    )
+    logger.info("Bulk %s job %s started for %d file(s): %s", action, job.id, total, filters)
+    return jsonify({
+        "message": f"Bulk {action} of {total} file(s) started",
+        "job_id": job.id,
+        "total": total,
+    }), 202
+
+
 @app.route("/approve-deletion", methods=["POST"])
 def approve_deletion():
     try:
         data = request.get_json(silent=True) or {}
+        if "filter" in data:
+            return _start_bulk("approve", data["filter"])
         file_ids = data.get("file_ids", [])
         if not isinstance(file_ids, list) or not file_ids:
             return jsonify({"error": "file_ids must be a non-empty list"}), 400
 
-        selected = persistence.get_pending_by_ids(file_ids)
+        selected = persistence.get_pending_by_ids(file_ids, approved=False)
         if not selected:
             return jsonify({"error": "No matching pending files found"}), 404
 
-        entries_by_agent = _group_records_by_agent(selected)
-        active_agents = get_active_agents()
-
-        sent_to = 0
-        queued = 0
-        delivered_record_ids = set()
-        queued_record_ids = set()
-        undelivered_agents = []
-
-        for (agent_ip, task_id), approved_entries in entries_by_agent.items():
-            payload = {
-                "type": "delete_approved",
-                "task_id": task_id,
-                "approved_entries": approved_entries,
-                "approved_hashes": [x.get("file_hash", "") for x in approved_entries if x.get("file_hash")],
-                "timestamp": _now_iso(),
-            }
-            agent_info = active_agents.get(agent_ip)
-
-            # If socket is available in this process, dispatch immediately.
-            try:
-                if agent_info and agent_info.get("conn"):
-                    send_message(agent_info["conn"], payload)
-                    update_status(agent_ip, "DELETION_DISPATCHED")
-                    sent_to += 1
-                    for item in approved_entries:
-                        rid = item.get("record_id")
-                        if rid:
-                            delivered_record_ids.add(rid)
-                else:
-                    # Cross-process fallback: queue command for backend to send on next heartbeat.
-                    persistence.enqueue_delete_command(agent_ip, task_id, payload)
-                    queued += 1
-                    for item in approved_entries:
-                        rid = item.get("record_id")
-                        if rid:
-                            queued_record_ids.add(rid)
-                    logger.info("Queued delete command for %s task=%s", agent_ip, task_id)
-            except Exception as e:
-                logger.error("Failed delete dispatch to %s: %s", agent_ip, e)
-                try:
-                    persistence.enqueue_delete_command(agent_ip, task_id, payload)
-                    queued += 1
-                    for item in approved_entries:
-                        rid = item.get("record_id")
-                        if rid:
-                            queued_record_ids.add(rid)
-                    logger.info("Queued delete command after dispatch failure for %s task=%s", agent_ip, task_id)
-                except Exception:
-                    undelivered_agents.append(agent_ip)
-
-        delivered = [r for r in selected if r.get("id") in delivered_record_ids]
-        undelivered = [r for r in selected if r.get("id") not in delivered_record_ids]
-
-        if delivered:
-            _persist_audit_logs(
-                delivered,
-                action="delete_dispatched",
-                notes=f"Approved in UI and dispatched to {sent_to} agent(s)"
-            )
-            _remove_records_from_queue(delivered)
-
-        queued_records = [r for r in selected if r.get("id") in queued_record_ids]
-        if queued_records and queued > 0:
-            _persist_audit_logs(
-                queued_records,
-                action="delete_queued",
-                notes="Delete command queued; will dispatch on next agent heartbeat"
-            )
-
-        if undelivered:
-            _persist_audit_logs(
-                undelivered,
-                action="delete_dispatch_failed",
-                notes="Agent not connected or dispatch failed; kept pending"
-            )
-
+        outcome = _approve_records(selected)
         return jsonify({
-            "message": f"Dispatch success: {len(delivered)} file(s), queued: {len(queued_records)} file(s), failed: {len(undelivered)} file(s).",
-            "sent_to_agents": sent_to,
-            "queued_agents": queued,
-            "undelivered_agents": sorted(set(undelivered_agents)),
+            "message": f"Dispatch success: {outcome['dispatched']} file(s), queued: {outcome['queued']} file(s), "
+                       f"failed: {outcome['failed']} file(s).",
+            "sent_to_agents": outcome["sent_to_agents"],
+            "queued_agents": outcome["queued_agents"],
+            "undelivered_agents": outcome["undelivered_agents"],
         })
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         logger.error("Error approving deletion: %s", e)
         return jsonify({"error": "Internal server error"}), 500
@@ -509,22 +815,75 @@ def approve_deletion():
 def reject_deletion():
     try:
         data = request.get_json(silent=True) or {}
+        if "filter" in data:
+            return _start_bulk("reject", data["filter"])
         file_ids = data.get("file_ids", [])
         if not isinstance(file_ids, list) or not file_ids:
             return jsonify({"error": "file_ids must be a non-empty list"}), 400
 
-        selected = persistence.get_pending_by_ids(file_ids)
+        selected = persistence.get_pending_by_ids(file_ids, approved=False)
         if not selected:
             return jsonify({"error": "No matching pending files found"}), 404
 
-        _persist_audit_logs(selected, action="rejected", notes="Rejected in UI")
-        _remove_records_from_queue(selected)
+        _resolve_records(selected, [([r["id"] for r in selected], "rejected", "Rejected in UI", False, True)])
         return jsonify({"message": f"Rejected {len(selected)} file(s)"})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         logger.error("Error rejecting deletion: %s", e)
         return jsonify({"error": "Internal server error"}), 500
 
 
+@app.route("/jobs", methods=["GET"])
+def jobs():
+    return jsonify(job_registry.list())
+
+
+@app.route("/jobs/<int:job_id>", methods=["GET"])
+def job_status(job_id):
+    job = job_registry.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.snapshot())
+
+
+def _task_versions():
+    # Task counters move with every pending file and audit row of the task.
+    return persistence.data_versions("tasks", "pending_files", "audit_log")
+
+
+@app.route("/tasks", methods=["GET"])
+def tasks():
+    def build():
+        items, next_cursor = persistence.list_tasks(request.args.get("cursor"), request.args.get("limit", type=int))
+        return {"tasks": items, "next_cursor": next_cursor}, None
+
+    try:
+        return _cached_json(_task_versions(), build)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error("Error listing tasks: %s", e)
+        return jsonify({"error": "Internal server error"}), 500
+
+
+@app.route("/tasks/<task_id>", methods=["GET"])
+def task_status(task_id):
+    def build():
+        task = persistence.get_task(task_id)
+        if task is None:
+            raise LookupError(task_id)
+        return task, None
+
+    try:
+        return _cached_json(_task_versions(), build)
+    except LookupError:
+        return jsonify({"error": "Task not found"}), 404
+    except Exception as e:
+        logger.error("Error getting task %s: %s", task_id, e)
+        return jsonify({"error": "Internal server error"}), 500
+
+
 if __name__ == "__main__":
     # Avoid duplicate server thread under Flask debug reloader.
     if os.environ.get("WERKZEUG_RUN_MAIN") == "true" or os.getenv("FLASK_DEBUG", "0") != "1":
@@ -0,0 +1,384 @@
+"""
+Message codecs for the agent wire protocol.
+
+JSON is the default and the fallback. The binary codec has a typed schema
+for the hot message types: it packs every string of a message into one
+NUL-separated UTF-8 table, and every integer and float into packed arrays.
+Field names are never sent, and decoding is mostly `split` and
+`array.frombytes`. Columnar scan result batches (shared/columnar.py) map
+onto the same tables with no per-row work at all. Messages that do not match their schema exactly are
+sent as tagged JSON inside the binary codec, so no information is lost.
+
+The codec is negotiated at `register`. Binary frames set FLAG_BINARY in the
+frame header, so the receiver can decode them without extra state.
+"""
+import json
+import struct
+import sys
+from array import array
+
+from shared.framing import FLAG_BINARY, FrameError
+
+
+STR = "str"
+INT = "int"
+FLOAT = "float"
+STR_LIST = "str_list"
+INT_LIST = "int_list"
+FLOAT_LIST = "float_list"
+
+
+class Record(tuple):
+    """Field kind for a nested record with fixed fields."""
+
+_FILE_FIELDS = (
+    ("filepath", STR),
+    ("filename", STR),
+    ("size", INT),
+    ("modified_time", STR),
+    ("decision", STR),
+    ("confidence", FLOAT),
+    ("language", STR),
+    ("method", STR),
+    ("reason", STR),
+    ("file_hash", STR),
+)
+_REPORT_FIELDS = (
+    ("file_hash", STR),
+    ("path", STR),
+    ("status", STR),
+    ("details", STR),
+)
+_APPROVED_FIELDS = (
+    ("file_hash", STR),
+    ("path", STR),
+    ("record_id", STR),
+)
+
+_COLUMN_FIELDS = Record((
+    ("count", INT),
+    ("dirs", STR_LIST),
+    ("dir", INT_LIST),
+    ("paths", STR_LIST),
+    ("filename", STR_LIST),
+    ("size", INT_LIST),
+    ("modified_time", STR_LIST),
+    ("confidence", FLOAT_LIST),
+    ("file_hash", STR_LIST),
+    ("language_values", STR_LIST),
+    ("language", INT_LIST),
+    ("decision_values", STR_LIST),
+    ("decision", INT_LIST),
+    ("method_values", STR_LIST),
+    ("method", INT_LIST),
+    ("reason_values", STR_LIST),
+    ("reason", INT_LIST),
+))
+
+# type -> ((tag, fields), ...); the first variant that fits is used. A plain
+# tuple as field kind means "list of records", a Record a nested record.
+SCHEMAS = {
+    "heartbeat": ((1, (
+        ("client_id", STR),
+        ("timestamp", STR),
+    )),),
+    "scan_results": ((2, (
+        ("task_id", STR),
+        ("client_id", STR),
+        ("timestamp", STR),
+        ("files", _FILE_FIELDS),
+    )), (6, (
+        ("task_id", STR),
+        ("client_id", STR),
+        ("timestamp", STR),
+        ("columns", _COLUMN_FIELDS),
+    ))),
+    "scan_results_chunk": ((3, (
+        ("task_id", STR),
+        ("client_id", STR),
+        ("timestamp", STR),
+        ("seq", INT),
+        ("files", _FILE_FIELDS),
+    )), (7, (
+        ("task_id", STR),
+        ("client_id", STR),
+        ("timestamp", STR),
+        ("seq", INT),
+        ("columns", _COLUMN_FIELDS),
+    ))),
+    "deletion_report": ((4, (
+        ("task_id", STR),
+        ("client_id", STR),
+        ("timestamp", STR),
+        ("reports", _REPORT_FIELDS),
+    )), (8, (
+        ("task_id", STR),
+        ("client_id", STR),
+        ("timestamp", STR),
+        ("reports", _REPORT_FIELDS),
+        ("command_id", INT),
+    ))),
+    # Queued delete commands carry the command_id the report acks.
+    "delete_approved": ((5, (
+        ("task_id", STR),
+        ("timestamp", STR),
+        ("approved_entries", _APPROVED_FIELDS),
+        ("approved_hashes", STR_LIST),
+    )), (9, (
+        ("task_id", STR),
+        ("timestamp", STR),
+        ("approved_entries", _APPROVED_FIELDS),
+        ("approved_hashes", STR_LIST),
+        ("command_id", INT),
+    ))),
+}
+_BY_TAG = {
+    tag: (msg_type, fields)
+    for msg_type, variants in SCHEMAS.items()
+    for tag, fields in variants
+}
+assert len(_BY_TAG) == sum(len(v) for v in SCHEMAS.values())
+# Record lists must be flat so rows can be decoded column-wise.
+assert all(
+    kind in (STR, INT, FLOAT)
+    for _, fields in _BY_TAG.values()
+    for _, sub in fields if type(sub) is tuple
+    for _, kind in sub
+)
+
+_JSON_TAG = 0
+_HEADER = struct.Struct("<BIIII")
+_SWAP = sys.byteorder != "little"
+
+
+class _SchemaMismatch(Exception):
+    pass
+
+
+class JsonCodec:
+    name = "json"
+    flags = 0
+
+    def encode(self, message: dict) -> bytes:
+        return json.dumps(message).encode()
+
+    def decode(self, payload) -> dict:
+        return json.loads(bytes(payload).decode())
+
+
+class BinaryCodec:
+    name = "binary"
+    flags = FLAG_BINARY
+
+    def encode(self, message: dict) -> bytes:
+        for schema in SCHEMAS.get(message.get("type"), ()):
+            try:
+                return self._pack(schema, message)
+            except _SchemaMismatch:
+                pass
+        return bytes([_JSON_TAG]) + json.dumps(message).encode()
+
+    def decode(self, payload) -> dict:
+        try:
+            return self._unpack(memoryview(payload))
+        except (struct.error, IndexError, KeyError, ValueError) as e:
+            raise FrameError(f"Corrupt binary frame: {e!r}")
+
+    def _unpack(self, payload):
+        tag = payload[0]
+        if tag == _JSON_TAG:
+            return json.loads(bytes(payload[1:]).decode())
+        msg_type, fields = _BY_TAG[tag]
+
+        _, n_strings, str_len, n_ints, n_floats = _HEADER.unpack_from(payload)
+        offset = _HEADER.size
+        text = bytes(payload[offset:offset + str_len]).decode()
+        strings = text.split("\0") if n_strings else []
+        offset += str_len
+        ints = array("q")
+        ints.frombytes(payload[offset:offset + 8 * n_ints])
+        offset += 8 * n_ints
+        floats = array("d")
+        floats.frombytes(payload[offset:offset + 8 * n_floats])
+        if _SWAP:
+            ints.byteswap()
+            floats.byteswap()
+
+        cursor = _Cursor(strings, ints.tolist(), floats.tolist())
+        message = {"type": msg_type}
+        message.update(cursor.read_record(fields))
+        return message
+
+    def _pack(self, schema, message):
+        tag, fields = schema
+        if len(message) != len(fields) + 1:
+            raise _SchemaMismatch()
+        strings, ints, floats = [], array("q"), array("d")
+        _write_record(fields, message, strings, ints, floats)
+
+        text = "\0".join(strings)
+        if text.count("\0") != max(len(strings) - 1, 0):
+            # A value contained NUL, which would corrupt the string table.
+            raise _SchemaMismatch()
+        blob = text.encode()
+        if _SWAP:
+            ints.byteswap()
+            floats.byteswap()
+        return b"".join((
+            _HEADER.pack(tag, len(strings), len(blob), len(ints), len(floats)),
+            blob,
+            ints.tobytes(),
+            floats.tobytes(),
+        ))
+
+
+class _Cursor:
+    """Positions into the decoded string, int and float tables."""
+
+    __slots__ = ("strings", "ints", "floats", "si", "ii", "fi")
+
+    def __init__(self, strings, ints, floats):
+        self.strings = strings
+        self.ints = ints
+        self.floats = floats
+        self.si = self.ii = self.fi = 0
+
+    def read_record(self, fields):
+        record = {}
+        for name, kind in fields:
+            if kind is STR:
+                record[name] = self.strings[self.si]
+                self.si += 1
+            elif kind is INT:
+                record[name] = self.ints[self.ii]
+                self.ii += 1
+            elif kind is FLOAT:
+                record[name] = self.floats[self.fi]
+                self.fi += 1
+            elif kind is STR_LIST:
+                count = self.ints[self.ii]
+                self.ii += 1
+                record[name] = self.strings[self.si:self.si + count]
+                self.si += count
+            elif kind is INT_LIST:
+                count = self.ints[self.ii]
+                self.ii += 1
+                record[name] = self.ints[self.ii:self.ii + count]
+                self.ii += count
+            elif kind is FLOAT_LIST:
+                count = self.ints[self.ii]
+                self.ii += 1
+                record[name] = self.floats[self.fi:self.fi + count]
+                self.fi += count
+            elif type(kind) is Record:
+                record[name] = self.read_record(kind)
+            else:
+                count = self.ints[self.ii]
+                self.ii += 1
+                record[name] = self.read_rows(kind, count)
+        return record
+
+    def read_rows(self, fields, count):
+        """
+        Decode `count` flat records at once: each field becomes a strided
+        slice of its table and rows are zipped back together in C.
+        """
+        kinds = [kind for _, kind in fields]
+        widths = {kind: kinds.count(kind) for kind in (STR, INT, FLOAT)}
+        tables = {
+            STR: self.strings[self.si:self.si + count * widths[STR]],
+            INT: self.ints[self.ii:self.ii + count * widths[INT]],
+            FLOAT: self.floats[self.fi:self.fi + count * widths[FLOAT]],
+        }
+        self.si += count * widths[STR]
+        self.ii += count * widths[INT]
+        self.fi += count * widths[FLOAT]
+
+        seen = {STR: 0, INT: 0, FLOAT: 0}
+        columns = []
+        for kind in kinds:
+            columns.append(tables[kind][seen[kind]::widths[kind]])
+            seen[kind] += 1
+        names = [name for name, _ in fields]
+        return [dict(zip(names, row)) for row in zip(*columns)]
+
+
+def _write_record(fields, record, strings, ints, floats):
+    for name, kind in fields:
+        if name not in record:
+            raise _SchemaMismatch()
+        value = record[name]
+        if kind is STR:
+            if type(value) is not str:
+                raise _SchemaMismatch()
+            strings.append(value)
+        elif kind is INT:
+            if type(value) is not int:
+                raise _SchemaMismatch()
+            try:
+                ints.append(value)
+            except OverflowError:
+                raise _SchemaMismatch()
+        elif kind is FLOAT:
+            if type(value) is not float:
+                raise _SchemaMismatch()
+            floats.append(value)
+        elif kind is STR_LIST:
+            if type(value) is not list or any(type(v) is not str for v in value):
+                raise _SchemaMismatch()
+            ints.append(len(value))
+            strings.extend(value)
+        elif kind is INT_LIST:
+            if type(value) is not list or any(type(v) is not int for v in value):
+                raise _SchemaMismatch()
+            ints.append(len(value))
+            try:
+                ints.extend(value)
+            except OverflowError:
+                raise _SchemaMismatch()
+        elif kind is FLOAT_LIST:
+            if type(value) is not list or any(type(v) is not float for v in value):
+                raise _SchemaMismatch()
+            ints.append(len(value))
+            floats.extend(value)
+        elif type(kind) is Record:
+            if type(value) is not dict or len(value) != len(kind):
+                raise _SchemaMismatch()
+            _write_record(kind, value, strings, ints, floats)
+        else:
+            if type(value) is not list:
+                raise _SchemaMismatch()
+            ints.append(len(value))
+            for item in value:
+                if type(item) is not dict or len(item) != len(kind):
+                    raise _SchemaMismatch()
+                _write_record(kind, item, strings, ints, floats)
+
+
+CODECS = {
+    JsonCodec.name: JsonCodec(),
+    BinaryCodec.name: BinaryCodec(),
+}
+DEFAULT_CODEC = CODECS["json"]
+
+
+def parse_codecs(value) -> list:
+    """Turn a comma separated setting (or a list) into known codec names."""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(",")
+    return [c.strip().lower() for c in value if c and c.strip().lower() in CODECS]
+
+
+def negotiate_codec(offered, preferred):
+    """Pick the first preferred codec the peer offered; JSON otherwise."""
+    offered = set(parse_codecs(offered))
+    for name in parse_codecs(list(preferred)):
+        if name in offered:
+            return CODECS[name]
+    return DEFAULT_CODEC
+
+
+def codec_for_flags(flags: int):
+    return CODECS["binary"] if flags & FLAG_BINARY else DEFAULT_CODEC
@@ -0,0 +1,129 @@
+"""
+Columnar batches of scan results.
+
+A batch carries one list per `FileAnalysisResult` field instead of one dict
+per file, so field names are sent once per batch. The low-cardinality
+fields (language, decision, method, reason) are dictionary-encoded. Paths
+are stored as an index into a table of distinct directories plus the
+filename column they already end with.
+
+Both ends work on the columns directly. The agent builds them from the
+result objects, and the master's persistence layer zips them into insert
+parameters. Row dicts are only built for the HTTP read paths.
+"""
+from operator import attrgetter
+
+
+COLUMNAR = "columnar"
+
+FIELDS = (
+    "filepath",
+    "filename",
+    "size",
+    "modified_time",
+    "decision",
+    "confidence",
+    "language",
+    "method",
+    "reason",
+    "file_hash",
+)
+DICT_FIELDS = ("language", "decision", "method", "reason")
+# Fields sent as plain columns, in wire order.
+PLAIN_FIELDS = ("filename", "size", "modified_time", "confidence", "file_hash")
+
+# `dir` entries with this value take their full path from `paths` instead.
+NO_DIR = -1
+
+
+def _dictionary(values):
+    """Return (distinct values in first-seen order, index per value)."""
+    table = {}
+    index = [table.setdefault(v, len(table)) for v in values]
+    return list(table), index
+
+
+def encode_results(results) -> dict:
+    """
+    Build batch columns from `FileAnalysisResult` objects (anything with the
+    same attributes). Values are coerced to the declared field types so the
+    binary codec can pack every column.
+    """
+    results = list(results)
+    columns = {"count": len(results)}
+
+    paths = list(map(attrgetter("filepath"), results))
+    names = [str(n) for n in map(attrgetter("filename"), results)]
+    dirs = {}
+    dir_index = []
+    odd_paths = []
+    for path, name in zip(paths, names):
+        path = str(path)
+        if name and path.endswith(name):
+            dir_index.append(dirs.setdefault(path[:len(path) - len(name)], len(dirs)))
+        else:
+            dir_index.append(NO_DIR)
+            odd_paths.append(path)
+    columns["dirs"] = list(dirs)
+    columns["dir"] = dir_index
+    columns["paths"] = odd_paths
+
+    columns["filename"] = names
+    columns["size"] = [int(v or 0) for v in map(attrgetter("size"), results)]
+    columns["modified_time"] = [str(v or "") for v in map(attrgetter("modified_time"), results)]
+    columns["confidence"] = [float(v or 0.0) for v in map(attrgetter("confidence"), results)]
+    columns["file_hash"] = [str(v or "") for v in map(attrgetter("file_hash"), results)]
+
+    for field in DICT_FIELDS:
+        values, index = _dictionary(str(v or "") for v in map(attrgetter(field), results))
+        columns[f"{field}_values"] = values
+        columns[field] = index
+    return columns
+
+
+class ColumnarBatch:
+    """
+    Read-only view over decoded batch columns. Iterating yields row dicts
+    for code that needs them; the ingest path uses `column()` instead.
+    """
+
+    __slots__ = ("columns",)
+
+    def __init__(self, columns: dict):
+        count = columns.get("count")
+        lengths = {len(columns.get(f) or ()) for f in PLAIN_FIELDS + DICT_FIELDS + ("dir",)}
+        if not isinstance(count, int) or lengths != {count}:
+            raise ValueError("Malformed columnar batch")
+        if columns["dir"].count(NO_DIR) != len(columns.get("paths") or ()):
+            raise ValueError("Malformed columnar batch paths")
+        for index, table, lowest in [("dir", "dirs", NO_DIR)] + [(f, f"{f}_values", 0) for f in DICT_FIELDS]:
+            if count and not (lowest <= min(columns[index]) and max(columns[index]) < len(columns[table])):
+                raise ValueError(f"Malformed columnar batch column {index}")
+        self.columns = columns
+
+    def __len__(self):
+        return self.columns["count"]
+
+    def column(self, field):
+        """One field as a sequence, decoding dictionary and path columns."""
+        columns = self.columns
+        if field == "filepath":
+            dirs = columns["dirs"]
+            odd = iter(columns.get("paths") or ())
+            return [
+                dirs[d] + name if d != NO_DIR else next(odd)
+                for d, name in zip(columns["dir"], columns["filename"])
+            ]
+        if field in DICT_FIELDS:
+            values = columns[f"{field}_values"]
+            return [values[i] for i in columns[field]]
+        return columns[field]
+
+    def __iter__(self):
+        return (dict(zip(FIELDS, row)) for row in zip(*map(self.column, FIELDS)))
+
+
+def batch_from_message(message: dict):
+    """The `ColumnarBatch` carried by a scan results message, or None."""
+    columns = message.get("columns")
+    return ColumnarBatch(columns) if columns is not None else None
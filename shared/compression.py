@@ -0,0 +1,131 @@
+"""
+Optional frame compression negotiated during the `register` handshake.
+
+The method is carried in the frame header flags (see shared/framing.py), so
+a receiver can always decode a frame on its own. Only payloads above a
+threshold are compressed, and only if compression actually shrinks them.
+"""
+import lzma
+import threading
+import time
+import zlib
+
+from shared.constants import MAX_MESSAGE_SIZE
+from shared.framing import FLAG_LZMA, FLAG_ZLIB, FrameError
+
+
+METHOD_FLAGS = {
+    "zlib": FLAG_ZLIB,
+    "lzma": FLAG_LZMA,
+}
+# Preference order when both sides support several methods: zlib is far
+# cheaper on CPU and already removes most of the redundancy in scan JSON.
+SUPPORTED_METHODS = ("zlib", "lzma")
+DEFAULT_THRESHOLD = 4096
+ZLIB_LEVEL = 6
+LZMA_PRESET = 1
+
+
+def parse_methods(value) -> list:
+    """Turn a comma separated setting (or a list) into known method names."""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(",")
+    return [m.strip().lower() for m in value if m and m.strip().lower() in METHOD_FLAGS]
+
+
+def negotiate(offered, preferred=SUPPORTED_METHODS):
+    """Pick the first preferred method the peer offered, or None."""
+    offered = set(parse_methods(offered))
+    for method in parse_methods(list(preferred)):
+        if method in offered:
+            return method
+    return None
+
+
+class CompressionStats:
+    """Per message type byte counts and CPU time, split by direction."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {"sent": {}, "received": {}}
+
+    def record(self, direction, msg_type, raw_bytes, wire_bytes, seconds, compressed):
+        with self._lock:
+            entry = self._stats[direction].setdefault(msg_type or "unknown", {
+                "frames": 0,
+                "compressed_frames": 0,
+                "raw_bytes": 0,
+                "wire_bytes": 0,
+                "cpu_seconds": 0.0,
+            })
+            entry["frames"] += 1
+            entry["compressed_frames"] += 1 if compressed else 0
+            entry["raw_bytes"] += raw_bytes
+            entry["wire_bytes"] += wire_bytes
+            entry["cpu_seconds"] += seconds
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            out = {}
+            for direction, by_type in self._stats.items():
+                out[direction] = {}
+                for msg_type, entry in by_type.items():
+                    item = dict(entry)
+                    item["cpu_seconds"] = round(item["cpu_seconds"], 6)
+                    item["ratio"] = round(item["wire_bytes"] / item["raw_bytes"], 4) if item["raw_bytes"] else 1.0
+                    out[direction][msg_type] = item
+            return out
+
+
+STATS = CompressionStats()
+
+
+def compress_payload(payload: bytes, method, msg_type=None, threshold=DEFAULT_THRESHOLD, stats=STATS):
+    """
+    Return (flags, data) for a frame payload, compressing it with `method`
+    when it is large enough to be worth it.
+    """
+    if not method or len(payload) < threshold:
+        stats.record("sent", msg_type, len(payload), len(payload), 0.0, False)
+        return 0, payload
+
+    started = time.thread_time()
+    if method == "zlib":
+        data = zlib.compress(payload, ZLIB_LEVEL)
+    elif method == "lzma":
+        data = lzma.compress(payload, preset=LZMA_PRESET)
+    else:
+        raise ValueError(f"Unknown compression method: {method}")
+    elapsed = time.thread_time() - started
+
+    if len(data) >= len(payload):
+        stats.record("sent", msg_type, len(payload), len(payload), elapsed, False)
+        return 0, payload
+
+    stats.record("sent", msg_type, len(payload), len(data), elapsed, True)
+    return METHOD_FLAGS[method], data
+
+
+def decompress_payload(flags: int, data, max_size=MAX_MESSAGE_SIZE) -> bytes:
+    """Undo `compress_payload`; the output is bounded by `max_size`."""
+    if flags & FLAG_ZLIB:
+        decoder = zlib.decompressobj()
+        try:
+            out = decoder.decompress(data, max_size + 1)
+        except zlib.error as e:
+            raise FrameError(f"Corrupt zlib frame: {e}")
+        if decoder.unconsumed_tail or len(out) > max_size:
+            raise FrameError(f"Decompressed frame exceeds limit of {max_size}")
+        return out
+    if flags & FLAG_LZMA:
+        decoder = lzma.LZMADecompressor()
+        try:
+            out = decoder.decompress(data, max_length=max_size + 1)
+        except lzma.LZMAError as e:
+            raise FrameError(f"Corrupt lzma frame: {e}")
+        if len(out) > max_size or not decoder.eof:
+            raise FrameError(f"Decompressed frame exceeds limit of {max_size}")
+        return out
+    return bytes(data)
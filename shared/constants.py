@@ -1,2 +1,3 @@
 HEARTBEAT_TIMEOUT = 30
-MAX_MESSAGE_SIZE = 1024 * 1024
+# Hard cap on a single protocol frame; larger scan results must be split.
+MAX_MESSAGE_SIZE = 8 * 1024 * 1024
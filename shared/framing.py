@@ -0,0 +1,146 @@
+"""
+Length-prefixed frame I/O shared by the master and the client agent.
+
+Every frame is a 4-byte big-endian header followed by the payload. The low
+24 bits of the header hold the payload length and the high byte holds flags
+(compression method, see shared/compression.py; payload codec, see
+shared/codec.py); peers that never negotiate
+a feature always send zero flags, which keeps the original layout.
+FrameReader receives straight into one reusable buffer with `recv_into`, so
+large frames are assembled in linear time and a short read of the length
+prefix is handled like any other partial read.
+"""
+import threading
+from collections import deque
+
+from shared.constants import MAX_MESSAGE_SIZE
+
+
+HEADER_SIZE = 4
+_LENGTH_BITS = 24
+_LENGTH_MASK = (1 << _LENGTH_BITS) - 1
+_INITIAL_BUFFER = 64 * 1024
+
+FLAG_ZLIB = 0x01
+FLAG_LZMA = 0x02
+FLAG_BINARY = 0x04
+
+assert MAX_MESSAGE_SIZE <= _LENGTH_MASK, "MAX_MESSAGE_SIZE must fit in the 24-bit length field"
+
+
+class FrameError(ValueError):
+    """Raised when a frame violates the framing rules (e.g. too large)."""
+
+
+def parse_header(header, max_size=MAX_MESSAGE_SIZE):
+    """Return (payload length, flags) announced by a frame header."""
+    value = int.from_bytes(header[:HEADER_SIZE], "big")
+    length = value & _LENGTH_MASK
+    if length > max_size:
+        raise FrameError(f"Frame of {length} bytes exceeds limit of {max_size}")
+    return length, value >> _LENGTH_BITS
+
+
+def encode_frame(payload, flags=0, max_size=MAX_MESSAGE_SIZE) -> bytes:
+    """Prefix a payload with its length/flags header."""
+    if len(payload) > max_size:
+        raise FrameError(f"Frame of {len(payload)} bytes exceeds limit of {max_size}")
+    header = (flags << _LENGTH_BITS) | len(payload)
+    return header.to_bytes(HEADER_SIZE, "big") + payload
+
+
+class FrameReader:
+    """
+    Incremental frame reader over a blocking socket.
+
+    Partially received data survives socket timeouts, so callers can poll
+    with `settimeout` without losing stream synchronisation.
+    """
+
+    def __init__(self, sock, max_size=MAX_MESSAGE_SIZE):
+        self._sock = sock
+        self._max_size = max_size
+        self._buf = bytearray(_INITIAL_BUFFER)
+        self._view = memoryview(self._buf)
+        self._start = 0
+        self._end = 0
+        self._frames = deque()
+        self.eof = False
+
+    def read_frames(self):
+        """
+        Return every complete frame currently available as (flags, payload)
+        tuples, receiving from the socket once if none is buffered. Returns
+        [] on EOF; socket timeouts and errors propagate to the caller.
+        """
+        if not self._frames and not self.eof:
+            self._fill()
+        frames = list(self._frames)
+        self._frames.clear()
+        return frames
+
+    def read_frame(self):
+        """Block until one frame is complete; return (flags, payload) or None on EOF."""
+        while not self._frames:
+            if self.eof:
+                return None
+            self._fill()
+        return self._frames.popleft()
+
+    def _fill(self):
+        if self._end == len(self._buf):
+            self._make_room(HEADER_SIZE)
+        received = self._sock.recv_into(self._view[self._end:])
+        if received == 0:
+            self.eof = True
+            return
+        self._end += received
+        self._parse()
+
+    def _parse(self):
+        view = self._view
+        while self._end - self._start >= HEADER_SIZE:
+            length, flags = parse_header(view[self._start:self._start + HEADER_SIZE], self._max_size)
+            frame_end = self._start + HEADER_SIZE + length
+            if frame_end > self._end:
+                self._make_room(HEADER_SIZE + length)
+                return
+            self._frames.append((flags, bytes(view[self._start + HEADER_SIZE:frame_end])))
+            self._start = frame_end
+
+        if self._start == self._end:
+            self._start = self._end = 0
+        elif self._end == len(self._buf):
+            self._make_room(HEADER_SIZE)
+
+    def _make_room(self, needed):
+        """Ensure `needed` bytes fit from the start of the pending data."""
+        pending = self._end - self._start
+        if self._start and len(self._buf) - self._start < needed:
+            self._buf[:pending] = bytes(self._view[self._start:self._end])
+            self._start, self._end = 0, pending
+        if len(self._buf) - self._start < needed:
+            self._view.release()
+            self._buf.extend(bytes(max(needed, len(self._buf))))
+            self._view = memoryview(self._buf)
+
+
+class FrameWriter:
+    """
+    Thread-safe frame writer; several frames are coalesced into a single
+    `sendall` so concurrent writers never interleave partial frames.
+    """
+
+    def __init__(self, sock, max_size=MAX_MESSAGE_SIZE):
+        self._sock = sock
+        self._max_size = max_size
+        self._lock = threading.Lock()
+
+    def send(self, payload, flags=0):
+        self.send_frames([encode_frame(payload, flags, self._max_size)])
+
+    def send_frames(self, frames):
+        """Send already encoded frames (see `encode_frame`) in one call."""
+        out = b"".join(frames)
+        with self._lock:
+            self._sock.sendall(out)
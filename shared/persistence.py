@@ -1,13 +1,20 @@
+import atexit
+import base64
+import functools
 import hashlib
 import json
 import os
+import queue
 import sqlite3
 import threading
 import time
+import zlib
+from concurrent.futures import Future
+from contextlib import contextmanager
 from datetime import datetime, timezone
+from itertools import repeat
 
-
-_LOCK = threading.Lock()
+from shared.columnar import ColumnarBatch
 
 
 def _project_root() -> str:
@@ -21,13 +28,296 @@ def _default_db_path() -> str:
 DB_PATH = os.getenv("APP_DB_PATH", _default_db_path())
 
 
+# Idle connections kept open between calls, and per-connection tuning.
+# Readers borrow pooled connections; all writes go through one writer thread.
+POOL_SIZE = int(os.getenv("PERSIST_POOL_SIZE", "8"))
+SYNCHRONOUS = os.getenv("PERSIST_SYNCHRONOUS", "NORMAL").upper()
+MMAP_SIZE = int(os.getenv("PERSIST_MMAP_SIZE", str(64 * 1024 * 1024)))
+CACHE_KB = int(os.getenv("PERSIST_CACHE_KB", "8192"))
+STATEMENT_CACHE = int(os.getenv("PERSIST_STATEMENT_CACHE", "256"))
+
+_POOL_LOCK = threading.Lock()
+_POOL = []
+
+
 def _connect():
+    """
+    Open a tuned connection. WAL lets readers proceed while a write is in
+    progress, and synchronous=NORMAL only fsyncs at checkpoints.
+    """
     os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    conn = sqlite3.connect(DB_PATH, timeout=10, check_same_thread=False)
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=10,
+        check_same_thread=False,
+        cached_statements=STATEMENT_CACHE,
+    )
     conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={SYNCHRONOUS}")
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size={-CACHE_KB}")
+    # The ingest staging table is a temp table; keep it off disk.
+    conn.execute("PRAGMA temp_store=MEMORY")
+    # INSERT OR REPLACE must fire delete triggers so the search index
+    # drops the replaced row.
+    conn.execute("PRAGMA recursive_triggers=ON")
     return conn
 
 
+@contextmanager
+def _connection():
+    """
+    Borrow a pooled connection. Statements are prepared once per
+    connection and reused from its statement cache on later calls.
+    """
+    path = DB_PATH
+    conn = None
+    with _POOL_LOCK:
+        while _POOL and conn is None:
+            pooled_path, candidate = _POOL.pop()
+            if pooled_path == path:
+                conn = candidate
+            else:
+                candidate.close()
+    if conn is None:
+        conn = _connect()
+    try:
+        yield conn
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        with _POOL_LOCK:
+            if len(_POOL) < POOL_SIZE:
+                _POOL.append((path, conn))
+                conn = None
+        if conn is not None:
+            conn.close()
+
+
+@contextmanager
+def _reading():
+    with _connection() as conn:
+        yield conn.cursor()
+
+
+def close_connections():
+    """Close every idle pooled connection (e.g. before moving the database)."""
+    with _POOL_LOCK:
+        pooled = [conn for _, conn in _POOL]
+        _POOL.clear()
+    for conn in pooled:
+        conn.close()
+
+
+# Default cap on ranked search results.
+SEARCH_LIMIT = int(os.getenv("SEARCH_LIMIT", "500"))
+# Rows per keyset page of pending files, and the most a caller may ask for.
+PAGE_SIZE = int(os.getenv("PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = 1000
+# The trigram tokenizer only matches terms of at least three characters.
+_TRIGRAM_MIN = 3
+# Whether each database (by path) has the trigram index: missing until
+# known, False when the SQLite build that migrated it lacks FTS5 trigram.
+_search_index = {}
+
+# Write pipeline: queued operations, and how many share one transaction.
+WRITE_QUEUE_SIZE = int(os.getenv("PERSIST_QUEUE_SIZE", "4096"))
+GROUP_MAX = int(os.getenv("PERSIST_GROUP_MAX", "256"))
+# Minimum seconds between "queue full" log lines.
+BACKPRESSURE_LOG_INTERVAL = 5.0
+
+
+class _WritePipeline:
+    """
+    Single writer thread with group commit.
+
+    Callers enqueue `(func, args)` and get a Future. The writer runs every
+    operation already waiting in the queue inside one transaction, each
+    under its own savepoint so a failing operation does not undo the rest.
+    It then commits once and resolves the futures, so a resolved Future
+    means the write is committed. When the queue is full `submit` blocks,
+    which pushes back on the caller. The stall is counted and logged.
+    """
+
+    def __init__(self, max_queue=WRITE_QUEUE_SIZE, group_max=GROUP_MAX):
+        self.max_queue = max_queue
+        self.group_max = group_max
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._submitted = 0
+        self._committed = 0
+        self._failed = 0
+        self._groups = 0
+        self._largest_group = 0
+        self._max_depth = 0
+        self._commit_seconds = 0.0
+        self._full_events = 0
+        self._blocked_seconds = 0.0
+        self._last_full_log = 0.0
+        self._last_error = None
+
+    def submit(self, func, args=()) -> Future:
+        self._ensure_started()
+        future = Future()
+        item = (func, args, future)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            started = time.perf_counter()
+            self._report_full()
+            self._queue.put(item)
+            with self._stats_lock:
+                self._blocked_seconds += time.perf_counter() - started
+        with self._stats_lock:
+            self._submitted += 1
+            self._max_depth = max(self._max_depth, self._queue.qsize())
+        return future
+
+    def flush(self, timeout=None):
+        """Wait until everything submitted so far is committed."""
+        return self.submit(None).result(timeout)
+
+    def _report_full(self):
+        now = time.monotonic()
+        with self._stats_lock:
+            self._full_events += 1
+            events = self._full_events
+            should_log = now - self._last_full_log >= BACKPRESSURE_LOG_INTERVAL
+            if should_log:
+                self._last_full_log = now
+        if should_log:
+            print(f"[MASTER] Persistence write queue full ({self.max_queue}); "
+                  f"callers are blocking (stall #{events})")
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="persistence-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.group_max:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._commit([op for op in batch if op[2].set_running_or_notify_cancel()])
+
+    def _commit(self, batch):
+        started = time.perf_counter()
+        outcomes = []
+        try:
+            with _connection() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                cur = conn.cursor()
+                for func, args, future in batch:
+                    if func is None:
+                        outcomes.append((future, None, None))
+                        continue
+                    cur.execute("SAVEPOINT op")
+                    try:
+                        outcomes.append((future, func(cur, *args), None))
+                    except Exception as e:
+                        cur.execute("ROLLBACK TO op")
+                        outcomes.append((future, None, e))
+                    cur.execute("RELEASE op")
+                conn.commit()
+        except Exception as e:
+            # The transaction itself failed: nothing in this group is durable.
+            with self._stats_lock:
+                self._failed += len(batch)
+                self._last_error = str(e)[:200]
+            print(f"[MASTER] Persistence group commit failed ({len(batch)} ops): {e}")
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+
+        elapsed = time.perf_counter() - started
+        failed = sum(1 for _, _, error in outcomes if error is not None)
+        with self._stats_lock:
+            self._groups += 1
+            self._largest_group = max(self._largest_group, len(batch))
+            self._committed += len(batch) - failed
+            self._failed += failed
+            self._commit_seconds += elapsed
+        for future, value, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(value)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "queue_limit": self.max_queue,
+                "max_queue_depth": self._max_depth,
+                "submitted": self._submitted,
+                "committed": self._committed,
+                "failed": self._failed,
+                "groups": self._groups,
+                "largest_group": self._largest_group,
+                "avg_group": round(self._committed / self._groups, 2) if self._groups else 0.0,
+                "commit_seconds": round(self._commit_seconds, 6),
+                "full_events": self._full_events,
+                "blocked_seconds": round(self._blocked_seconds, 6),
+                "last_error": self._last_error,
+            }
+
+
+_PIPELINE = _WritePipeline()
+
+
+def _report_failure(future):
+    error = future.exception()
+    if error is not None:
+        print(f"[MASTER] Background persistence write failed: {error}")
+
+
+def _write_op(func):
+    """
+    Make `func(cur, *args, **kwargs)` a public write: it runs on the writer
+    thread. The call blocks until commit and returns the result, or with
+    wait=False returns the Future right away (failures are logged).
+    """
+    @functools.wraps(func)
+    def submit(*args, wait=True, **kwargs):
+        future = _PIPELINE.submit(functools.partial(func, **kwargs) if kwargs else func, args)
+        if wait:
+            return future.result()
+        future.add_done_callback(_report_failure)
+        return future
+    return submit
+
+
+def flush_writes(timeout=None):
+    """Block until every write submitted so far has been committed."""
+    _PIPELINE.flush(timeout)
+
+
+def write_stats() -> dict:
+    """Queue depth, group sizes, commit time and backpressure of the writer."""
+    return _PIPELINE.stats()
+
+
+def _flush_at_exit():
+    if _PIPELINE._thread is not None:
+        try:
+            _PIPELINE.flush(timeout=5)
+        except Exception:
+            pass
+
+
+atexit.register(_flush_at_exit)
+
+
 def _now_iso() -> str:
     # Use system local time with offset for UI/log readability.
     return datetime.now().astimezone().isoformat()
@@ -39,161 +329,1087 @@ def _record_id(task_id: str, agent_ip: str, file_hash: str, path: str) -> str:
     return f"{task_id}|{agent_ip}|{file_hash}"
 
 
-def init_db():
-    with _LOCK:
-        conn = _connect()
-        cur = conn.cursor()
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS persisted_agents (
-                agent_ip TEXT PRIMARY KEY,
-                status TEXT NOT NULL,
-                last_seen REAL NOT NULL
-            )
-            """
+def _migrate_core_tables(cur):
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS persisted_agents (
+            agent_ip TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            last_seen REAL NOT NULL
         )
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS pending_files (
-                id TEXT PRIMARY KEY,
-                task_id TEXT NOT NULL,
-                agent_ip TEXT NOT NULL,
-                file_hash TEXT,
-                filename TEXT NOT NULL,
-                path TEXT NOT NULL,
-                language TEXT,
-                confidence REAL,
-                reason TEXT,
-                created_at TEXT NOT NULL
+        """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS pending_files (
+            id TEXT PRIMARY KEY,
+            task_id TEXT NOT NULL,
+            agent_ip TEXT NOT NULL,
+            file_hash TEXT,
+            filename TEXT NOT NULL,
+            path TEXT NOT NULL,
+            language TEXT,
+            confidence REAL,
+            reason TEXT,
+            created_at TEXT NOT NULL
+        )
+        """
+    )
+    # Ids received so far by an in-progress streamed result set.
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS pending_stream_seen (
+            task_id TEXT NOT NULL,
+            agent_ip TEXT NOT NULL,
+            id TEXT NOT NULL,
+            PRIMARY KEY (task_id, agent_ip, id)
+        ) WITHOUT ROWID
+        """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS delete_command_queue (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            agent_ip TEXT NOT NULL,
+            task_id TEXT NOT NULL,
+            payload_json TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            error TEXT,
+            created_at TEXT NOT NULL,
+            sent_at TEXT
+        )
+        """
+    )
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_delcmd_agent ON delete_command_queue(agent_ip)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_delcmd_status ON delete_command_queue(status)")
+
+
+def _migrate_page_indexes(cur):
+    # Keyset pages are ordered by (created_at, id), optionally within one
+    # task, agent or language. These also serve the task/agent lookups the
+    # single-column indexes used to.
+    cur.execute("DROP INDEX IF EXISTS idx_pending_agent")
+    cur.execute("DROP INDEX IF EXISTS idx_pending_task")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_pending_page ON pending_files(created_at, id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_pending_task_page ON pending_files(task_id, created_at, id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_pending_agent_page ON pending_files(agent_ip, created_at, id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_pending_language_page ON pending_files(language, created_at, id)")
+
+
+def _migrate_data_versions(cur):
+    # Change counters read by the UI's conditional GETs; see data_versions().
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS data_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        ) WITHOUT ROWID
+        """
+    )
+
+
+# Last path component of deletion_reports.path (Windows or POSIX separators).
+_SQL_BASENAME = (
+    "COALESCE(NULLIF(replace(path, rtrim(path, replace(replace(path, '\\', ''), '/', '')), ''), ''),"
+    " 'unknown')"
+)
+
+
+def _create_audit_log(cur):
+    """
+    One audit trail for UI decisions and agent deletion reports, newest
+    first by epoch `created_at`. Rows the audit view should not show
+    (dispatch failures, failed reports later superseded by a confirmed
+    deletion of the same file) are flagged `hidden` when written, so reads
+    are a plain scan of the partial index.
+    """
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS audit_log (
+            id INTEGER PRIMARY KEY,
+            created_at REAL NOT NULL,
+            source TEXT NOT NULL,
+            source_id INTEGER,
+            record_id TEXT NOT NULL DEFAULT '',
+            task_id TEXT,
+            agent_ip TEXT,
+            file_hash TEXT,
+            filename TEXT NOT NULL,
+            path TEXT NOT NULL DEFAULT '',
+            language TEXT,
+            confidence REAL,
+            action TEXT NOT NULL,
+            action_by TEXT NOT NULL,
+            notes TEXT,
+            hidden INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    )
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_audit_visible ON audit_log(created_at, id) WHERE hidden = 0"
+    )
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_audit_file ON audit_log(task_id, agent_ip, file_hash, path)"
+    )
+    # Rows imported from the older stores, so an interrupted import can rerun.
+    cur.execute(
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_audit_source
+        ON audit_log(source, source_id) WHERE source_id IS NOT NULL
+        """
+    )
+
+    # Agent reports used to live in deletion_reports; move any left there.
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS deletion_reports (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            agent_ip TEXT NOT NULL,
+            task_id TEXT,
+            file_hash TEXT,
+            path TEXT,
+            status TEXT NOT NULL,
+            details TEXT,
+            created_at TEXT NOT NULL
+        )
+        """
+    )
+    cur.execute(
+        f"""
+        INSERT OR IGNORE INTO audit_log(
+            created_at, source, source_id, task_id, agent_ip, file_hash,
+            filename, path, action, action_by, notes
+        )
+        SELECT round((julianday(created_at) - 2440587.5) * 86400.0, 3), 'agent', id, task_id, agent_ip, file_hash,
+               {_SQL_BASENAME}, COALESCE(path, ''),
+               CASE WHEN status = 'deleted' THEN 'delete_confirmed' ELSE 'delete_failed' END,
+               'agent', COALESCE(details, '')
+        FROM deletion_reports
+        """
+    )
+    if cur.rowcount > 0:
+        cur.execute("DELETE FROM deletion_reports")
+        _hide_superseded(cur)
+        _bump_version(cur, "audit_log")
+
+
+def _hide_superseded(cur, keys=None):
+    """
+    Hide failed deletion reports for files that have a confirmed deletion.
+    `keys` limits the check to (task_id, agent_ip, file_hash, path) tuples.
+    """
+    query = """
+        UPDATE audit_log SET hidden = 1
+        WHERE action = 'delete_failed' AND hidden = 0
+          AND EXISTS (
+              SELECT 1 FROM audit_log AS c
+              WHERE c.action = 'delete_confirmed'
+                AND c.task_id IS audit_log.task_id AND c.agent_ip IS audit_log.agent_ip
+                AND c.file_hash IS audit_log.file_hash AND c.path IS audit_log.path
+          )
+    """
+    if keys is None:
+        cur.execute(query)
+        return
+    cur.executemany(
+        query + " AND task_id IS ? AND agent_ip IS ? AND file_hash IS ? AND path IS ?",
+        keys,
+    )
+
+
+def _create_search_index(cur):
+    """
+    Trigram FTS5 index over the searchable pending_files columns, kept in
+    sync by triggers. Built from existing rows the first time it is created.
+    """
+    exists = cur.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='pending_files_fts'"
+    ).fetchone()
+    if not exists:
+        try:
+            cur.execute(
+                """
+                CREATE VIRTUAL TABLE pending_files_fts USING fts5(
+                    filename, path, agent_ip, task_id, language,
+                    content='pending_files', content_rowid='rowid',
+                    tokenize='trigram'
+                )
+                """
             )
-            """
+        except sqlite3.OperationalError as e:
+            print(f"[MASTER] FTS5 trigram search unavailable, using LIKE search: {e}")
+            _search_index[DB_PATH] = False
+            return
+        cur.execute("INSERT INTO pending_files_fts(pending_files_fts) VALUES('rebuild')")
+
+    cur.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS pending_files_ai AFTER INSERT ON pending_files BEGIN
+            INSERT INTO pending_files_fts(rowid, filename, path, agent_ip, task_id, language)
+            VALUES (new.rowid, new.filename, new.path, new.agent_ip, new.task_id, new.language);
+        END
+        """
+    )
+    cur.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS pending_files_ad AFTER DELETE ON pending_files BEGIN
+            INSERT INTO pending_files_fts(pending_files_fts, rowid, filename, path, agent_ip, task_id, language)
+            VALUES ('delete', old.rowid, old.filename, old.path, old.agent_ip, old.task_id, old.language);
+        END
+        """
+    )
+    cur.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS pending_files_au AFTER UPDATE OF filename, path, agent_ip, task_id, language
+        ON pending_files BEGIN
+            INSERT INTO pending_files_fts(pending_files_fts, rowid, filename, path, agent_ip, task_id, language)
+            VALUES ('delete', old.rowid, old.filename, old.path, old.agent_ip, old.task_id, old.language);
+            INSERT INTO pending_files_fts(rowid, filename, path, agent_ip, task_id, language)
+            VALUES (new.rowid, new.filename, new.path, new.agent_ip, new.task_id, new.language);
+        END
+        """
+    )
+    _search_index[DB_PATH] = True
+
+
+def _search_index_ready(cur) -> bool:
+    """Whether the current database has the trigram index; looked up once per database."""
+    ready = _search_index.get(DB_PATH)
+    if ready is None:
+        ready = _search_index[DB_PATH] = cur.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='pending_files_fts'"
+        ).fetchone() is not None
+    return ready
+
+
+def _migrate_command_leases(cur):
+    for column in (
+        "attempts INTEGER NOT NULL DEFAULT 0",
+        "next_attempt_at REAL NOT NULL DEFAULT 0",
+        "lease_until REAL",
+        "enqueued_at REAL",
+        "payload_digest TEXT",
+        "acked_at TEXT",
+    ):
+        cur.execute(f"ALTER TABLE delete_command_queue ADD COLUMN {column}")
+    cur.execute(
+        "UPDATE delete_command_queue SET enqueued_at = round((julianday(created_at) - 2440587.5) * 86400.0, 3)"
+    )
+    # Commands sent before acks existed can no longer be acked; they are done.
+    cur.execute("UPDATE delete_command_queue SET status = 'acked', acked_at = sent_at WHERE status = 'sent'")
+    rows = cur.execute(
+        "SELECT id, agent_ip, task_id, payload_json FROM delete_command_queue WHERE status = 'pending'"
+    ).fetchall()
+    cur.executemany(
+        "UPDATE delete_command_queue SET payload_digest = ? WHERE id = ?",
+        [(_command_digest(r["agent_ip"], r["task_id"], json.loads(r["payload_json"])), r["id"]) for r in rows],
+    )
+    cur.execute("DROP INDEX IF EXISTS idx_delcmd_agent")
+    cur.execute("DROP INDEX IF EXISTS idx_delcmd_status")
+    cur.execute(
+        "CREATE INDEX idx_delcmd_open ON delete_command_queue(agent_ip, id) WHERE status IN ('pending', 'sent')"
+    )
+    cur.execute(
+        """
+        CREATE INDEX idx_delcmd_digest ON delete_command_queue(payload_digest)
+        WHERE status IN ('pending', 'sent')
+        """
+    )
+    cur.execute("CREATE INDEX idx_delcmd_status ON delete_command_queue(status, enqueued_at)")
+
+
+def _migrate_scan_result_chunks(cur):
+    # Scan result sets the collector evicted from memory, chunk by chunk.
+    cur.execute(
+        """
+        CREATE TABLE scan_result_chunks (
+            task_id TEXT NOT NULL,
+            agent_ip TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            files INTEGER NOT NULL,
+            data BLOB NOT NULL,
+            PRIMARY KEY (task_id, agent_ip, seq)
+        ) WITHOUT ROWID
+        """
+    )
+
+
+# SQL for the current time as epoch seconds, for use inside triggers.
+_SQL_NOW = "((julianday('now') - 2440587.5) * 86400.0)"
+
+
+def _migrate_task_progress(cur):
+    """
+    One row per task with its progress counters, and one per agent it
+    went to. The file counters are kept by triggers on pending_files and
+    audit_log, in the same transaction as the change they count, so a
+    task's progress is a primary key read however many files it has.
+    """
+    cur.execute(
+        """
+        CREATE TABLE tasks (
+            task_id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL DEFAULT 'scan',
+            params_json TEXT NOT NULL DEFAULT '{}',
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            agents_dispatched INTEGER NOT NULL DEFAULT 0,
+            agents_replied INTEGER NOT NULL DEFAULT 0,
+            files_reported INTEGER NOT NULL DEFAULT 0,
+            files_pending INTEGER NOT NULL DEFAULT 0,
+            files_approved INTEGER NOT NULL DEFAULT 0,
+            files_rejected INTEGER NOT NULL DEFAULT 0,
+            files_deleted INTEGER NOT NULL DEFAULT 0,
+            files_failed INTEGER NOT NULL DEFAULT 0
         )
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_pending_agent ON pending_files(agent_ip)")
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_pending_task ON pending_files(task_id)")
+        """
+    )
+    cur.execute("CREATE INDEX idx_tasks_page ON tasks(created_at, task_id)")
+    cur.execute(
+        """
+        CREATE TABLE task_agents (
+            task_id TEXT NOT NULL,
+            agent_ip TEXT NOT NULL,
+            state TEXT NOT NULL,
+            dispatched_at REAL,
+            replied_at REAL,
+            files_reported INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (task_id, agent_ip)
+        ) WITHOUT ROWID
+        """
+    )
+
+    # Tasks already in the database: agents with pending files replied.
+    cur.execute(
+        """
+        INSERT INTO task_agents(task_id, agent_ip, state, replied_at, files_reported)
+        SELECT task_id, agent_ip, 'replied',
+               MAX((julianday(created_at) - 2440587.5) * 86400.0), COUNT(*)
+        FROM pending_files GROUP BY task_id, agent_ip
+        """
+    )
+    cur.execute(
+        f"""
+        INSERT INTO tasks(task_id, created_at, updated_at, agents_dispatched, agents_replied,
+                          files_reported, files_pending)
+        SELECT task_id, COALESCE(MIN(replied_at), {_SQL_NOW}), COALESCE(MAX(replied_at), {_SQL_NOW}),
+               COUNT(*), COUNT(*), SUM(files_reported), SUM(files_reported)
+        FROM task_agents GROUP BY task_id
+        """
+    )
+    cur.execute(
+        """
+        INSERT INTO tasks(task_id, created_at, updated_at, files_approved, files_rejected,
+                          files_deleted, files_failed)
+        SELECT task_id, MIN(created_at), MAX(created_at),
+               SUM(action IN ('delete_dispatched', 'delete_queued')), SUM(action = 'rejected'),
+               SUM(action = 'delete_confirmed'), SUM(action = 'delete_failed' AND hidden = 0)
+        FROM audit_log WHERE task_id IS NOT NULL GROUP BY task_id
+        ON CONFLICT(task_id) DO UPDATE SET
+            created_at = MIN(created_at, excluded.created_at),
+            updated_at = MAX(updated_at, excluded.updated_at),
+            files_approved = excluded.files_approved,
+            files_rejected = excluded.files_rejected,
+            files_deleted = excluded.files_deleted,
+            files_failed = excluded.files_failed
+        """
+    )
+
+    cur.execute(
+        f"""
+        CREATE TRIGGER task_pending_ai AFTER INSERT ON pending_files BEGIN
+            INSERT INTO tasks(task_id, created_at, updated_at, files_pending)
+            VALUES (new.task_id, {_SQL_NOW}, {_SQL_NOW}, 1)
+            ON CONFLICT(task_id) DO UPDATE SET
+                files_pending = files_pending + 1, updated_at = excluded.updated_at;
+        END
+        """
+    )
+    cur.execute(
+        f"""
+        CREATE TRIGGER task_pending_ad AFTER DELETE ON pending_files BEGIN
+            UPDATE tasks SET files_pending = files_pending - 1, updated_at = {_SQL_NOW}
+            WHERE task_id = old.task_id;
+        END
+        """
+    )
+    cur.execute(
+        """
+        CREATE TRIGGER task_audit_ai AFTER INSERT ON audit_log
+        WHEN new.task_id IS NOT NULL
+         AND new.action IN ('delete_dispatched', 'delete_queued', 'rejected', 'delete_confirmed', 'delete_failed')
+        BEGIN
+            INSERT INTO tasks(task_id, created_at, updated_at)
+            VALUES (new.task_id, new.created_at, new.created_at)
+            ON CONFLICT(task_id) DO UPDATE SET updated_at = excluded.updated_at;
+            UPDATE tasks SET
+                files_approved = files_approved + (new.action IN ('delete_dispatched', 'delete_queued')),
+                files_rejected = files_rejected + (new.action = 'rejected'),
+                files_deleted = files_deleted + (new.action = 'delete_confirmed'),
+                files_failed = files_failed + (new.action = 'delete_failed' AND new.hidden = 0)
+            WHERE task_id = new.task_id;
+        END
+        """
+    )
+    # A failure superseded by a confirmed deletion no longer counts.
+    cur.execute(
+        """
+        CREATE TRIGGER task_audit_hidden AFTER UPDATE OF hidden ON audit_log
+        WHEN new.action = 'delete_failed' AND new.task_id IS NOT NULL AND old.hidden = 0 AND new.hidden = 1
+        BEGIN
+            UPDATE tasks SET files_failed = files_failed - 1 WHERE task_id = new.task_id;
+        END
+        """
+    )
+
+
+# Upsert adding to the file_counts rows of one agent and language and
+# the overall row; format with the column and the agent/language row.
+_SQL_ADD_FILE_COUNTS = """
+    INSERT INTO file_counts(dimension, key, {column})
+    VALUES ('all', '', {delta}), ('agent', COALESCE({row}.agent_ip, 'unknown'), {delta}),
+           ('language', COALESCE({row}.language, 'unknown'), {delta})
+    ON CONFLICT(dimension, key) DO UPDATE SET {column} = {column} + excluded.{column};
+"""
+
+
+def _migrate_file_counts(cur):
+    """
+    Pending, deleted and failed file counts overall, per agent and per
+    language, kept by triggers like the task counters so the dashboard
+    summary never counts rows. Deleted and failed follow the agents'
+    deletion reports in audit_log; failures hidden by a later confirmed
+    deletion stop counting.
+    """
+    cur.execute(
+        """
+        CREATE TABLE file_counts (
+            dimension TEXT NOT NULL,
+            key TEXT NOT NULL,
+            pending INTEGER NOT NULL DEFAULT 0,
+            deleted INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (dimension, key)
+        ) WITHOUT ROWID
+        """
+    )
+    for dimension, key in (
+        ("'all'", "''"),
+        ("'agent'", "COALESCE(agent_ip, 'unknown')"),
+        ("'language'", "COALESCE(language, 'unknown')"),
+    ):
         cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS deletion_reports (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                agent_ip TEXT NOT NULL,
-                task_id TEXT,
-                file_hash TEXT,
-                path TEXT,
-                status TEXT NOT NULL,
-                details TEXT,
-                created_at TEXT NOT NULL
-            )
+            f"""
+            INSERT INTO file_counts(dimension, key, pending)
+            SELECT {dimension}, {key}, COUNT(*) FROM pending_files GROUP BY 2
             """
         )
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_delrep_agent ON deletion_reports(agent_ip)")
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_delrep_task ON deletion_reports(task_id)")
         cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS delete_command_queue (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                agent_ip TEXT NOT NULL,
-                task_id TEXT NOT NULL,
-                payload_json TEXT NOT NULL,
-                status TEXT NOT NULL DEFAULT 'pending',
-                error TEXT,
-                created_at TEXT NOT NULL,
-                sent_at TEXT
-            )
+            f"""
+            INSERT INTO file_counts(dimension, key, deleted, failed)
+            SELECT {dimension}, {key}, SUM(action = 'delete_confirmed'), SUM(action = 'delete_failed' AND hidden = 0)
+            FROM audit_log WHERE action IN ('delete_confirmed', 'delete_failed') GROUP BY 2
+            ON CONFLICT(dimension, key) DO UPDATE SET deleted = excluded.deleted, failed = excluded.failed
             """
         )
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_delcmd_agent ON delete_command_queue(agent_ip)")
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_delcmd_status ON delete_command_queue(status)")
-        conn.commit()
-        conn.close()
 
+    cur.execute(
+        f"""
+        CREATE TRIGGER file_counts_pending_ai AFTER INSERT ON pending_files BEGIN
+            {_SQL_ADD_FILE_COUNTS.format(column="pending", delta=1, row="new")}
+        END
+        """
+    )
+    cur.execute(
+        f"""
+        CREATE TRIGGER file_counts_pending_ad AFTER DELETE ON pending_files BEGIN
+            {_SQL_ADD_FILE_COUNTS.format(column="pending", delta=-1, row="old")}
+        END
+        """
+    )
+    cur.execute(
+        f"""
+        CREATE TRIGGER file_counts_pending_au AFTER UPDATE OF language ON pending_files
+        WHEN old.language IS NOT new.language BEGIN
+            {_SQL_ADD_FILE_COUNTS.format(column="pending", delta=-1, row="old")}
+            {_SQL_ADD_FILE_COUNTS.format(column="pending", delta=1, row="new")}
+        END
+        """
+    )
+    cur.execute(
+        f"""
+        CREATE TRIGGER file_counts_deleted_ai AFTER INSERT ON audit_log
+        WHEN new.action = 'delete_confirmed' BEGIN
+            {_SQL_ADD_FILE_COUNTS.format(column="deleted", delta=1, row="new")}
+        END
+        """
+    )
+    cur.execute(
+        f"""
+        CREATE TRIGGER file_counts_failed_ai AFTER INSERT ON audit_log
+        WHEN new.action = 'delete_failed' AND new.hidden = 0 BEGIN
+            {_SQL_ADD_FILE_COUNTS.format(column="failed", delta=1, row="new")}
+        END
+        """
+    )
+    cur.execute(
+        f"""
+        CREATE TRIGGER file_counts_failed_hidden AFTER UPDATE OF hidden ON audit_log
+        WHEN new.action = 'delete_failed' AND old.hidden = 0 AND new.hidden = 1 BEGIN
+            {_SQL_ADD_FILE_COUNTS.format(column="failed", delta=-1, row="new")}
+        END
+        """
+    )
 
-def upsert_agent(agent_ip: str, status: str):
-    with _LOCK:
-        conn = _connect()
-        cur = conn.cursor()
-        cur.execute(
-            """
-            INSERT INTO persisted_agents(agent_ip, status, last_seen)
-            VALUES (?, ?, ?)
-            ON CONFLICT(agent_ip) DO UPDATE SET
-                status=excluded.status,
-                last_seen=excluded.last_seen
-            """,
-            (agent_ip, status, time.time()),
+
+def _migrate_task_queue(cur):
+    # Scan tasks for agents that were not connected when they were
+    # dispatched, handed to each agent when it next registers or beats.
+    cur.execute(
+        """
+        CREATE TABLE task_queue (
+            agent_ip TEXT NOT NULL,
+            task_id TEXT NOT NULL,
+            payload_json TEXT NOT NULL,
+            queued_at REAL NOT NULL,
+            sent_at REAL,
+            PRIMARY KEY (agent_ip, task_id)
+        ) WITHOUT ROWID
+        """
+    )
+    cur.execute("CREATE INDEX idx_task_queue_open ON task_queue(agent_ip, queued_at) WHERE sent_at IS NULL")
+
+
+# Audit actions that record a file approved for deletion.
+_SQL_APPROVAL = "('delete_dispatched', 'delete_queued')"
+
+
+def _migrate_pending_approvals(cur):
+    """
+    Approved files stay pending until the agent reports on them, marked by
+    approved_at so they are not approved or rejected again meanwhile.
+    Files of delete commands still open count as approved. A task counts
+    each approved file once, however often it was approved.
+    """
+    cur.execute("ALTER TABLE pending_files ADD COLUMN approved_at REAL")
+    cur.execute(
+        f"""
+        UPDATE pending_files SET approved_at = {_SQL_NOW}
+        WHERE id IN (
+            SELECT json_extract(e.value, '$.record_id')
+            FROM delete_command_queue q, json_each(q.payload_json, '$.approved_entries') e
+            WHERE q.status IN ('pending', 'sent')
         )
-        conn.commit()
-        conn.close()
+        """
+    )
+    cur.execute("DROP TRIGGER task_audit_ai")
+    cur.execute(
+        f"""
+        CREATE TRIGGER task_audit_ai AFTER INSERT ON audit_log
+        WHEN new.task_id IS NOT NULL
+         AND new.action IN ('delete_dispatched', 'delete_queued', 'rejected', 'delete_confirmed', 'delete_failed')
+        BEGIN
+            INSERT INTO tasks(task_id, created_at, updated_at)
+            VALUES (new.task_id, new.created_at, new.created_at)
+            ON CONFLICT(task_id) DO UPDATE SET updated_at = excluded.updated_at;
+            UPDATE tasks SET
+                files_approved = files_approved + (new.action IN {_SQL_APPROVAL} AND NOT EXISTS (
+                    SELECT 1 FROM audit_log a
+                    WHERE a.task_id = new.task_id AND a.agent_ip = new.agent_ip AND a.file_hash IS new.file_hash
+                      AND a.path = new.path AND a.action IN {_SQL_APPROVAL} AND a.id != new.id
+                )),
+                files_rejected = files_rejected + (new.action = 'rejected'),
+                files_deleted = files_deleted + (new.action = 'delete_confirmed'),
+                files_failed = files_failed + (new.action = 'delete_failed' AND new.hidden = 0)
+            WHERE task_id = new.task_id;
+        END
+        """
+    )
+    cur.execute(
+        f"""
+        UPDATE tasks SET files_approved = (
+            SELECT COUNT(*) FROM (
+                SELECT DISTINCT agent_ip, file_hash, path FROM audit_log
+                WHERE task_id = tasks.task_id AND action IN {_SQL_APPROVAL}
+            )
+        )
+        """
+    )
 
 
-def touch_agent(agent_ip: str):
-    with _LOCK:
-        conn = _connect()
-        cur = conn.cursor()
+def _migrate_empty_languages(cur):
+    # Columnar results used to store a missing language as '' where row
+    # results store NULL; the pending file triggers move those counts.
+    cur.execute("UPDATE pending_files SET language = NULL WHERE language = ''")
+    cur.execute("UPDATE audit_log SET language = NULL WHERE language = ''")
+    cur.execute(
+        """
+        INSERT INTO file_counts(dimension, key, pending, deleted, failed)
+        SELECT 'language', 'unknown', pending, deleted, failed FROM file_counts
+        WHERE dimension = 'language' AND key = ''
+        ON CONFLICT(dimension, key) DO UPDATE SET
+            pending = pending + excluded.pending,
+            deleted = deleted + excluded.deleted,
+            failed = failed + excluded.failed
+        """
+    )
+    cur.execute("DELETE FROM file_counts WHERE dimension = 'language' AND key = ''")
+
+
+# Schema changes in the order they were introduced. Each runs once per
+# database and is recorded in schema_migrations. Databases created before
+# the table existed already have some of these objects, so every step
+# must also be safe to apply over them (IF NOT EXISTS and friends). New
+# changes are appended with the next number, never edited in place.
+_MIGRATIONS = (
+    (1, "core tables", _migrate_core_tables),
+    (2, "keyset page indexes", _migrate_page_indexes),
+    (3, "pending file search index", _create_search_index),
+    (4, "data version counters", _migrate_data_versions),
+    (5, "unified audit log", _create_audit_log),
+    (6, "delete command leases", _migrate_command_leases),
+    (7, "spilled scan results", _migrate_scan_result_chunks),
+    (8, "task progress", _migrate_task_progress),
+    (9, "file count summary", _migrate_file_counts),
+    (10, "queued scan tasks", _migrate_task_queue),
+    (11, "pending file approvals", _migrate_pending_approvals),
+    (12, "empty languages as NULL", _migrate_empty_languages),
+)
+
+_schema_lock = threading.Lock()
+_schema_ready = None
+
+
+@_write_op
+def _migrate(cur):
+    """Apply the migrations this database has not seen yet; returns their versions."""
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+        """
+    )
+    current = cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations").fetchone()[0]
+    applied = []
+    for version, name, migration in _MIGRATIONS:
+        if version <= current:
+            continue
+        migration(cur)
         cur.execute(
-            """
-            UPDATE persisted_agents
-            SET last_seen=?
-            WHERE agent_ip=?
-            """,
-            (time.time(), agent_ip),
+            "INSERT INTO schema_migrations(version, name, applied_at) VALUES (?, ?, ?)",
+            (version, name, _now_iso()),
         )
-        conn.commit()
-        conn.close()
+        applied.append(version)
+    return applied
+
+
+def init_db():
+    """
+    Bring the database schema up to date. Call once at process startup;
+    the migrations run on the first call for a database and later calls
+    return without touching SQLite.
+    """
+    global _schema_ready
+    if _schema_ready == DB_PATH:
+        return
+    with _schema_lock:
+        if _schema_ready == DB_PATH:
+            return
+        applied = _migrate()
+        if applied:
+            print(f"[MASTER] Applied schema migrations {applied} to {DB_PATH}")
+        _schema_ready = DB_PATH
+
+
+def _bump_version(cur, name: str):
+    cur.execute(
+        """
+        INSERT INTO data_versions(name, version) VALUES (?, 1)
+        ON CONFLICT(name) DO UPDATE SET version = version + 1
+        """,
+        (name,),
+    )
+
+
+def data_versions(*names) -> tuple:
+    """
+    Current change counters for `names`, in order (0 if never written).
+    Every write op that changes agents, pending_files, audit_log or tasks
+    bumps the matching counter in the same transaction, so the values are
+    consistent across processes sharing the database. Task counters also
+    move with pending_files and audit_log. An agent's last_seen alone does
+    not move the agents counter.
+    """
+    with _reading() as cur:
+        placeholders = ",".join(["?"] * len(names))
+        versions = dict(cur.execute(
+            f"SELECT name, version FROM data_versions WHERE name IN ({placeholders})",
+            names,
+        ).fetchall())
+    return tuple(versions.get(name, 0) for name in names)
+
+
+@_write_op
+def upsert_agent(cur, agent_ip: str, status: str):
+    cur.execute(
+        """
+        INSERT INTO persisted_agents(agent_ip, status, last_seen)
+        VALUES (?, ?, ?)
+        ON CONFLICT(agent_ip) DO UPDATE SET
+            status=excluded.status,
+            last_seen=excluded.last_seen
+        """,
+        (agent_ip, status, time.time()),
+    )
+    _bump_version(cur, "agents")
+
+
+@_write_op
+def touch_agent(cur, agent_ip: str):
+    cur.execute(
+        """
+        UPDATE persisted_agents
+        SET last_seen=?
+        WHERE agent_ip=?
+        """,
+        (time.time(), agent_ip),
+    )
+
+
+@_write_op
+def save_agent_states(cur, states):
+    """
+    Upsert many (agent_ip, status, last_seen) rows in one statement; used
+    by the registry's write-behind flush. The agents version moves only if
+    an agent is new or changed status, not for last_seen alone.
+    """
+    known = dict(cur.execute(
+        f"SELECT agent_ip, status FROM persisted_agents WHERE agent_ip IN {_ID_LIST}",
+        (_id_list(ip for ip, _, _ in states),),
+    ).fetchall())
+    changed = any(known.get(ip) != status for ip, status, _ in states)
+    cur.executemany(
+        """
+        INSERT INTO persisted_agents(agent_ip, status, last_seen)
+        VALUES (?, ?, ?)
+        ON CONFLICT(agent_ip) DO UPDATE SET
+            status=excluded.status,
+            last_seen=excluded.last_seen
+        """,
+        states,
+    )
+    if changed:
+        _bump_version(cur, "agents")
 
 
 def list_agents():
-    with _LOCK:
-        conn = _connect()
-        cur = conn.cursor()
+    with _reading() as cur:
         rows = cur.execute(
             "SELECT agent_ip, status, last_seen FROM persisted_agents ORDER BY agent_ip"
         ).fetchall()
-        conn.close()
         return [dict(row) for row in rows]
 
 
-def replace_pending_files(task_id: str, agent_ip: str, files):
-    with _LOCK:
-        conn = _connect()
-        cur = conn.cursor()
-        cur.execute(
-            "DELETE FROM pending_files WHERE task_id=? AND agent_ip=?",
-            (task_id, agent_ip),
+def _pending_params(task_id: str, agent_ip: str, files):
+    for item in files:
+        path = item.get("filepath") or item.get("path") or ""
+        filename = item.get("filename") or os.path.basename(path) or "unknown"
+        file_hash = item.get("file_hash", "")
+        yield (
+            _record_id(task_id, agent_ip, file_hash, path),
+            task_id,
+            agent_ip,
+            file_hash,
+            filename,
+            path,
+            item.get("language") or item.get("type"),
+            float(item.get("confidence", 0.0)),
+            item.get("reason", ""),
+            item.get("modified_time") or _now_iso(),
         )
-        for item in files:
-            path = item.get("filepath") or item.get("path") or ""
-            filename = item.get("filename") or os.path.basename(path) or "unknown"
-            file_hash = item.get("file_hash", "")
-            rid = _record_id(task_id, agent_ip, file_hash, path)
-            cur.execute(
-                """
-                INSERT OR REPLACE INTO pending_files(
-                    id, task_id, agent_ip, file_hash, filename, path, language,
-                    confidence, reason, created_at
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    rid,
-                    task_id,
-                    agent_ip,
-                    file_hash,
-                    filename,
-                    path,
-                    item.get("language") or item.get("type"),
-                    float(item.get("confidence", 0.0)),
-                    item.get("reason", ""),
-                    item.get("modified_time") or _now_iso(),
-                ),
-            )
-        conn.commit()
-        conn.close()
 
 
-def list_pending_files(search: str = ""):
-    with _LOCK:
-        conn = _connect()
-        cur = conn.cursor()
-        if search.strip():
-            token = f"%{search.strip().lower()}%"
+def _columnar_params(task_id: str, agent_ip: str, batch: ColumnarBatch):
+    """Insert parameters zipped straight from the batch columns."""
+    paths = batch.column("filepath")
+    hashes = batch.column("file_hash")
+    names = batch.column("filename")
+    if not all(names):
+        names = [name or os.path.basename(p) or "unknown" for name, p in zip(names, paths)]
+    modified = batch.column("modified_time")
+    if not all(modified):
+        now = _now_iso()
+        modified = [m or now for m in modified]
+    # A missing language is NULL, as for row results.
+    languages = batch.column("language")
+    if not all(languages):
+        languages = [language or None for language in languages]
+    prefix = f"{task_id}|{agent_ip}|"
+    if all(hashes):
+        ids = [prefix + h for h in hashes]
+    else:
+        ids = [_record_id(task_id, agent_ip, h, p) for h, p in zip(hashes, paths)]
+    return zip(
+        ids,
+        repeat(task_id),
+        repeat(agent_ip),
+        hashes,
+        names,
+        paths,
+        languages,
+        batch.column("confidence"),
+        batch.column("reason"),
+        modified,
+    )
+
+
+_PENDING_COLUMNS = (
+    "id, task_id, agent_ip, file_hash, filename, path, language, "
+    "confidence, reason, created_at"
+)
+
+
+def _file_params(task_id: str, agent_ip: str, files):
+    if isinstance(files, ColumnarBatch):
+        return _columnar_params(task_id, agent_ip, files)
+    return _pending_params(task_id, agent_ip, files)
+
+
+def _insert_pending_rows(cur, task_id: str, agent_ip: str, files):
+    cur.executemany(
+        f"""
+        INSERT OR REPLACE INTO pending_files({_PENDING_COLUMNS})
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        _file_params(task_id, agent_ip, files),
+    )
+
+
+def _stage_rows(cur, task_id: str, agent_ip: str, files) -> int:
+    """
+    Load a result set into the connection's temp staging table. A later
+    duplicate id replaces an earlier one, as in a direct insert.
+    """
+    cur.execute(
+        """
+        CREATE TEMP TABLE IF NOT EXISTS pending_stage (
+            id TEXT PRIMARY KEY,
+            task_id TEXT NOT NULL,
+            agent_ip TEXT NOT NULL,
+            file_hash TEXT,
+            filename TEXT NOT NULL,
+            path TEXT NOT NULL,
+            language TEXT,
+            confidence REAL,
+            reason TEXT,
+            created_at TEXT NOT NULL
+        )
+        """
+    )
+    cur.execute("DELETE FROM temp.pending_stage")
+    cur.executemany(
+        f"""
+        INSERT OR REPLACE INTO temp.pending_stage({_PENDING_COLUMNS})
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        _file_params(task_id, agent_ip, files),
+    )
+    return cur.execute("SELECT COUNT(*) FROM temp.pending_stage").fetchone()[0]
+
+
+def _merge_stage(cur):
+    """
+    Apply the staged rows: update rows whose content changed, insert new
+    ones, and leave identical rows untouched. Returns (inserted, updated).
+    """
+    cur.execute(
+        """
+        UPDATE pending_files
+        SET file_hash=s.file_hash,
+            filename=s.filename,
+            path=s.path,
+            language=s.language,
+            confidence=s.confidence,
+            reason=s.reason,
+            created_at=s.created_at
+        FROM temp.pending_stage AS s
+        WHERE pending_files.id = s.id
+          AND (pending_files.file_hash IS NOT s.file_hash
+               OR pending_files.filename IS NOT s.filename
+               OR pending_files.path IS NOT s.path
+               OR pending_files.language IS NOT s.language
+               OR pending_files.confidence IS NOT s.confidence
+               OR pending_files.reason IS NOT s.reason
+               OR pending_files.created_at IS NOT s.created_at)
+        """
+    )
+    updated = cur.rowcount
+    cur.execute(
+        f"""
+        INSERT INTO pending_files({_PENDING_COLUMNS})
+        SELECT {_PENDING_COLUMNS} FROM temp.pending_stage AS s
+        WHERE NOT EXISTS (SELECT 1 FROM pending_files p WHERE p.id = s.id)
+        """
+    )
+    return cur.rowcount, updated
+
+
+def _ingest_result(staged, inserted, updated, deleted, started, diffed):
+    finished = time.perf_counter()
+    return {
+        "staged": staged,
+        "inserted": inserted,
+        "updated": updated,
+        "deleted": deleted,
+        "unchanged": staged - inserted - updated,
+        "stage_seconds": round(diffed - started, 6),
+        "diff_seconds": round(finished - diffed, 6),
+        "total_seconds": round(finished - started, 6),
+    }
+
+
+@_write_op
+def replace_pending_files(cur, task_id: str, agent_ip: str, files):
+    """
+    Make the task/agent's pending rows match `files`, writing only rows
+    that are new, changed or gone. Returns counts and timings.
+    """
+    started = time.perf_counter()
+    staged = _stage_rows(cur, task_id, agent_ip, files)
+    diffed = time.perf_counter()
+    cur.execute(
+        """
+        DELETE FROM pending_files
+        WHERE task_id=? AND agent_ip=?
+          AND id NOT IN (SELECT id FROM temp.pending_stage)
+        """,
+        (task_id, agent_ip),
+    )
+    deleted = cur.rowcount
+    inserted, updated = _merge_stage(cur)
+    if inserted or updated or deleted:
+        _bump_version(cur, "pending_files")
+    return _ingest_result(staged, inserted, updated, deleted, started, diffed)
+
+
+@_write_op
+def clear_pending_files(cur, task_id: str, agent_ip: str):
+    """
+    Drop every pending row of a task/agent.
+    """
+    cur.execute(
+        "DELETE FROM pending_files WHERE task_id=? AND agent_ip=?",
+        (task_id, agent_ip),
+    )
+    if cur.rowcount:
+        _bump_version(cur, "pending_files")
+
+
+@_write_op
+def append_pending_files(cur, task_id: str, agent_ip: str, files):
+    """
+    Insert (or overwrite) rows without diffing against existing ones.
+    """
+    if not files:
+        return
+    _insert_pending_rows(cur, task_id, agent_ip, files)
+    _bump_version(cur, "pending_files")
+
+
+@_write_op
+def begin_pending_stream(cur, task_id: str, agent_ip: str):
+    """
+    Start a streamed result set. Existing rows stay visible until
+    `finish_pending_stream` removes the ones the stream did not include.
+    """
+    cur.execute(
+        "DELETE FROM pending_stream_seen WHERE task_id=? AND agent_ip=?",
+        (task_id, agent_ip),
+    )
+
+
+@_write_op
+def merge_pending_files(cur, task_id: str, agent_ip: str, files):
+    """
+    Apply one streamed chunk by diff: insert new rows, update changed
+    ones, and remember every id for `finish_pending_stream`.
+    """
+    started = time.perf_counter()
+    staged = _stage_rows(cur, task_id, agent_ip, files)
+    diffed = time.perf_counter()
+    cur.execute(
+        """
+        INSERT OR IGNORE INTO pending_stream_seen(task_id, agent_ip, id)
+        SELECT task_id, agent_ip, id FROM temp.pending_stage
+        """
+    )
+    inserted, updated = _merge_stage(cur)
+    if inserted or updated:
+        _bump_version(cur, "pending_files")
+    return _ingest_result(staged, inserted, updated, 0, started, diffed)
+
+
+@_write_op
+def finish_pending_stream(cur, task_id: str, agent_ip: str):
+    """
+    End a streamed result set: delete rows of the task/agent that no
+    chunk mentioned. Returns the number of rows deleted.
+    """
+    cur.execute(
+        """
+        DELETE FROM pending_files
+        WHERE task_id=? AND agent_ip=?
+          AND id NOT IN (
+              SELECT id FROM pending_stream_seen WHERE task_id=? AND agent_ip=?
+          )
+        """,
+        (task_id, agent_ip, task_id, agent_ip),
+    )
+    deleted = cur.rowcount
+    cur.execute(
+        "DELETE FROM pending_stream_seen WHERE task_id=? AND agent_ip=?",
+        (task_id, agent_ip),
+    )
+    if deleted:
+        _bump_version(cur, "pending_files")
+    return deleted
+
+
+def _pending_record(row) -> dict:
+    """A pending_files row as served to the UI; approved files await the agent's report."""
+    d = dict(row)
+    d["status"] = "approved" if d.get("approved_at") is not None else "pending"
+    return d
+
+
+def list_pending_files(search: str = "", limit: int = None):
+    """
+    Pending rows, newest first. A `search` matches a substring of filename,
+    path, agent_ip, task_id or language (case-insensitive). It is served by
+    the trigram index, best matches first, and capped at `limit` (default
+    SEARCH_LIMIT). Terms too short for trigrams fall back to LIKE.
+    """
+    search = search.strip()
+    if search and limit is None:
+        limit = SEARCH_LIMIT
+    limit = -1 if limit is None else max(1, int(limit))
+    with _reading() as cur:
+        if search and len(search) >= _TRIGRAM_MIN and _search_index_ready(cur):
+            rows = cur.execute(
+                """
+                SELECT p.* FROM pending_files_fts AS f
+                JOIN pending_files AS p ON p.rowid = f.rowid
+                WHERE pending_files_fts MATCH ?
+                ORDER BY f.rank, p.created_at DESC
+                LIMIT ?
+                """,
+                ('"' + search.replace('"', '""') + '"', limit),
+            ).fetchall()
+        elif search:
+            token = f"%{search.lower()}%"
             rows = cur.execute(
                 """
                 SELECT * FROM pending_files
@@ -203,225 +1419,1056 @@ def list_pending_files(search: str = ""):
                    OR LOWER(task_id) LIKE ?
                    OR LOWER(COALESCE(language, '')) LIKE ?
                 ORDER BY created_at DESC
+                LIMIT ?
                 """,
-                (token, token, token, token, token),
+                (token, token, token, token, token, limit),
             ).fetchall()
         else:
-            rows = cur.execute("SELECT * FROM pending_files ORDER BY created_at DESC").fetchall()
-        conn.close()
-        records = []
-        for row in rows:
-            d = dict(row)
-            d["status"] = "pending"
-            records.append(d)
-        return records
+            rows = cur.execute(
+                "SELECT * FROM pending_files ORDER BY created_at DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [_pending_record(row) for row in rows]
 
 
-def get_pending_by_ids(record_ids):
+def _pending_filters(task_id=None, agent_ip=None, language=None,
+                     min_confidence=None, max_confidence=None, search="", path_prefix=None, approved=None):
+    """
+    WHERE clauses and parameters shared by pending pages and counts.
+    `approved` False or True keeps only files not yet or already approved.
+    """
+    clauses, params = [], []
+    if approved is not None:
+        clauses.append("approved_at IS NOT NULL" if approved else "approved_at IS NULL")
+    for column, value in (("task_id", task_id), ("agent_ip", agent_ip), ("language", language)):
+        if value:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    if path_prefix:
+        clauses.append("substr(path, 1, ?) = ?")
+        params.extend([len(path_prefix), path_prefix])
+    if min_confidence is not None:
+        clauses.append("confidence >= ?")
+        params.append(float(min_confidence))
+    if max_confidence is not None:
+        clauses.append("confidence <= ?")
+        params.append(float(max_confidence))
+    search = (search or "").strip()
+    if search:
+        if len(search) >= _TRIGRAM_MIN and _search_index.get(DB_PATH) is not False:
+            clauses.append(
+                "rowid IN (SELECT rowid FROM pending_files_fts WHERE pending_files_fts MATCH ?)"
+            )
+            params.append('"' + search.replace('"', '""') + '"')
+        else:
+            clauses.append(
+                "(LOWER(filename) LIKE ? OR LOWER(path) LIKE ? OR LOWER(agent_ip) LIKE ?"
+                " OR LOWER(task_id) LIKE ? OR LOWER(COALESCE(language, '')) LIKE ?)"
+            )
+            params.extend([f"%{search.lower()}%"] * 5)
+    return clauses, params
+
+
+def _encode_cursor(*key) -> str:
+    raw = json.dumps(key, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def _decode_cursor(cursor: str, *types):
+    """The sort key packed by `_encode_cursor`, checked against `types`."""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError, UnicodeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if (not isinstance(key, list) or len(key) != len(types)
+            or not all(isinstance(v, t) and not isinstance(v, bool) for v, t in zip(key, types))):
+        raise ValueError("Invalid cursor")
+    return key
+
+
+def list_pending_page(cursor: str = None, limit: int = None, **filters):
+    """
+    One page of pending rows, newest first, ordered by (created_at, id).
+    Returns (records, next_cursor); next_cursor is None on the last page.
+    `filters` are task_id, agent_ip, language, min_confidence,
+    max_confidence, search, path_prefix and approved. Raises ValueError
+    for a malformed cursor.
+    """
+    limit = PAGE_SIZE if limit is None else min(max(1, int(limit)), MAX_PAGE_SIZE)
+    with _reading() as cur:
+        if filters.get("search"):
+            _search_index_ready(cur)
+        clauses, params = _pending_filters(**filters)
+        if cursor:
+            clauses.append("(created_at, id) < (?, ?)")
+            params.extend(_decode_cursor(cursor, str, str))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = cur.execute(
+            f"SELECT * FROM pending_files {where} ORDER BY created_at DESC, id DESC LIMIT ?",
+            (*params, limit + 1),
+        ).fetchall()
+    records = [_pending_record(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = records[-1]
+        next_cursor = _encode_cursor(last["created_at"], last["id"])
+    return records, next_cursor
+
+
+def count_pending_files(**filters) -> int:
+    """Number of pending rows matching the `list_pending_page` filters."""
+    with _reading() as cur:
+        if filters.get("search"):
+            _search_index_ready(cur)
+        clauses, params = _pending_filters(**filters)
+        if not clauses:
+            row = cur.execute("SELECT pending FROM file_counts WHERE dimension='all' AND key=''").fetchone()
+            return row[0] if row else 0
+        return cur.execute(f"SELECT COUNT(*) FROM pending_files WHERE {' AND '.join(clauses)}", params).fetchone()[0]
+
+
+# Id lists travel as one JSON array parameter, so their length is not
+# bounded by SQLite's limit on bound variables.
+_ID_LIST = "(SELECT value FROM json_each(?))"
+
+
+def _id_list(record_ids) -> str:
+    return json.dumps(list(record_ids))
+
+
+def get_pending_by_ids(record_ids, approved=None):
+    """Pending rows by id; `approved` filters as in `_pending_filters`."""
     if not record_ids:
         return []
-    with _LOCK:
-        conn = _connect()
-        cur = conn.cursor()
-        placeholders = ",".join(["?"] * len(record_ids))
+    clauses, params = _pending_filters(approved=approved)
+    where = "".join(f" AND {clause}" for clause in clauses)
+    with _reading() as cur:
         rows = cur.execute(
-            f"SELECT * FROM pending_files WHERE id IN ({placeholders})",
-            tuple(record_ids),
+            f"SELECT * FROM pending_files WHERE id IN {_ID_LIST}{where}",
+            (_id_list(record_ids), *params),
         ).fetchall()
-        conn.close()
-        records = []
-        for row in rows:
-            d = dict(row)
-            d["status"] = "pending"
-            records.append(d)
-        return records
+    return [_pending_record(row) for row in rows]
 
 
-def delete_pending_by_ids(record_ids):
+@_write_op
+def approve_pending(cur, record_ids):
+    """
+    Mark pending files approved for deletion, unless they already are.
+    Returns the ids this call approved, so concurrent approvals of the
+    same file send one delete command.
+    """
+    if not record_ids:
+        return []
+    ids = _id_list(record_ids)
+    approved = [row[0] for row in cur.execute(
+        f"SELECT id FROM pending_files WHERE id IN {_ID_LIST} AND approved_at IS NULL", (ids,)
+    )]
+    if approved:
+        cur.execute(
+            f"UPDATE pending_files SET approved_at=? WHERE id IN {_ID_LIST}",
+            (time.time(), _id_list(approved)),
+        )
+        _bump_version(cur, "pending_files")
+    return approved
+
+
+def _release_approvals(cur, where: str, params) -> int:
+    """Make approved pending files matching `where` approvable again."""
+    cur.execute(f"UPDATE pending_files SET approved_at=NULL WHERE approved_at IS NOT NULL AND {where}", params)
+    if cur.rowcount:
+        _bump_version(cur, "pending_files")
+    return cur.rowcount
+
+
+@_write_op
+def release_pending(cur, record_ids):
+    """Undo `approve_pending` for files whose delete command could not be queued."""
+    if not record_ids:
+        return 0
+    return _release_approvals(cur, f"id IN {_ID_LIST}", (_id_list(record_ids),))
+
+
+# The pending files of the delete commands in a JSON id list.
+_SQL_COMMAND_FILES = f"""
+    id IN (
+        SELECT json_extract(e.value, '$.record_id')
+        FROM delete_command_queue q, json_each(q.payload_json, '$.approved_entries') e
+        WHERE q.id IN {_ID_LIST}
+    )
+"""
+
+
+@_write_op
+def delete_pending_by_ids(cur, record_ids):
     if not record_ids:
         return
-    with _LOCK:
-        conn = _connect()
-        cur = conn.cursor()
-        placeholders = ",".join(["?"] * len(record_ids))
-        cur.execute(f"DELETE FROM pending_files WHERE id IN ({placeholders})", tuple(record_ids))
-        conn.commit()
-        conn.close()
+    cur.execute(f"DELETE FROM pending_files WHERE id IN {_ID_LIST}", (_id_list(record_ids),))
+    if cur.rowcount:
+        _bump_version(cur, "pending_files")
+
+
+_AUDIT_COLUMNS = (
+    "created_at, source, source_id, record_id, task_id, agent_ip, file_hash,"
+    " filename, path, language, confidence, action, action_by, notes, hidden"
+)
+
+
+def _audit_row(row) -> dict:
+    """An audit_log row as served by /audit-logs (created_at as local ISO time)."""
+    d = dict(row)
+    d["created_ts"] = d["created_at"]
+    d["created_at"] = datetime.fromtimestamp(d["created_at"]).astimezone().isoformat()
+    for key in ("source", "source_id", "hidden"):
+        d.pop(key, None)
+    return d
 
 
-def add_deletion_reports(agent_ip: str, task_id: str, reports):
+def _insert_audit_rows(cur, rows):
+    """Insert audit_log rows (tuples in _AUDIT_COLUMNS order); returns them as dicts."""
+    first = cur.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM audit_log").fetchone()[0]
+    cur.executemany(
+        f"INSERT INTO audit_log(id, {_AUDIT_COLUMNS}) VALUES (?{', ?' * 15})",
+        [(first + i,) + row for i, row in enumerate(rows)],
+    )
+    _bump_version(cur, "audit_log")
+    names = ["id"] + [c.strip() for c in _AUDIT_COLUMNS.split(",")]
+    return [_audit_row(dict(zip(names, (first + i,) + row))) for i, row in enumerate(rows)]
+
+
+@_write_op
+def resolve_pending(cur, decisions, return_rows=False):
+    """
+    Apply UI decisions to pending files in one transaction. `decisions`
+    is a list of (record_ids, action, notes, hidden, remove). Each copies
+    one audit row per file still pending, in SQL, and with `remove`
+    deletes the files. Returns the number of files audited, or the new
+    audit rows with `return_rows`.
+    """
+    first = cur.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM audit_log").fetchone()[0]
+    now = time.time()
+    audited = removed = 0
+    for record_ids, action, notes, hidden, remove in decisions:
+        if not record_ids:
+            continue
+        ids = _id_list(record_ids)
+        cur.execute(
+            f"""
+            INSERT INTO audit_log({_AUDIT_COLUMNS})
+            SELECT ?, 'ui', NULL, id, task_id, agent_ip, file_hash,
+                   COALESCE(NULLIF(filename, ''), 'unknown'), COALESCE(path, ''),
+                   language, confidence, ?, 'admin-ui', ?, ?
+            FROM pending_files WHERE id IN {_ID_LIST}
+            """,
+            (now, action, notes, int(hidden), ids),
+        )
+        audited += cur.rowcount
+        if remove:
+            cur.execute(f"DELETE FROM pending_files WHERE id IN {_ID_LIST}", (ids,))
+            removed += cur.rowcount
+    if audited:
+        _bump_version(cur, "audit_log")
+    if removed:
+        _bump_version(cur, "pending_files")
+    if not return_rows:
+        return audited
+    rows = cur.execute("SELECT * FROM audit_log WHERE id >= ? ORDER BY id", (first,)).fetchall()
+    return [_audit_row(row) for row in rows]
+
+
+@_write_op
+def add_deletion_reports(cur, agent_ip: str, task_id: str, reports):
+    """
+    Record an agent's deletion report. A confirmed deletion hides earlier
+    failed reports for the same file, and a failure arriving after a
+    confirmation is hidden straight away. Each row takes the file's
+    language from the audit row of its approval. Returns the new audit rows.
+    """
     if not reports:
-        return
-    with _LOCK:
-        conn = _connect()
-        cur = conn.cursor()
-        for item in reports:
-            cur.execute(
-                """
-                INSERT INTO deletion_reports(
-                    agent_ip, task_id, file_hash, path, status, details, created_at
-                ) VALUES (?, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    agent_ip,
-                    task_id,
-                    item.get("file_hash"),
-                    item.get("path"),
-                    item.get("status", "unknown"),
-                    item.get("details", ""),
-                    _now_iso(),
-                ),
+        return []
+    now = time.time()
+    rows = []
+    for item in reports:
+        path = item.get("path") or ""
+        confirmed = item.get("status") == "deleted"
+        approval = cur.execute(
+            """
+            SELECT language FROM audit_log
+            WHERE task_id=? AND agent_ip=? AND file_hash IS ? AND path=? AND source='ui'
+            ORDER BY id DESC LIMIT 1
+            """,
+            (task_id, agent_ip, item.get("file_hash"), path),
+        ).fetchone()
+        rows.append((
+            now, "agent", None, "",
+            task_id, agent_ip, item.get("file_hash"),
+            path.replace("\\", "/").rsplit("/", 1)[-1] or "unknown",
+            path, approval["language"] if approval else None, None,
+            "delete_confirmed" if confirmed else "delete_failed",
+            "agent", item.get("details", ""), 0,
+        ))
+    inserted = _insert_audit_rows(cur, rows)
+    _hide_superseded(cur, sorted({
+        (task_id, agent_ip, item.get("file_hash"), item.get("path") or "") for item in reports
+    }))
+    return inserted
+
+
+@_write_op
+def import_audit_entries(cur, source: str, entries):
+    """
+    Copy audit rows from an older store. Each entry carries its original
+    `id` (kept as source_id, so re-importing skips it) and an epoch
+    `created_at`. Returns the number of rows added.
+    """
+    cur.executemany(
+        f"INSERT OR IGNORE INTO audit_log({_AUDIT_COLUMNS}) VALUES (?{', ?' * 14})",
+        [
+            (
+                e["created_at"], source, e["id"],
+                e.get("record_id") or "",
+                e.get("task_id"),
+                e.get("agent_ip"),
+                e.get("file_hash"),
+                e.get("filename") or "unknown",
+                e.get("path") or "",
+                e.get("language"),
+                e.get("confidence"),
+                e["action"],
+                e.get("action_by") or "admin-ui",
+                e.get("notes"),
+                int(e["action"] == "delete_dispatch_failed"),
             )
-        conn.commit()
-        conn.close()
+            for e in entries
+        ],
+    )
+    imported = cur.rowcount
+    if imported:
+        _bump_version(cur, "audit_log")
+    return imported
 
 
-def list_deletion_reports(limit: int = 200):
-    limit = max(1, min(int(limit), 2000))
-    with _LOCK:
-        conn = _connect()
-        cur = conn.cursor()
+def list_audit_log(cursor: str = None, limit: int = 200, since: float = None, until: float = None,
+                   action: str = None, task_id: str = None, agent_ip: str = None):
+    """
+    Visible audit rows, newest first by (created_at, id), optionally within
+    [since, until) epoch seconds. Returns (rows, next_cursor) like
+    `list_pending_page`. Raises ValueError for a malformed cursor.
+    """
+    limit = min(max(1, int(limit)), MAX_PAGE_SIZE)
+    clauses, params = ["hidden = 0"], []
+    if since is not None:
+        clauses.append("created_at >= ?")
+        params.append(float(since))
+    if until is not None:
+        clauses.append("created_at < ?")
+        params.append(float(until))
+    for column, value in (("action", action), ("task_id", task_id), ("agent_ip", agent_ip)):
+        if value:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    if cursor:
+        clauses.append("(created_at, id) < (?, ?)")
+        params.extend(_decode_cursor(cursor, (int, float), int))
+    with _reading() as cur:
         rows = cur.execute(
-            "SELECT * FROM deletion_reports ORDER BY id DESC LIMIT ?",
-            (limit,),
+            f"""
+            SELECT * FROM audit_log INDEXED BY idx_audit_visible
+            WHERE {' AND '.join(clauses)}
+            ORDER BY created_at DESC, id DESC LIMIT ?
+            """,
+            (*params, limit + 1),
         ).fetchall()
-        conn.close()
-        return [dict(row) for row in rows]
+    entries = [_audit_row(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = _encode_cursor(last["created_at"], last["id"])
+    return entries, next_cursor
+
+
+# Delete commands form a work queue. A drain claims the commands that are
+# due and leases them as 'sent' for DELETE_COMMAND_LEASE seconds. The
+# agent's deletion_report echoes the command_id and acks it. A command
+# whose lease runs out without an ack is claimed again. One that could not
+# be handed to the agent's session goes back to 'pending' with
+# exponential backoff. After DELETE_COMMAND_MAX_ATTEMPTS attempts it is
+# moved to 'dead' for an operator to look at.
+DELETE_COMMAND_LEASE = float(os.getenv("DELETE_COMMAND_LEASE", "300"))
+DELETE_COMMAND_MAX_ATTEMPTS = int(os.getenv("DELETE_COMMAND_MAX_ATTEMPTS", "5"))
+DELETE_COMMAND_BACKOFF = float(os.getenv("DELETE_COMMAND_BACKOFF", "5"))
+DELETE_COMMAND_BACKOFF_MAX = float(os.getenv("DELETE_COMMAND_BACKOFF_MAX", "600"))
+
+# Open commands are 'pending' or 'sent'. This is when each becomes claimable.
+_SQL_COMMAND_DUE = "CASE status WHEN 'pending' THEN next_attempt_at ELSE lease_until END"
+
+# Agents with open delete commands and the earliest time one of them can
+# be claimed, so a heartbeat from an agent with nothing due is answered
+# without a query. Each entry also holds a generation, bumped whenever a
+# command is added, so a drain cannot overwrite the entry of a command
+# enqueued meanwhile. Commands queued by another process reach this index
+# through note_pending_delete_commands (the UI control channel), or
+# otherwise at the next reload, every COMMAND_INDEX_REFRESH seconds.
+COMMAND_INDEX_REFRESH = float(os.getenv("COMMAND_INDEX_REFRESH", "60"))
+
+_command_agents = None
+_command_agents_loaded = 0.0
+_command_agents_lock = threading.Lock()
+
+
+def _command_index():
+    """agent_ip -> [generation, due_at], (re)loaded if missing or stale. Call with the lock held."""
+    global _command_agents, _command_agents_loaded
+    if _command_agents is None or time.monotonic() - _command_agents_loaded >= COMMAND_INDEX_REFRESH:
+        with _reading() as cur:
+            due = dict(cur.execute(
+                f"""
+                SELECT agent_ip, MIN({_SQL_COMMAND_DUE}) FROM delete_command_queue
+                WHERE status IN ('pending', 'sent') GROUP BY agent_ip
+                """
+            ).fetchall())
+        previous = _command_agents or {}
+        _command_agents = {
+            agent_ip: [previous.get(agent_ip, [0])[0], due_at or 0.0] for agent_ip, due_at in due.items()
+        }
+        _command_agents_loaded = time.monotonic()
+    return _command_agents
+
+
+def pending_delete_commands_generation(agent_ip: str):
+    """
+    None if `agent_ip` has no delete command due now, else the generation
+    to pass to defer_delete_commands after draining.
+    """
+    with _command_agents_lock:
+        entry = _command_index().get(agent_ip)
+        if entry is None or entry[1] > time.time():
+            return None
+        return entry[0]
+
+
+def note_pending_delete_commands(agent_ip: str):
+    """Record that `agent_ip` has delete commands due now (call after they are committed)."""
+    with _command_agents_lock:
+        index = _command_index()
+        generation = index[agent_ip][0] if agent_ip in index else 0
+        index[agent_ip] = [generation + 1, 0.0]
+
+
+def defer_delete_commands(agent_ip: str, generation: int, due_at):
+    """
+    After a drain, skip `agent_ip` until `due_at`, or forget it if that is
+    None (nothing open). Ignored if more was queued since.
+    """
+    with _command_agents_lock:
+        index = _command_index()
+        entry = index.get(agent_ip)
+        if entry is None or entry[0] != generation:
+            return
+        if due_at is None:
+            del index[agent_ip]
+        else:
+            entry[1] = due_at
+
+
+def _command_digest(agent_ip: str, task_id: str, payload: dict) -> str:
+    """Identity of a delete command for dedup; the send timestamp is not part of it."""
+    body = json.dumps({k: v for k, v in payload.items() if k != "timestamp"}, sort_keys=True)
+    return hashlib.sha1(f"{agent_ip}|{task_id}|{body}".encode("utf-8")).hexdigest()
+
+
+@_write_op
+def _enqueue_delete_command(cur, agent_ip: str, task_id: str, payload: dict):
+    digest = _command_digest(agent_ip, task_id, payload)
+
+    # Approving the same files again while a command for them is still
+    # open does not queue a second one.
+    existing = cur.execute(
+        """
+        SELECT id FROM delete_command_queue
+        WHERE payload_digest=? AND status IN ('pending', 'sent')
+        LIMIT 1
+        """,
+        (digest,),
+    ).fetchone()
+    if existing:
+        return int(existing["id"])
+
+    cur.execute(
+        """
+        INSERT INTO delete_command_queue(
+            agent_ip, task_id, payload_json, payload_digest, status, created_at, enqueued_at
+        ) VALUES (?, ?, ?, ?, 'pending', ?, ?)
+        """,
+        (agent_ip, task_id, json.dumps(payload, sort_keys=True), digest, _now_iso(), time.time()),
+    )
+    cmd_id = cur.lastrowid
+    return cmd_id
 
 
 def enqueue_delete_command(agent_ip: str, task_id: str, payload: dict):
-    with _LOCK:
-        conn = _connect()
-        cur = conn.cursor()
-        payload_json = json.dumps(payload, sort_keys=True)
+    cmd_id = _enqueue_delete_command(agent_ip, task_id, payload)
+    note_pending_delete_commands(agent_ip)
+    return cmd_id
 
-        # Prevent duplicate pending commands for the same agent/task/payload.
-        existing = cur.execute(
-            """
-            SELECT id FROM delete_command_queue
-            WHERE agent_ip=? AND task_id=? AND payload_json=? AND status='pending'
-            LIMIT 1
+
+@_write_op
+def claim_delete_commands(cur, agent_ip: str, limit: int = 20, lease: float = None):
+    """
+    Lease up to `limit` of the agent's due commands, oldest first. Returns
+    (commands, due_at): each command has `id`, `payload` and `attempt`,
+    and `due_at` is when the next open command can be claimed (None if
+    nothing is left open). Commands out of attempts are dead-lettered
+    instead of returned, and their files can be approved again.
+    """
+    now = time.time()
+    lease = DELETE_COMMAND_LEASE if lease is None else lease
+    rows = cur.execute(
+        f"""
+        SELECT id, payload_json, attempts FROM delete_command_queue
+        WHERE agent_ip=? AND status IN ('pending', 'sent') AND {_SQL_COMMAND_DUE} <= ?
+        ORDER BY id
+        LIMIT ?
+        """,
+        (agent_ip, now, max(1, int(limit))),
+    ).fetchall()
+    commands = [
+        {"id": row["id"], "payload": json.loads(row["payload_json"]), "attempt": row["attempts"] + 1}
+        for row in rows if row["attempts"] < DELETE_COMMAND_MAX_ATTEMPTS
+    ]
+    dead = [row["id"] for row in rows if row["attempts"] >= DELETE_COMMAND_MAX_ATTEMPTS]
+    if dead:
+        cur.execute(
+            f"""
+            UPDATE delete_command_queue
+            SET status='dead', lease_until=NULL, error=COALESCE(error, 'not acknowledged')
+            WHERE id IN {_ID_LIST}
             """,
-            (agent_ip, task_id, payload_json),
-        ).fetchone()
-        if existing:
-            conn.close()
-            return int(existing["id"])
+            (_id_list(dead),),
+        )
+        _release_approvals(cur, _SQL_COMMAND_FILES, (_id_list(dead),))
+    if commands:
+        cur.execute(
+            f"""
+            UPDATE delete_command_queue
+            SET status='sent', attempts=attempts + 1, lease_until=?, sent_at=?
+            WHERE id IN {_ID_LIST}
+            """,
+            (now + lease, _now_iso(), _id_list(c["id"] for c in commands)),
+        )
+    due_at = cur.execute(
+        f"""
+        SELECT MIN({_SQL_COMMAND_DUE}) FROM delete_command_queue
+        WHERE agent_ip=? AND status IN ('pending', 'sent')
+        """,
+        (agent_ip,),
+    ).fetchone()[0]
+    return commands, due_at
+
 
+@_write_op
+def release_delete_command(cur, cmd_id: int, error: str):
+    """
+    Return a claimed command that could not be handed to the agent. It is
+    retried after an exponential backoff, or dead-lettered once out of
+    attempts, releasing its files. Returns the retry time, or None if it
+    is dead.
+    """
+    row = cur.execute("SELECT attempts FROM delete_command_queue WHERE id=?", (cmd_id,)).fetchone()
+    attempts = row["attempts"] if row else DELETE_COMMAND_MAX_ATTEMPTS
+    if attempts >= DELETE_COMMAND_MAX_ATTEMPTS:
         cur.execute(
+            "UPDATE delete_command_queue SET status='dead', lease_until=NULL, error=? WHERE id=?",
+            ((error or "")[:500], cmd_id),
+        )
+        _release_approvals(cur, _SQL_COMMAND_FILES, (_id_list([cmd_id]),))
+        return None
+    retry_at = time.time() + min(DELETE_COMMAND_BACKOFF_MAX, DELETE_COMMAND_BACKOFF * 2 ** max(0, attempts - 1))
+    cur.execute(
+        """
+        UPDATE delete_command_queue
+        SET status='pending', lease_until=NULL, next_attempt_at=?, error=?
+        WHERE id=?
+        """,
+        (retry_at, (error or "")[:500], cmd_id),
+    )
+    return retry_at
+
+
+@_write_op
+def ack_delete_commands(cur, agent_ip: str, task_id: str, command_id=None, reports=()):
+    """
+    Mark commands done once the agent reports on them. With `command_id`
+    that command is acked, even if it had been given up on. Agents that do
+    not echo ids ack the commands in flight for the task whose every
+    approved file appears in `reports`, by hash or else by path. Returns
+    the number acked.
+    """
+    if command_id is not None:
+        ids = [command_id]
+    else:
+        hashes = {r.get("file_hash") for r in reports if r.get("file_hash")}
+        paths = {r.get("path") for r in reports if r.get("path")}
+        rows = cur.execute(
             """
-            INSERT INTO delete_command_queue(
-                agent_ip, task_id, payload_json, status, created_at
-            ) VALUES (?, ?, ?, 'pending', ?)
+            SELECT id, payload_json FROM delete_command_queue
+            WHERE agent_ip=? AND task_id=? AND status='sent'
             """,
-            (agent_ip, task_id, payload_json, _now_iso()),
-        )
-        conn.commit()
-        cmd_id = cur.lastrowid
-        conn.close()
-        return cmd_id
+            (agent_ip, task_id),
+        ).fetchall()
+        ids = []
+        for row in rows:
+            entries = json.loads(row["payload_json"]).get("approved_entries") or []
+            if entries and all(
+                (e.get("file_hash") in hashes) if e.get("file_hash") else (e.get("path") in paths)
+                for e in entries
+            ):
+                ids.append(row["id"])
+        if not ids:
+            return 0
+    cur.execute(
+        f"""
+        UPDATE delete_command_queue SET status='acked', acked_at=?, lease_until=NULL
+        WHERE id IN {_ID_LIST} AND agent_ip=? AND status != 'acked'
+        """,
+        (_now_iso(), _id_list(ids), agent_ip),
+    )
+    return cur.rowcount
 
 
-def fetch_pending_delete_commands(agent_ip: str, limit: int = 20):
-    limit = max(1, min(int(limit), 100))
-    with _LOCK:
-        conn = _connect()
-        cur = conn.cursor()
+def delete_command_stats() -> dict:
+    """Depth and age of the delete command queue: pending, in flight (sent, unacked) and dead."""
+    now = time.time()
+    with _reading() as cur:
         rows = cur.execute(
             """
-            SELECT id, payload_json
+            SELECT status, COUNT(*), MIN(enqueued_at) FROM delete_command_queue
+            WHERE status IN ('pending', 'sent', 'dead')
+            GROUP BY status
+            """
+        ).fetchall()
+    counts = {status: (count, oldest) for status, count, oldest in rows}
+    open_oldest = [counts[s][1] for s in ("pending", "sent") if s in counts and counts[s][1] is not None]
+    return {
+        "pending": counts.get("pending", (0, None))[0],
+        "in_flight": counts.get("sent", (0, None))[0],
+        "dead": counts.get("dead", (0, None))[0],
+        "oldest_open_age": round(now - min(open_oldest), 1) if open_oldest else None,
+        "max_attempts": DELETE_COMMAND_MAX_ATTEMPTS,
+        "lease_seconds": DELETE_COMMAND_LEASE,
+    }
+
+
+def list_delete_commands(status: str = "dead", limit: int = 100):
+    """Commands in `status`, most recently enqueued first, for the operator view."""
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    with _reading() as cur:
+        rows = cur.execute(
+            """
+            SELECT id, agent_ip, task_id, status, attempts, error, created_at, sent_at, acked_at,
+                   lease_until, next_attempt_at, payload_json
             FROM delete_command_queue
-            WHERE agent_ip=? AND status='pending'
-            ORDER BY id ASC
+            WHERE status=?
+            ORDER BY enqueued_at DESC
             LIMIT ?
             """,
-            (agent_ip, limit),
+            (status, limit),
         ).fetchall()
-        conn.close()
-        result = []
-        for row in rows:
-            result.append({
-                "id": row["id"],
-                "payload": json.loads(row["payload_json"]),
-            })
-        return result
+    commands = []
+    for row in rows:
+        d = dict(row)
+        payload = json.loads(d.pop("payload_json"))
+        d["files"] = len(payload.get("approved_entries") or payload.get("approved_hashes") or [])
+        commands.append(d)
+    return commands
 
 
-def mark_delete_command_sent(cmd_id: int):
-    with _LOCK:
-        conn = _connect()
-        cur = conn.cursor()
-        cur.execute(
+def _encode_chunk(chunk) -> bytes:
+    body = {"columns": chunk.columns} if isinstance(chunk, ColumnarBatch) else {"rows": list(chunk)}
+    return zlib.compress(json.dumps(body, separators=(",", ":")).encode("utf-8"), 1)
+
+
+def _decode_chunk(data: bytes):
+    body = json.loads(zlib.decompress(data))
+    return ColumnarBatch(body["columns"]) if "columns" in body else body["rows"]
+
+
+@_write_op
+def spill_scan_results(cur, task_id: str, agent_ip: str, first_seq: int, chunks):
+    """Store result chunks (row lists or columnar batches) as seq first_seq, first_seq + 1, ..."""
+    cur.executemany(
+        "INSERT OR REPLACE INTO scan_result_chunks(task_id, agent_ip, seq, files, data) VALUES (?, ?, ?, ?, ?)",
+        [(task_id, agent_ip, first_seq + i, len(chunk), _encode_chunk(chunk)) for i, chunk in enumerate(chunks)],
+    )
+
+
+@_write_op
+def drop_scan_results(cur, task_id: str, agent_ip: str):
+    cur.execute("DELETE FROM scan_result_chunks WHERE task_id=? AND agent_ip=?", (task_id, agent_ip))
+
+
+@_write_op
+def close_scan_results(cur, task_id: str, agent_ip: str) -> bool:
+    """
+    Drop the stored result set of an agent's task once none of its files
+    is pending any more. Returns True if the task is closed for the agent.
+    """
+    if cur.execute(
+        "SELECT 1 FROM pending_files WHERE task_id=? AND agent_ip=? LIMIT 1", (task_id, agent_ip)
+    ).fetchone():
+        return False
+    cur.execute("DELETE FROM scan_result_chunks WHERE task_id=? AND agent_ip=?", (task_id, agent_ip))
+    return True
+
+
+def load_scan_results(task_id: str, exclude=()):
+    """Stored result chunks of a task as {agent_ip: [chunk, ...]}, skipping agents in `exclude`."""
+    results = {}
+    with _reading() as cur:
+        rows = cur.execute(
+            "SELECT agent_ip, data FROM scan_result_chunks WHERE task_id=? ORDER BY agent_ip, seq",
+            (task_id,),
+        )
+        for agent_ip, data in rows:
+            if agent_ip not in exclude:
+                results.setdefault(agent_ip, []).append(_decode_chunk(data))
+    return results
+
+
+@_write_op
+def remove_pending_after_deletion_report(cur, agent_ip: str, task_id: str, reports):
+    """
+    Remove pending files once agent confirms deletion.
+    Match by task/agent and then by hash or path. Returns rows removed.
+    Files whose deletion failed stay pending and can be approved again.
+    """
+    if not reports:
+        return 0
+
+    removed = 0
+    for rep in reports:
+        status = rep.get("status")
+        details = (rep.get("details") or "").lower()
+        file_hash = rep.get("file_hash") or ""
+        path = rep.get("path") or ""
+
+        # Treat "failed + not found in quarantine" as terminal too:
+        # file is effectively absent on agent.
+        terminal = (
+            status == "deleted" or
+            (status == "failed" and "not found in quarantine" in details)
+        )
+
+        if not terminal:
+            if file_hash or path:
+                _release_approvals(
+                    cur, f"task_id=? AND agent_ip=? AND {'file_hash' if file_hash else 'path'}=?",
+                    (task_id, agent_ip, file_hash or path),
+                )
+            continue
+
+        if file_hash:
+            cur.execute(
+                """
+                DELETE FROM pending_files
+                WHERE task_id=? AND agent_ip=? AND file_hash=?
+                """,
+                (task_id, agent_ip, file_hash),
+            )
+        elif path:
+            cur.execute(
+                """
+                DELETE FROM pending_files
+                WHERE task_id=? AND agent_ip=? AND path=?
+                """,
+                (task_id, agent_ip, path),
+            )
+        else:
+            continue
+        removed += cur.rowcount
+    if removed:
+        _bump_version(cur, "pending_files")
+    return removed
+
+
+# Agents with queued scan tasks, so a heartbeat from any other agent is
+# answered without a query. Tasks queued by another process reach it
+# through note_queued_tasks (the UI control channel), or otherwise at the
+# next reload, every COMMAND_INDEX_REFRESH seconds.
+_task_agents = None
+_task_agents_loaded = 0.0
+_task_agents_lock = threading.Lock()
+
+
+def _task_queue_index():
+    """Agents with unsent queued tasks, (re)loaded if missing or stale. Call with the lock held."""
+    global _task_agents, _task_agents_loaded
+    if _task_agents is None or time.monotonic() - _task_agents_loaded >= COMMAND_INDEX_REFRESH:
+        with _reading() as cur:
+            _task_agents = {
+                row[0] for row in cur.execute("SELECT DISTINCT agent_ip FROM task_queue WHERE sent_at IS NULL")
+            }
+        _task_agents_loaded = time.monotonic()
+    return _task_agents
+
+
+def has_queued_tasks(agent_ip: str) -> bool:
+    with _task_agents_lock:
+        return agent_ip in _task_queue_index()
+
+
+def note_queued_tasks(agent_ip: str):
+    """Record that `agent_ip` has queued tasks (call after they are committed)."""
+    with _task_agents_lock:
+        _task_queue_index().add(agent_ip)
+
+
+@_write_op
+def _enqueue_task(cur, agent_ip: str, task_id: str, task: dict):
+    # Dispatching the same task again while it waits replaces the copy.
+    cur.execute(
+        """
+        INSERT INTO task_queue(agent_ip, task_id, payload_json, queued_at) VALUES (?, ?, ?, ?)
+        ON CONFLICT(agent_ip, task_id) DO UPDATE SET
+            payload_json = excluded.payload_json, queued_at = excluded.queued_at, sent_at = NULL
+        """,
+        (agent_ip, task_id, json.dumps(task, sort_keys=True), time.time()),
+    )
+
+
+def enqueue_task(agent_ip: str, task_id: str, task: dict):
+    """Store `task` for `agent_ip` until it next registers or sends a heartbeat."""
+    _enqueue_task(agent_ip, task_id, task)
+    note_queued_tasks(agent_ip)
+
+
+def list_queued_tasks(agent_ip: str):
+    """The agent's unsent queued tasks, oldest first."""
+    with _reading() as cur:
+        rows = cur.execute(
             """
-            UPDATE delete_command_queue
-            SET status='sent', sent_at=?, error=NULL
-            WHERE id=?
+            SELECT payload_json FROM task_queue
+            WHERE agent_ip=? AND sent_at IS NULL
+            ORDER BY queued_at
             """,
-            (_now_iso(), cmd_id),
-        )
-        conn.commit()
-        conn.close()
+            (agent_ip,),
+        ).fetchall()
+    return [json.loads(row["payload_json"]) for row in rows]
 
 
-def mark_delete_command_failed(cmd_id: int, error: str):
-    with _LOCK:
-        conn = _connect()
-        cur = conn.cursor()
+@_write_op
+def mark_tasks_sent(cur, agent_ip: str, task_ids):
+    """
+    Record queued tasks as handed to the agent's session; their dispatch
+    state on the task moves from "queued" to "sent".
+    """
+    task_ids = list(task_ids)
+    if not task_ids:
+        return
+    now = time.time()
+    cur.execute(
+        f"UPDATE task_queue SET sent_at=? WHERE agent_ip=? AND task_id IN {_ID_LIST} AND sent_at IS NULL",
+        (now, agent_ip, _id_list(task_ids)),
+    )
+    cur.execute(
+        f"""
+        UPDATE task_agents SET state='sent', dispatched_at=?
+        WHERE agent_ip=? AND task_id IN {_ID_LIST} AND state='queued'
+        """,
+        (now, agent_ip, _id_list(task_ids)),
+    )
+    if cur.rowcount:
+        _bump_version(cur, "tasks")
+    with _task_agents_lock:
+        # Tasks queued since the list was read keep the agent indexed.
+        if not cur.execute(
+            "SELECT 1 FROM task_queue WHERE agent_ip=? AND sent_at IS NULL LIMIT 1", (agent_ip,)
+        ).fetchone():
+            _task_queue_index().discard(agent_ip)
+
+
+@_write_op
+def record_task_dispatch(cur, task_id: str, kind: str, params: dict, agents: dict):
+    """
+    Record that `task_id` went out to `agents`, {agent_ip: "sent" | "queued"}.
+    An agent that already replied to the task is waited on again.
+    """
+    now = time.time()
+    cur.execute(
+        """
+        INSERT INTO tasks(task_id, kind, params_json, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(task_id) DO UPDATE SET
+            kind = excluded.kind, params_json = excluded.params_json, updated_at = excluded.updated_at
+        """,
+        (task_id, kind, json.dumps(params or {}, separators=(",", ":")), now, now),
+    )
+    added = rearmed = 0
+    for agent_ip, state in agents.items():
+        row = cur.execute(
+            "SELECT state FROM task_agents WHERE task_id=? AND agent_ip=?", (task_id, agent_ip)
+        ).fetchone()
+        if row is None:
+            added += 1
+        elif row["state"] == "replied":
+            rearmed += 1
         cur.execute(
             """
-            UPDATE delete_command_queue
-            SET status='pending', error=?
-            WHERE id=?
+            INSERT INTO task_agents(task_id, agent_ip, state, dispatched_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT(task_id, agent_ip) DO UPDATE SET
+                state = excluded.state, dispatched_at = excluded.dispatched_at
             """,
-            ((error or "")[:500], cmd_id),
+            (task_id, agent_ip, state, now),
         )
-        conn.commit()
-        conn.close()
+    cur.execute(
+        """
+        UPDATE tasks SET agents_dispatched = agents_dispatched + ?, agents_replied = agents_replied - ?
+        WHERE task_id=?
+        """,
+        (added, rearmed, task_id),
+    )
+    _bump_version(cur, "tasks")
 
 
-def remove_pending_after_deletion_report(agent_ip: str, task_id: str, reports):
+@_write_op
+def record_task_reply(cur, task_id: str, agent_ip: str, files: int):
     """
-    Remove pending files once agent confirms deletion.
-    Match by task/agent and then by hash or path.
+    Record an agent's complete result set of `files` files for a task. A
+    rescan replaces the agent's earlier count; a reply from an agent the
+    task was not dispatched to (e.g. its startup scan) counts it as one.
     """
-    if not reports:
-        return
+    now = time.time()
+    row = cur.execute(
+        "SELECT state, files_reported FROM task_agents WHERE task_id=? AND agent_ip=?", (task_id, agent_ip)
+    ).fetchone()
+    dispatched = int(row is None)
+    replied = int(row is None or row["state"] != "replied")
+    reported = files - (row["files_reported"] if row else 0)
+    cur.execute(
+        """
+        INSERT INTO task_agents(task_id, agent_ip, state, replied_at, files_reported)
+        VALUES (?, ?, 'replied', ?, ?)
+        ON CONFLICT(task_id, agent_ip) DO UPDATE SET
+            state = 'replied', replied_at = excluded.replied_at, files_reported = excluded.files_reported
+        """,
+        (task_id, agent_ip, now, files),
+    )
+    cur.execute(
+        """
+        INSERT INTO tasks(task_id, created_at, updated_at, agents_dispatched, agents_replied, files_reported)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(task_id) DO UPDATE SET
+            updated_at = excluded.updated_at,
+            agents_dispatched = agents_dispatched + excluded.agents_dispatched,
+            agents_replied = agents_replied + excluded.agents_replied,
+            files_reported = files_reported + excluded.files_reported
+        """,
+        (task_id, now, now, dispatched, replied, reported),
+    )
+    _bump_version(cur, "tasks")
 
-    with _LOCK:
-        conn = _connect()
-        cur = conn.cursor()
-        for rep in reports:
-            status = rep.get("status")
-            details = (rep.get("details") or "").lower()
-
-            # Treat "failed + not found in quarantine" as terminal too:
-            # file is effectively absent on agent.
-            terminal = (
-                status == "deleted" or
-                (status == "failed" and "not found in quarantine" in details)
-            )
 
-            if not terminal:
-                continue
+def _task_row(row) -> dict:
+    """A tasks row as served by /tasks, with its state derived from the counters."""
+    d = dict(row)
+    if d["agents_replied"] < d["agents_dispatched"]:
+        state = "scanning"
+    elif d["files_pending"]:
+        state = "awaiting_approval"
+    else:
+        state = "completed"
+    return {
+        "task_id": d["task_id"],
+        "kind": d["kind"],
+        "params": json.loads(d["params_json"]),
+        "state": state,
+        "created_at": d["created_at"],
+        "updated_at": d["updated_at"],
+        "agents": {
+            "dispatched": d["agents_dispatched"],
+            "replied": d["agents_replied"],
+        },
+        "files": {
+            "reported": d["files_reported"],
+            "pending": d["files_pending"],
+            "approved": d["files_approved"],
+            "rejected": d["files_rejected"],
+            "deleted": d["files_deleted"],
+            "failed": d["files_failed"],
+        },
+    }
 
-            file_hash = rep.get("file_hash") or ""
-            path = rep.get("path") or ""
 
-            if file_hash:
-                cur.execute(
+def get_task(task_id: str, agents: bool = True):
+    """A task's progress, with one entry per agent it went to; None if unknown."""
+    with _reading() as cur:
+        row = cur.execute("SELECT * FROM tasks WHERE task_id=?", (task_id,)).fetchone()
+        if row is None:
+            return None
+        task = _task_row(row)
+        if agents:
+            task["agent_states"] = [
+                dict(r) for r in cur.execute(
                     """
-                    DELETE FROM pending_files
-                    WHERE task_id=? AND agent_ip=? AND file_hash=?
+                    SELECT agent_ip, state, dispatched_at, replied_at, files_reported
+                    FROM task_agents WHERE task_id=? ORDER BY agent_ip
                     """,
-                    (task_id, agent_ip, file_hash),
+                    (task_id,),
                 )
-            elif path:
-                cur.execute(
-                    """
-                    DELETE FROM pending_files
-                    WHERE task_id=? AND agent_ip=? AND path=?
-                    """,
-                    (task_id, agent_ip, path),
-                )
-        conn.commit()
-        conn.close()
+            ]
+    return task
+
+
+def list_tasks(cursor: str = None, limit: int = None):
+    """
+    One page of tasks, newest first. Returns (tasks, next_cursor) like
+    `list_pending_page`; raises ValueError for a malformed cursor.
+    """
+    limit = PAGE_SIZE if limit is None else min(max(1, int(limit)), MAX_PAGE_SIZE)
+    where, params = "", []
+    if cursor:
+        where = "WHERE (created_at, task_id) < (?, ?)"
+        params = _decode_cursor(cursor, float, str)
+    with _reading() as cur:
+        rows = cur.execute(
+            f"SELECT * FROM tasks {where} ORDER BY created_at DESC, task_id DESC LIMIT ?",
+            (*params, limit + 1),
+        ).fetchall()
+    tasks = [_task_row(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = tasks[-1]
+        next_cursor = _encode_cursor(last["created_at"], last["task_id"])
+    return tasks, next_cursor
+
+
+SUMMARY_TASKS = int(os.getenv("SUMMARY_TASKS", "20"))
+
+
+def file_count_summary(tasks: int = None) -> dict:
+    """
+    Pending, deleted and failed file counts overall, per agent, per
+    language and for the `tasks` newest tasks (default SUMMARY_TASKS),
+    read from the trigger-kept counters.
+    """
+    tasks = SUMMARY_TASKS if tasks is None else max(0, int(tasks))
+    summary = {"files": {"pending": 0, "deleted": 0, "failed": 0}, "agents": {}, "languages": {}}
+    groups = {"agent": summary["agents"], "language": summary["languages"]}
+    with _reading() as cur:
+        for dimension, key, pending, deleted, failed in cur.execute(
+            "SELECT dimension, key, pending, deleted, failed FROM file_counts ORDER BY dimension, key"
+        ):
+            counts = {"pending": pending, "deleted": deleted, "failed": failed}
+            if dimension == "all":
+                summary["files"] = counts
+            elif pending or deleted or failed:
+                groups[dimension][key] = counts
+        summary["tasks"] = [
+            dict(row) for row in cur.execute(
+                """
+                SELECT task_id, files_pending AS pending, files_deleted AS deleted, files_failed AS failed
+                FROM tasks ORDER BY created_at DESC, task_id DESC LIMIT ?
+                """,
+                (tasks,),
+            )
+        ]
+    return summary
@@ -0,0 +1,41 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# Keep the default database away from the working tree: the writer's exit
+# flush opens DB_PATH after the fixtures have restored it.
+os.environ["APP_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="tests-"), "app.db")
+
+from shared import persistence  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """persistence pointed at a fresh, fully migrated database."""
+    monkeypatch.setattr(persistence, "DB_PATH", str(tmp_path / "app.db"))
+    # In-memory indexes over the queues belong to the previous database.
+    monkeypatch.setattr(persistence, "_command_agents", None)
+    monkeypatch.setattr(persistence, "_task_agents", None)
+    persistence.init_db()
+    yield persistence
+    persistence.flush_writes()
+    persistence.close_connections()
+
+
+def pending_file(i, **fields):
+    """A row-format scan result for `replace_pending_files`."""
+    return dict({
+        "file_hash": f"h{i}",
+        "filename": f"f{i}.py",
+        "path": f"/home/u/proj/f{i}.py",
+        "language": "python",
+        "confidence": 0.5,
+        "reason": "function definition",
+        "modified_time": f"2026-01-01T00:00:{i % 60:02d}",
+    }, **fields)
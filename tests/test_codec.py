@@ -0,0 +1,156 @@
+from types import SimpleNamespace
+
+import pytest
+
+from backend.network.protocol import decode_message, encode_message
+from shared.codec import (
+    CODECS,
+    SCHEMAS,
+    BinaryCodec,
+    JsonCodec,
+    codec_for_flags,
+    negotiate_codec,
+    parse_codecs,
+)
+from shared.columnar import ColumnarBatch, encode_results
+from shared.framing import FLAG_BINARY, FLAG_ZLIB, FrameError, parse_header, HEADER_SIZE
+
+codec = BinaryCodec()
+
+
+def file_row(i):
+    return {
+        "filepath": f"/home/u/proj/f{i}.py",
+        "filename": f"f{i}.py",
+        "size": 100 + i,
+        "modified_time": "2026-01-01T00:00:00",
+        "decision": "delete",
+        "confidence": 0.25 * i,
+        "language": "python",
+        "method": "heuristic",
+        "reason": "função",
+        "file_hash": f"h{i}",
+    }
+
+
+def result(i, **fields):
+    return SimpleNamespace(**dict(file_row(i), **fields))
+
+
+def columns(n=3):
+    return encode_results(result(i) for i in range(n))
+
+
+MESSAGES = [
+    {"type": "heartbeat", "client_id": "c1", "timestamp": "t"},
+    {"type": "scan_results", "task_id": "t1", "client_id": "c1", "timestamp": "t",
+     "files": [file_row(i) for i in range(3)]},
+    {"type": "scan_results", "task_id": "t1", "client_id": "c1", "timestamp": "t",
+     "columns": columns()},
+    {"type": "scan_results_chunk", "task_id": "t1", "client_id": "c1", "timestamp": "t",
+     "seq": 4, "files": []},
+    {"type": "scan_results_chunk", "task_id": "t1", "client_id": "c1", "timestamp": "t",
+     "seq": 5, "columns": columns(0)},
+    {"type": "deletion_report", "task_id": "t1", "client_id": "c1", "timestamp": "t",
+     "reports": [{"file_hash": "h1", "path": "/p", "status": "deleted", "details": ""}]},
+    {"type": "deletion_report", "task_id": "t1", "client_id": "c1", "timestamp": "t",
+     "reports": [], "command_id": 7},
+    {"type": "delete_approved", "task_id": "t1", "timestamp": "t",
+     "approved_entries": [{"file_hash": "h1", "path": "/p", "record_id": "3"}],
+     "approved_hashes": ["h1"]},
+    {"type": "delete_approved", "task_id": "t1", "timestamp": "t",
+     "approved_entries": [], "approved_hashes": [], "command_id": 9},
+]
+
+
+def test_every_schema_variant_is_covered():
+    tags = {tag for variants in SCHEMAS.values() for tag, _ in variants}
+    assert {codec.encode(m)[0] for m in MESSAGES} == tags
+
+
+@pytest.mark.parametrize("message", MESSAGES, ids=lambda m: f"{m['type']}-{len(m)}")
+def test_binary_round_trip(message):
+    payload = codec.encode(message)
+    assert payload[0] != 0
+    assert codec.decode(payload) == message
+
+
+def test_unknown_messages_fall_back_to_json():
+    message = {"type": "register", "client_id": "c1", "capabilities": {"codecs": ["binary"]}}
+    payload = codec.encode(message)
+    assert payload[0] == 0
+    assert codec.decode(payload) == message
+
+
+def test_extra_or_mistyped_fields_fall_back_to_json():
+    extra = dict(MESSAGES[0], note="x")
+    mistyped = dict(MESSAGES[3], seq="4")
+    for message in (extra, mistyped):
+        payload = codec.encode(message)
+        assert payload[0] == 0
+        assert codec.decode(payload) == message
+
+
+def test_nul_in_a_string_falls_back_to_json():
+    message = dict(MESSAGES[0], client_id="a\0b")
+    payload = codec.encode(message)
+    assert payload[0] == 0
+    assert codec.decode(payload) == message
+
+
+def test_corrupt_binary_payload_raises_frame_error():
+    payload = codec.encode(MESSAGES[1])
+    with pytest.raises(FrameError):
+        codec.decode(payload[:-5])
+    with pytest.raises(FrameError):
+        codec.decode(bytes([200]) + payload[1:])
+
+
+def test_negotiation():
+    assert parse_codecs("Binary, json,bogus") == ["binary", "json"]
+    assert parse_codecs(None) == []
+    assert negotiate_codec(["json", "binary"], ["binary", "json"]) is CODECS["binary"]
+    assert negotiate_codec(["json"], ["binary", "json"]) is CODECS["json"]
+    assert negotiate_codec(None, ["binary"]) is CODECS["json"]
+    assert isinstance(codec_for_flags(FLAG_BINARY | FLAG_ZLIB), BinaryCodec)
+    assert isinstance(codec_for_flags(FLAG_ZLIB), JsonCodec)
+
+
+def test_columnar_batch_round_trip():
+    results = [result(0), result(1, language="javascript"), result(2, filepath="/odd/path", language="")]
+    message = {"type": "scan_results", "task_id": "t1", "client_id": "c1", "timestamp": "t",
+               "columns": encode_results(results)}
+    batch = ColumnarBatch(codec.decode(codec.encode(message))["columns"])
+    assert len(batch) == 3
+    assert batch.column("filepath") == ["/home/u/proj/f0.py", "/home/u/proj/f1.py", "/odd/path"]
+    assert batch.column("language") == ["python", "javascript", ""]
+    rows = list(batch)
+    assert rows[1] == dict(file_row(1), language="javascript")
+
+
+def test_malformed_batches_are_rejected():
+    cols = columns()
+    with pytest.raises(ValueError):
+        ColumnarBatch(dict(cols, size=cols["size"][:2]))
+    with pytest.raises(ValueError):
+        ColumnarBatch(dict(cols, language=[0, 0, 5]))
+    with pytest.raises(ValueError):
+        ColumnarBatch(dict(cols, dir=[0, 0, -1]))
+
+
+@pytest.mark.parametrize("wire", [JsonCodec(), BinaryCodec()])
+def test_protocol_round_trip_with_compression(wire):
+    message = dict(MESSAGES[1], files=[file_row(i) for i in range(200)])
+    frame = encode_message(message, "zlib", wire)
+    length, flags = parse_header(frame[:HEADER_SIZE])
+    assert flags & FLAG_ZLIB
+    assert bool(flags & FLAG_BINARY) == (wire.name == "binary")
+    assert length == len(frame) - HEADER_SIZE
+    assert decode_message((flags, frame[HEADER_SIZE:])) == message
+
+
+def test_small_messages_are_not_compressed():
+    frame = encode_message(MESSAGES[0], "zlib", BinaryCodec())
+    _, flags = parse_header(frame[:HEADER_SIZE])
+    assert flags == FLAG_BINARY
+    assert decode_message((flags, frame[HEADER_SIZE:])) == MESSAGES[0]
@@ -0,0 +1,136 @@
+import sqlite3
+import time
+
+import pytest
+
+from tests.conftest import pending_file
+
+AGENT = "10.0.0.1"
+
+
+def payload(*entries, timestamp="t"):
+    return {
+        "type": "delete_approved",
+        "task_id": "t1",
+        "timestamp": timestamp,
+        "approved_entries": list(entries),
+        "approved_hashes": [e["file_hash"] for e in entries],
+    }
+
+
+def entry(i, record_id=""):
+    return {"file_hash": f"h{i}", "path": f"/home/u/proj/f{i}.py", "record_id": record_id}
+
+
+def make_due(db, cmd_id):
+    """Skip a command's backoff wait."""
+    conn = sqlite3.connect(db.DB_PATH)
+    with conn:
+        conn.execute("UPDATE delete_command_queue SET next_attempt_at = 0 WHERE id = ?", (cmd_id,))
+    conn.close()
+
+
+@pytest.fixture
+def approved(db):
+    """Two approved pending files and the delete command that carries them."""
+    db.replace_pending_files("t1", AGENT, [pending_file(i) for i in range(3)])
+    ids = sorted(r["id"] for r in db.list_pending_page(task_id="t1")[0])[:2]
+    assert db.approve_pending(ids) == ids
+    cmd_id = db.enqueue_delete_command(AGENT, "t1", payload(entry(0, ids[0]), entry(1, ids[1])))
+    return cmd_id, ids
+
+
+def test_enqueue_dedupes_open_commands_ignoring_timestamp(db):
+    first = db.enqueue_delete_command(AGENT, "t1", payload(entry(0), timestamp="a"))
+    assert db.enqueue_delete_command(AGENT, "t1", payload(entry(0), timestamp="b")) == first
+    assert db.enqueue_delete_command(AGENT, "t1", payload(entry(1))) != first
+    assert db.enqueue_delete_command("10.0.0.2", "t1", payload(entry(0))) != first
+    assert db.delete_command_stats()["pending"] == 3
+
+
+def test_claim_leases_commands(db, approved):
+    cmd_id, _ = approved
+    commands, due_at = db.claim_delete_commands(AGENT)
+    assert [(c["id"], c["attempt"]) for c in commands] == [(cmd_id, 1)]
+    assert commands[0]["payload"]["approved_hashes"] == ["h0", "h1"]
+    assert due_at == pytest.approx(time.time() + db.DELETE_COMMAND_LEASE, abs=5)
+    assert db.claim_delete_commands(AGENT) == ([], due_at)
+    assert db.claim_delete_commands("10.0.0.2") == ([], None)
+    assert db.delete_command_stats()["in_flight"] == 1
+
+
+def test_expired_lease_makes_command_claimable_again(db, approved):
+    cmd_id, _ = approved
+    db.claim_delete_commands(AGENT, lease=0)
+    commands, _ = db.claim_delete_commands(AGENT)
+    assert [(c["id"], c["attempt"]) for c in commands] == [(cmd_id, 2)]
+
+
+def test_release_backs_off_exponentially(db, approved, monkeypatch):
+    cmd_id, _ = approved
+    monkeypatch.setattr(db, "DELETE_COMMAND_BACKOFF", 10.0)
+    monkeypatch.setattr(db, "DELETE_COMMAND_BACKOFF_MAX", 25.0)
+    for delay in (10.0, 20.0, 25.0):
+        [command], _ = db.claim_delete_commands(AGENT)
+        retry_at = db.release_delete_command(command["id"], "agent offline")
+        assert retry_at == pytest.approx(time.time() + delay, abs=1)
+        assert db.claim_delete_commands(AGENT) == ([], retry_at)
+        make_due(db, cmd_id)
+    [command] = db.list_delete_commands("pending")
+    assert (command["attempts"], command["error"]) == (3, "agent offline")
+
+
+def test_release_out_of_attempts_dead_letters_and_frees_files(db, approved, monkeypatch):
+    cmd_id, ids = approved
+    monkeypatch.setattr(db, "DELETE_COMMAND_MAX_ATTEMPTS", 1)
+    db.claim_delete_commands(AGENT)
+    assert db.get_pending_by_ids(ids, approved=False) == []
+    assert db.release_delete_command(cmd_id, "refused") is None
+    assert [c["id"] for c in db.list_delete_commands("dead")] == [cmd_id]
+    assert {r["status"] for r in db.get_pending_by_ids(ids)} == {"pending"}
+    # The files can be approved again, which queues a new command.
+    assert db.approve_pending(ids) == ids
+
+
+def test_unacked_command_is_dead_lettered_on_claim(db, approved, monkeypatch):
+    cmd_id, ids = approved
+    monkeypatch.setattr(db, "DELETE_COMMAND_MAX_ATTEMPTS", 1)
+    db.claim_delete_commands(AGENT, lease=0)
+    assert db.claim_delete_commands(AGENT) == ([], None)
+    [dead] = db.list_delete_commands("dead")
+    assert (dead["id"], dead["error"], dead["files"]) == (cmd_id, "not acknowledged", 2)
+    assert len(db.get_pending_by_ids(ids, approved=False)) == 2
+
+
+def test_ack_by_command_id(db, approved):
+    cmd_id, _ = approved
+    db.claim_delete_commands(AGENT)
+    assert db.ack_delete_commands("10.0.0.2", "t1", command_id=cmd_id) == 0
+    assert db.ack_delete_commands(AGENT, "t1", command_id=cmd_id) == 1
+    assert db.ack_delete_commands(AGENT, "t1", command_id=cmd_id) == 0
+    assert db.delete_command_stats()["in_flight"] == 0
+    assert [c["id"] for c in db.list_delete_commands("acked")] == [cmd_id]
+
+
+def test_legacy_ack_needs_every_approved_file(db, approved):
+    db.claim_delete_commands(AGENT)
+    first = [{"file_hash": "h0", "path": "/home/u/proj/f0.py", "status": "deleted"}]
+    assert db.ack_delete_commands(AGENT, "t1", reports=first) == 0
+    both = first + [{"file_hash": "h1", "status": "failed"}]
+    assert db.ack_delete_commands(AGENT, "t2", reports=both) == 0
+    assert db.ack_delete_commands(AGENT, "t1", reports=both) == 1
+
+
+def test_command_index_tracks_due_agents(db, approved):
+    generation = db.pending_delete_commands_generation(AGENT)
+    assert generation is not None
+    assert db.pending_delete_commands_generation("10.0.0.2") is None
+
+    _, due_at = db.claim_delete_commands(AGENT)
+    db.defer_delete_commands(AGENT, generation, due_at)
+    assert db.pending_delete_commands_generation(AGENT) is None
+
+    # A command queued during a drain is not hidden by that drain's deferral.
+    db.note_pending_delete_commands(AGENT)
+    db.defer_delete_commands(AGENT, generation, None)
+    assert db.pending_delete_commands_generation(AGENT) == generation + 1
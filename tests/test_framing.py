@@ -0,0 +1,107 @@
+import socket
+import threading
+
+import pytest
+
+from shared.framing import (
+    FLAG_BINARY,
+    FLAG_ZLIB,
+    HEADER_SIZE,
+    FrameError,
+    FrameReader,
+    FrameWriter,
+    encode_frame,
+    parse_header,
+)
+
+
+@pytest.fixture
+def pair():
+    a, b = socket.socketpair()
+    yield a, b
+    a.close()
+    b.close()
+
+
+def test_header_round_trip():
+    frame = encode_frame(b"payload", FLAG_ZLIB | FLAG_BINARY)
+    assert parse_header(frame[:HEADER_SIZE]) == (7, FLAG_ZLIB | FLAG_BINARY)
+    assert frame[HEADER_SIZE:] == b"payload"
+
+
+def test_zero_flags_keep_plain_length_prefix():
+    assert encode_frame(b"abc")[:HEADER_SIZE] == (3).to_bytes(4, "big")
+
+
+def test_oversized_frames_are_rejected():
+    with pytest.raises(FrameError):
+        encode_frame(b"x" * 11, max_size=10)
+    with pytest.raises(FrameError):
+        parse_header((11).to_bytes(4, "big"), max_size=10)
+
+
+def test_reader_assembles_frames_from_single_bytes(pair):
+    a, b = pair
+    data = encode_frame(b"first") + encode_frame(b"", FLAG_BINARY) + encode_frame(b"third" * 1000)
+
+    def trickle():
+        for i in range(len(data)):
+            a.sendall(data[i:i + 1])
+
+    sender = threading.Thread(target=trickle)
+    sender.start()
+    reader = FrameReader(b)
+    assert reader.read_frame() == (0, b"first")
+    assert reader.read_frame() == (FLAG_BINARY, b"")
+    assert reader.read_frame() == (0, b"third" * 1000)
+    sender.join()
+
+
+def test_reader_returns_every_buffered_frame(pair):
+    a, b = pair
+    a.sendall(b"".join(encode_frame(bytes([i])) for i in range(5)))
+    reader = FrameReader(b)
+    frames = []
+    while len(frames) < 5:
+        frames.extend(reader.read_frames())
+    assert frames == [(0, bytes([i])) for i in range(5)]
+
+
+def test_reader_grows_past_its_initial_buffer(pair):
+    a, b = pair
+    payload = bytes(range(256)) * 1024
+    writer = FrameWriter(a)
+    reader = FrameReader(b)
+    sender = threading.Thread(target=writer.send, args=(payload,))
+    sender.start()
+    assert reader.read_frame() == (0, payload)
+    sender.join()
+
+
+def test_reader_reports_eof(pair):
+    a, b = pair
+    a.sendall(encode_frame(b"last"))
+    a.close()
+    reader = FrameReader(b)
+    assert reader.read_frame() == (0, b"last")
+    assert reader.read_frame() is None
+    assert reader.eof
+
+
+def test_reader_rejects_oversized_header(pair):
+    a, b = pair
+    a.sendall((1000).to_bytes(4, "big"))
+    with pytest.raises(FrameError):
+        FrameReader(b, max_size=100).read_frame()
+
+
+def test_reader_keeps_partial_frame_across_timeouts(pair):
+    a, b = pair
+    frame = encode_frame(b"split")
+    b.settimeout(0.05)
+    reader = FrameReader(b)
+    a.sendall(frame[:3])
+    with pytest.raises(socket.timeout):
+        reader.read_frame()
+    a.sendall(frame[3:])
+    assert reader.read_frame() == (0, b"split")
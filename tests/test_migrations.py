@@ -0,0 +1,132 @@
+import sqlite3
+
+import pytest
+
+from shared import persistence
+from tests.conftest import pending_file
+
+
+@pytest.fixture
+def migrate_to(tmp_path, monkeypatch):
+    """Migrate a fresh database up to a given version, as an older release would."""
+    monkeypatch.setattr(persistence, "DB_PATH", str(tmp_path / "app.db"))
+    monkeypatch.setattr(persistence, "_command_agents", None)
+    monkeypatch.setattr(persistence, "_task_agents", None)
+    all_migrations = persistence._MIGRATIONS
+
+    def migrate(version=None):
+        monkeypatch.setattr(persistence, "_MIGRATIONS", all_migrations[:version])
+        monkeypatch.setattr(persistence, "_schema_ready", None)
+        persistence.init_db()
+        persistence.flush_writes()
+
+    yield migrate
+    persistence.flush_writes()
+    persistence.close_connections()
+
+
+def execute(sql, params=()):
+    conn = sqlite3.connect(persistence.DB_PATH)
+    try:
+        with conn:
+            return conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+
+def versions():
+    return [v for v, in execute("SELECT version FROM schema_migrations ORDER BY version")]
+
+
+def test_fresh_database_records_every_migration(db):
+    assert versions() == [v for v, _, _ in db._MIGRATIONS]
+    assert versions() == list(range(1, len(db._MIGRATIONS) + 1))
+
+
+def test_init_db_is_idempotent(migrate_to):
+    migrate_to()
+    before = execute("SELECT version, applied_at FROM schema_migrations")
+    migrate_to()
+    assert execute("SELECT version, applied_at FROM schema_migrations") == before
+
+
+def test_upgrade_applies_only_new_migrations(migrate_to):
+    migrate_to(9)
+    assert versions() == list(range(1, 10))
+    assert not execute("SELECT name FROM sqlite_master WHERE name='task_queue'")
+    migrate_to()
+    assert versions() == list(range(1, len(persistence._MIGRATIONS) + 1))
+    assert execute("SELECT name FROM sqlite_master WHERE name='task_queue'")
+
+
+def test_upgrade_backfills_approvals_of_open_commands(migrate_to):
+    migrate_to(10)
+    persistence.replace_pending_files("t1", "10.0.0.1", [pending_file(i) for i in range(3)])
+    ids = sorted(r for r, in execute("SELECT id FROM pending_files"))
+    entries = [{"file_hash": "h0", "path": "/home/u/proj/f0.py", "record_id": ids[0]}]
+    persistence.enqueue_delete_command("10.0.0.1", "t1", {"type": "delete_approved", "approved_entries": entries})
+    # The file was approved twice before the task counted approvals once.
+    persistence.resolve_pending([([ids[0]], "delete_queued", "", False, False)] * 2)
+    persistence.flush_writes()
+
+    migrate_to()
+    approved = [r for r, in execute("SELECT id FROM pending_files WHERE approved_at IS NOT NULL")]
+    assert approved == [ids[0]]
+    assert persistence.get_task("t1")["files"]["approved"] == 1
+    assert [r["id"] for r in persistence.get_pending_by_ids(ids, approved=False)] == ids[1:]
+
+
+def test_upgrade_stores_empty_languages_as_null(migrate_to):
+    migrate_to(11)
+    persistence.replace_pending_files("t1", "10.0.0.1", [pending_file(0), pending_file(1, language=None)])
+    persistence.flush_writes()
+    # Columnar results used to store a missing language as ''.
+    execute("UPDATE pending_files SET language = '' WHERE file_hash = 'h0'")
+    assert persistence.file_count_summary()["languages"] == {
+        "": {"pending": 1, "deleted": 0, "failed": 0},
+        "unknown": {"pending": 1, "deleted": 0, "failed": 0},
+    }
+
+    migrate_to()
+    assert execute("SELECT COUNT(*) FROM pending_files WHERE language IS NULL") == [(2,)]
+    assert persistence.file_count_summary()["languages"] == {
+        "unknown": {"pending": 2, "deleted": 0, "failed": 0},
+    }
+
+
+def test_keyset_pages_cover_every_row_once(db):
+    db.replace_pending_files("t1", "10.0.0.1", [pending_file(i) for i in range(7)])
+    db.replace_pending_files("t2", "10.0.0.2", [pending_file(i, language="go") for i in range(3)])
+    seen, cursor = [], None
+    while True:
+        records, cursor = db.list_pending_page(cursor, limit=3)
+        seen.extend(records)
+        if cursor is None:
+            break
+    assert len(seen) == 10
+    assert len({r["id"] for r in seen}) == 10
+    keys = [(r["created_at"], r["id"]) for r in seen]
+    assert keys == sorted(keys, reverse=True)
+    assert db.count_pending_files() == 10
+
+
+def test_keyset_pages_apply_filters(db):
+    db.replace_pending_files("t1", "10.0.0.1", [pending_file(i) for i in range(5)])
+    db.replace_pending_files("t2", "10.0.0.2", [pending_file(i, language="go") for i in range(3)])
+    records, cursor = db.list_pending_page(limit=2, language="go")
+    assert [r["language"] for r in records] == ["go", "go"]
+    records, cursor = db.list_pending_page(cursor, limit=2, language="go")
+    assert len(records) == 1 and cursor is None
+    assert db.count_pending_files(language="go") == 3
+    assert db.count_pending_files(task_id="t1", min_confidence=0.5) == 5
+
+    ids = [r["id"] for r in db.list_pending_page(task_id="t1")[0]]
+    db.approve_pending(ids[:2])
+    assert db.count_pending_files(approved=False) == 6
+    assert {r["status"] for r in db.list_pending_page(approved=True)[0]} == {"approved"}
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", "bnVsbA==", "WzEsMl0=", "WyJhIl0="])
+def test_invalid_cursor_raises_value_error(db, cursor):
+    with pytest.raises(ValueError):
+        db.list_pending_page(cursor)